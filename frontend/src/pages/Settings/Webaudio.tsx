@@ -17,6 +17,10 @@ import BladeIcon from '../../components/Icons/BladeIcon/BladeIcon'
 import ws from '../../utils/Websocket'
 import useStore from '../../store/useStore'
 
+// identifies the binary audio frames of this browser to the server
+const webAudStreamId = Math.floor(Math.random() * 0x10000)
+let webAudSequence = 0
+
 const getMedia = async (clientDevice: MediaDeviceInfo) => {
   const audioSetting: boolean | MediaTrackConstraints | undefined =
     await navigator.mediaDevices
@@ -51,6 +55,10 @@ const Webaudio = ({ style }: { style: CSSProperties }) => {
       label: 'ws-v2',
       value: 'audio_stream_data_v2'
     },
+    {
+      label: 'ws-binary',
+      value: 'audio_stream_data_binary'
+    },
     {
       label: 'udp',
       value: 'audio_stream_data_udp'
@@ -158,6 +166,19 @@ const Webaudio = ({ style }: { style: CSSProperties }) => {
                   }
                   ;(ws as any).ws.send(JSON.stringify(++request.id && request))
                 }
+                const sendWsBinary = async () => {
+                  const floatData = e.inputBuffer.getChannelData(0)
+                  // header: format (1 = float32), reserved, stream id,
+                  // sample rate and sequence number, little-endian
+                  const frame = new ArrayBuffer(12 + floatData.length * 4)
+                  const header = new DataView(frame)
+                  header.setUint8(0, 1)
+                  header.setUint16(2, webAudStreamId, true)
+                  header.setUint32(4, audioContext.sampleRate, true)
+                  header.setUint32(8, webAudSequence++, true)
+                  new Float32Array(frame, 12).set(floatData)
+                  ;(ws as any).ws.send(frame)
+                }
                 const sendWsV1 = async () => {
                   const i = 0
                   const request = {
@@ -170,6 +191,8 @@ const Webaudio = ({ style }: { style: CSSProperties }) => {
                 }
                 if (webAudType === 'audio_stream_data_v2') {
                   sendWsV2()
+                } else if (webAudType === 'audio_stream_data_binary') {
+                  sendWsBinary()
                 } else {
                   sendWsV1()
                 }
@@ -359,6 +382,7 @@ const Webaudio = ({ style }: { style: CSSProperties }) => {
                       const request = {
                         data: {},
                         client: webAudName,
+                        stream_id: webAudStreamId,
                         id: 1,
                         type: 'audio_stream_start'
                       }
@@ -10,6 +10,7 @@ To run this script for development purposes use:
 
 import argparse
 import logging
+import multiprocessing
 import os
 import sys
 from logging.handlers import RotatingFileHandler
@@ -236,6 +237,8 @@ def parse_args():
 def main():
     """Main entry point allowing external calls"""
 
+    # render workers are spawned by re-running the frozen executable
+    multiprocessing.freeze_support()
     args = parse_args()
     config_helpers.ensure_config_directory(args.config)
     setup_logging(args.loglevel, config_dir=args.config)
@@ -289,7 +292,9 @@ def main():
         icon_location = get_icon_path("tray.png")
 
         icon = pystray.Icon(
-            "MusicLedStudio", icon=Image.open(icon_location), title="Music Led Studio"
+            "MusicLedStudio",
+            icon=Image.open(icon_location),
+            title="Music Led Studio",
         )
     else:
         icon = None
@@ -0,0 +1,24 @@
+import logging
+
+from aiohttp import web
+
+from mls.api import RestEndpoint
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AudioDiagnosticsEndpoint(RestEndpoint):
+    ENDPOINT_PATH = "/api/audio/diagnostics"
+
+    async def get(self) -> web.Response:
+        """
+        Get the health counters of audio capture and analysis
+
+        Returns:
+            web.Response: The response containing the ring buffer overflow
+            and underrun counters and the analysis timings, or only
+            `active: false` while no audio source has been created.
+        """
+        if self._mls.audio is None:
+            return await self.bare_request_success({"active": False})
+        return await self.bare_request_success(self._mls.audio.diagnostics())
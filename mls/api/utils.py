@@ -25,6 +25,16 @@ PERMITTED_KEYS = {
         "pitch_method",
         "onset_method",
         "pitch_tolerance",
+        "sample_rate",
+        "fft_size",
+        "analysis_rate",
+        "analysis_preset",
+        "replay_file",
+        "replay_speed",
+        "replay_loop",
+        "silence_timeout",
+        "silence_hysteresis",
+        "silence_mode",
     ),
     "melbanks": (
         "max_frequencies",
@@ -32,6 +42,7 @@ PERMITTED_KEYS = {
         "peak_isolation",
         "coeffs_type",
         "samples",
+        "engine",
     ),
     "melbank_collection": (
         "name",
@@ -52,6 +63,12 @@ PERMITTED_KEYS = {
         "global_transitions",
         "global_brightness",
         "melbank_collection",
+        "render_workers",
+        "deduplicate_effects",
+        "audio_clocked_rendering",
+        "audio_analysis_process",
+        "pixel_dtype",
+        "output_latency_target_ms",
     ),
 }
 
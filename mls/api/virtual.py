@@ -35,6 +35,7 @@ class VirtualEndpoint(RestEndpoint):
             "segments": virtual.segments,
             "pixel_count": virtual.pixel_count,
             "active": virtual.active,
+            "quality": virtual.governor.status(virtual.refresh_rate),
             "effect": {},
         }
         # Protect from DummyEffect
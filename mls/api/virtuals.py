@@ -25,6 +25,11 @@ class VirtualsEndpoint(RestEndpoint):
         """
         response = {"status": "success", "virtuals": {}}
         response["paused"] = self._mls.virtuals._paused
+        response["scheduler"] = self._mls.virtuals.scheduler.stats()
+        if self._mls.virtuals.effect_sharing is not None:
+            response["effect_sharing"] = (
+                self._mls.virtuals.effect_sharing.stats()
+            )
         for virtual in self._mls.virtuals.values():
             response["virtuals"][virtual.id] = {
                 "config": virtual.config,
@@ -34,6 +39,7 @@ class VirtualsEndpoint(RestEndpoint):
                 "segments": virtual.segments,
                 "pixel_count": virtual.pixel_count,
                 "active": virtual.active,
+                "quality": virtual.governor.status(virtual.refresh_rate),
                 "effect": {},
             }
             # Protect from DummyEffect
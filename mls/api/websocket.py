@@ -8,7 +8,7 @@ from concurrent import futures
 import numpy as np
 import pybase64
 import voluptuous as vol
-from aiohttp import web
+from aiohttp import WSMsgType, web
 
 from mls.api import RestEndpoint
 from mls.events import Event
@@ -17,6 +17,15 @@ from mls.utils import empty_queue
 _LOGGER = logging.getLogger(__name__)
 MAX_PENDING_MESSAGES = 256
 MAX_VAL = 32767
+# Binary web audio frames start with this header, followed by the samples:
+#   uint8 format, uint8 reserved, uint16 stream id, uint32 sample rate,
+#   uint32 sequence number, all little-endian
+WEB_AUDIO_FRAME_HEADER = struct.Struct("<BxHII")
+# sample formats of binary web audio frames
+WEB_AUDIO_FORMATS = {1: np.dtype("<f4"), 2: np.dtype("<i2")}
+# frames arriving at most this far behind the newest one count as reordered,
+# further back the client is taken to have restarted its sequence
+WEB_AUDIO_REORDER_WINDOW = 16
 
 BASE_MESSAGE_SCHEMA = vol.Schema(
     {
@@ -69,6 +78,8 @@ class WebsocketConnection:
         self._receiver_task = None
         self._sender_task = None
         self._sender_queue = asyncio.Queue(maxsize=MAX_PENDING_MESSAGES)
+        # web audio clients streaming binary frames, by stream id
+        self._audio_streams = {}
 
     def close(self):
         """
@@ -216,7 +227,7 @@ class WebsocketConnection:
         )
 
         try:
-            message = await socket.receive_json()
+            message = await self._receive_json()
             while message:
                 message = BASE_MESSAGE_SCHEMA(message)
 
@@ -228,7 +239,7 @@ class WebsocketConnection:
                     )
                     self.send_error(message["id"], "Unknown command type.")
 
-                message = await socket.receive_json()
+                message = await self._receive_json()
 
         except (vol.Invalid, ValueError):
             _LOGGER.info("Invalid message format.")
@@ -263,6 +274,48 @@ class WebsocketConnection:
 
         return socket
 
+    async def _receive_json(self):
+        """
+        Receives the next JSON message, handling any binary web audio frames
+        that arrive before it.
+        """
+        while True:
+            msg = await self._socket.receive()
+            if msg.type == WSMsgType.BINARY:
+                self._receive_audio_frame(msg.data)
+                continue
+            if msg.type != WSMsgType.TEXT:
+                raise TypeError(
+                    f"Received message {msg.type}:{msg.data!r} is not str"
+                )
+            return json.loads(msg.data)
+
+    def _receive_audio_frame(self, frame):
+        """Passes a binary web audio frame to the active web audio stream"""
+        try:
+            fmt, stream_id, sample_rate, sequence = (
+                WEB_AUDIO_FRAME_HEADER.unpack_from(frame)
+            )
+        except struct.error:
+            _LOGGER.debug("Discarded truncated web audio frame.")
+            return
+        dtype = WEB_AUDIO_FORMATS.get(fmt)
+        if dtype is None:
+            _LOGGER.debug(f"Discarded web audio frame in format {fmt}.")
+            return
+        if (
+            not ACTIVE_AUDIO_STREAM
+            or ACTIVE_AUDIO_STREAM.client != self._audio_streams.get(stream_id)
+        ):
+            return
+        samples = np.frombuffer(
+            frame,
+            dtype=dtype,
+            count=(len(frame) - WEB_AUDIO_FRAME_HEADER.size) // dtype.itemsize,
+            offset=WEB_AUDIO_FRAME_HEADER.size,
+        )
+        ACTIVE_AUDIO_STREAM.write_frame(samples, sample_rate, sequence)
+
     @websocket_handler("subscribe_event")
     def subscribe_event_handler(self, message):
         def notify_websocket(event):
@@ -295,6 +348,9 @@ class WebsocketConnection:
     @websocket_handler("audio_stream_start")
     def audio_stream_start_handler(self, message):
         client = message.get("client")
+        stream_id = message.get("stream_id")
+        if stream_id is not None:
+            self._audio_streams[stream_id] = client
 
         if client in WEB_AUDIO_CLIENTS:
             _LOGGER.warning(f"Web audio client {client} already exists")
@@ -308,6 +364,11 @@ class WebsocketConnection:
         client = message.get("client")
         _LOGGER.info(f"Web audio stream closed by client {client}")
         WEB_AUDIO_CLIENTS.discard(client)
+        self._audio_streams = {
+            stream_id: name
+            for stream_id, name in self._audio_streams.items()
+            if name != client
+        }
 
     @websocket_handler("audio_stream_config")
     def audio_stream_config_handler(self, message):
@@ -355,14 +416,13 @@ class WebsocketConnection:
                 "Unexpected Exception in base64 decoding: %s", err
             )
         else:
-            fmt = "<%dh" % (len(decoded) // 2)
-            data = list(struct.unpack(fmt, decoded))
+            samples = np.frombuffer(
+                decoded, dtype="<i2", count=len(decoded) // 2
+            )
             # Minimum value is -32768 for signed, so that's why if the number is negative,
             # it is divided by 32768 when converting to float.
-            data = np.array(
-                [d / MAX_VAL if d >= 0 else d / (MAX_VAL + 1) for d in data],
-                dtype=np.float32,
-            )
+            data = samples.astype(np.float32)
+            data /= np.where(samples >= 0, MAX_VAL, MAX_VAL + 1)
             ACTIVE_AUDIO_STREAM.data = data
 
 
@@ -372,6 +432,13 @@ class WebAudioStream:
         self.callback = callback
         self._data = None
         self._active = False
+        # binary frames: int16 samples are converted into this buffer
+        self._block = np.zeros(0, dtype=np.float32)
+        self._sequence = None
+        self.stream_rate = None
+        self.frames = 0
+        self.dropped_frames = 0
+        self.late_frames = 0
 
     def start(self):
         self._active = True
@@ -394,3 +461,33 @@ class WebAudioStream:
                 self.callback(self._data, None, None, None)
             except Exception as e:
                 _LOGGER.error(e)
+
+    def write_frame(self, samples, sample_rate, sequence):
+        """
+        Feeds the samples of a binary frame to the audio source, counting
+        frames lost or reordered on the way by their sequence number.
+        Frames older than the last one fed are discarded.
+        """
+        if self._sequence is not None:
+            gap = (sequence - self._sequence - 1) & 0xFFFFFFFF
+            if gap < 0x80000000:
+                self.dropped_frames += gap
+            elif (
+                self._sequence - sequence
+            ) & 0xFFFFFFFF < WEB_AUDIO_REORDER_WINDOW:
+                self.late_frames += 1
+                return
+        self._sequence = sequence
+        self.stream_rate = sample_rate
+        self.frames += 1
+        if samples.dtype.kind == "i":
+            if len(self._block) < len(samples):
+                self._block = np.zeros(len(samples), dtype=np.float32)
+            samples = np.multiply(
+                samples, 1.0 / (MAX_VAL + 1), out=self._block[: len(samples)]
+            )
+        if self._active:
+            try:
+                self.callback(samples, None, None, None)
+            except Exception as e:
+                _LOGGER.error(e)
@@ -0,0 +1,197 @@
+import numpy as np
+
+# frames handed to update events are read later on the event loop, so
+# pipelines whose frames are published rotate through this many buffers
+FRAME_BUFFER_DEPTH = 3
+
+PIXEL_DTYPES = {"float64": np.float64, "float32": np.float32}
+
+
+def pixel_dtype(config):
+    """The dtype effects render pixels in, from the core config"""
+    return PIXEL_DTYPES[config.get("pixel_dtype", "float64")]
+
+
+def output_dtype(config):
+    """
+    The dtype of frames virtuals hand to devices, from the core config.
+    With float32 pixels the frames are finished as ready to send uint8.
+    """
+    if pixel_dtype(config) is np.float64:
+        return np.float64
+    return np.uint8
+
+
+class FrameBufferPool:
+    """
+    Preallocated arrays for the stages of a frame pipeline, keyed by name.
+
+    A buffer is only reallocated when the requested shape or dtype changes,
+    so every frame after the first is written into existing memory. Frames
+    handed to events are read asynchronously on the event loop, so the pool
+    keeps `depth` arrays per name and rotates through them, leaving a frame
+    untouched for `depth - 1` further frames.
+    """
+
+    def __init__(self, depth=1):
+        self._depth = depth
+        self._buffers = {}
+
+    def get(self, name, shape, dtype=np.float64):
+        """Returns the next buffer for name, (re)allocating it if needed"""
+        entry = self._buffers.get(name)
+        if (
+            entry is None
+            or entry[0][0].shape != shape
+            or entry[0][0].dtype != dtype
+        ):
+            entry = [
+                [np.zeros(shape, dtype=dtype) for _ in range(self._depth)],
+                0,
+            ]
+            self._buffers[name] = entry
+        buffers, index = entry
+        entry[1] = (index + 1) % self._depth
+        return buffers[index]
+
+    def clear(self):
+        """Releases all buffers"""
+        self._buffers.clear()
+
+
+def roll_into(source, shift, out):
+    """np.roll along the first axis, writing into out instead of a new array"""
+    length = len(source)
+    if length == 0:
+        return out
+    shift %= length
+    if shift == 0:
+        np.copyto(out, source)
+    else:
+        out[:shift] = source[-shift:]
+        out[shift:] = source[:-shift]
+    return out
+
+
+class SampleRingBuffer:
+    """
+    Single producer, single consumer ring buffer of audio blocks.
+
+    Samples are copied into preallocated memory along with the length of
+    each block written, so the consumer reads back the same blocks. The
+    producer only advances the write counters and the consumer only the
+    read counters, so neither side takes a lock. A block that doesn't fit
+    is dropped whole, leaving the unread blocks intact.
+    """
+
+    def __init__(self, capacity, max_blocks=256, dtype=np.float32):
+        self.capacity = capacity
+        self._samples = np.zeros(capacity, dtype=dtype)
+        self._lengths = np.zeros(max_blocks, dtype=np.int64)
+        self._max_blocks = max_blocks
+        # running totals, the positions in the ring are taken modulo
+        self._written = self._read = 0
+        self._blocks_written = self._blocks_read = 0
+
+    def __len__(self):
+        """Number of unread blocks"""
+        return self._blocks_written - self._blocks_read
+
+    def write(self, block):
+        """Copies a block in. Returns False if it was dropped."""
+        length = len(block)
+        if (
+            length > self.capacity - (self._written - self._read)
+            or len(self) == self._max_blocks
+        ):
+            return False
+        start = self._written % self.capacity
+        head = min(length, self.capacity - start)
+        self._samples[start : start + head] = block[:head]
+        self._samples[: length - head] = block[head:]
+        self._lengths[self._blocks_written % self._max_blocks] = length
+        # publish the samples before the block count the consumer polls
+        self._written += length
+        self._blocks_written += 1
+        return True
+
+    def read_into(self, out):
+        """
+        Copies the next block into out, which must hold capacity samples.
+        Returns a view of out holding the block, or None if there is none.
+        """
+        if not len(self):
+            return None
+        length = int(self._lengths[self._blocks_read % self._max_blocks])
+        start = self._read % self.capacity
+        head = min(length, self.capacity - start)
+        out[:head] = self._samples[start : start + head]
+        out[head:length] = self._samples[: length - head]
+        self._read += length
+        self._blocks_read += 1
+        return out[:length]
+
+
+class DelayLine:
+    """
+    Preallocated ring delaying arrays of a fixed shape, such as frames or
+    audio hops.
+
+    Each array is copied in with a stamp, a time or a running count, and
+    read back once its stamp is at or before a cutoff, the current stamp
+    less the delay. A full ring drops its oldest entry. The arrays handed
+    back are views of the ring, valid until capacity further pushes.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._entries = None
+        self._stamps = np.zeros(capacity)
+        self._written = self._read = 0
+        # stamps of the newest entry pushed and of the last one read back
+        self.pushed_stamp = self.read_stamp = None
+
+    def __len__(self):
+        """Number of entries not read yet"""
+        return self._written - self._read
+
+    def push(self, entry, stamp):
+        """Copies an entry in, restarting the line if its shape changes"""
+        if (
+            self._entries is None
+            or self._entries.shape[1:] != entry.shape
+            or self._entries.dtype != entry.dtype
+        ):
+            self._entries = np.zeros(
+                (self.capacity, *entry.shape), dtype=entry.dtype
+            )
+            self._written = self._read = 0
+        if len(self) == self.capacity:
+            self._read += 1
+        slot = self._written % self.capacity
+        self._entries[slot] = entry
+        self._stamps[slot] = stamp
+        self._written += 1
+        self.pushed_stamp = stamp
+
+    def pop(self, cutoff):
+        """
+        Returns the newest entry stamped at or before cutoff, skipping any
+        older ones, or None if no entry is due
+        """
+        due = None
+        while (
+            self._read < self._written
+            and self._stamps[self._read % self.capacity] <= cutoff
+        ):
+            due = self._read % self.capacity
+            self._read += 1
+        if due is None:
+            return None
+        self.read_stamp = self._stamps[due]
+        return self._entries[due]
+
+    def clear(self):
+        """Drops all entries, keeping the memory"""
+        self._written = self._read = 0
+        self.pushed_stamp = self.read_stamp = None
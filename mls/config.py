@@ -43,6 +43,7 @@ CORE_CONFIG_KEYS_NO_RESTART = [
     "user_presets",
     "visualisation_maxlen",
     "visualisation_fps",
+    "output_latency_target_ms",
 ]
 # Collection of keys that are used for visualisation configuration - used to check if we need to restart the visualisation event listeners
 VISUALISATION_CONFIG_KEYS = [
@@ -141,6 +142,36 @@ CORE_CONFIG_SCHEMA = vol.Schema(
         vol.Optional("global_brightness", default=1.0): vol.All(
             vol.Coerce(float), vol.Range(0, 1.0)
         ),
+        vol.Optional(
+            "render_workers",
+            description="Number of worker processes to render effects in. 0 renders everything in the main process",
+            default=0,
+        ): vol.All(int, vol.Range(0, 64)),
+        vol.Optional(
+            "deduplicate_effects",
+            description="Render identical effects on virtuals of the same size once and share the frames",
+            default=True,
+        ): bool,
+        vol.Optional(
+            "pixel_dtype",
+            description="Precision of effect pixels. float32 also hands devices ready to send 8 bit frames",
+            default="float64",
+        ): vol.In(["float64", "float32"]),
+        vol.Optional(
+            "audio_clocked_rendering",
+            description="Render audio reactive virtuals right after each audio analysis hop instead of on a timer",
+            default=False,
+        ): bool,
+        vol.Optional(
+            "audio_analysis_process",
+            description="Capture and analyse audio in a separate process so it doesn't compete with rendering",
+            default=False,
+        ): bool,
+        vol.Optional(
+            "output_latency_target_ms",
+            description="Output latency every virtual is delayed to line up with. 0 lines them up with the slowest active virtual",
+            default=0,
+        ): vol.All(vol.Coerce(int), vol.Range(0, 2000)),
     },
     extra=vol.ALLOW_EXTRA,
 )
@@ -9,6 +9,12 @@ import serial
 import serial.tools.list_ports
 import voluptuous as vol
 
+from mls.buffers import (
+    FRAME_BUFFER_DEPTH,
+    FrameBufferPool,
+    output_dtype,
+    roll_into,
+)
 from mls.config import save_config
 from mls.events import (
     DeviceCreatedEvent,
@@ -83,6 +89,7 @@ class Device(BaseRegistry):
         self._silence_start = None
         self._device_type = ""
         self._online = True
+        self._buffers = FrameBufferPool(FRAME_BUFFER_DEPTH)
 
     def __del__(self):
         if self._active:
@@ -175,11 +182,28 @@ class Device(BaseRegistry):
         frame = self._pixels
 
         if self._config["center_offset"]:
-            frame = np.roll(frame, self._config["center_offset"], axis=0)
+            frame = roll_into(
+                frame,
+                self._config["center_offset"],
+                self._buffers.get("frame", frame.shape, frame.dtype),
+            )
         return frame
 
+    def frame_bytes(self, data):
+        """
+        Converts a frame to uint8 for packet encoding, in a buffer reused
+        for every frame
+        """
+        if data.dtype == np.uint8:
+            return data
+        byte_data = self._buffers.get("bytes", np.shape(data), np.uint8)
+        np.copyto(byte_data, data, casting="unsafe")
+        return byte_data
+
     def activate(self):
-        self._pixels = np.zeros((self.pixel_count, 3))
+        self._pixels = np.zeros(
+            (self.pixel_count, 3), dtype=output_dtype(self._mls.config)
+        )
         self._active = True
 
     def deactivate(self):
@@ -1,5 +1,6 @@
 import logging
 
+import numpy as np
 import serial
 import voluptuous as vol
 
@@ -43,9 +44,14 @@ class AmbilightUsbDevice(SerialDevice):
         self.color_order = self._config["color_order"]
 
     def flush(self, data):
+        data = self.frame_bytes(data)
         try:
             self.serial.write(
-                packets.build_ambilightusb_packet(data, self.color_order)
+                packets.build_ambilightusb_packet(
+                    data,
+                    self.color_order,
+                    self._buffers.get("ordered", data.shape, np.uint8),
+                )
             )
 
         except serial.SerialException:
@@ -62,7 +62,7 @@ class DDPDevice(UDPDevice):
                 self._sock,
                 self.destination,
                 self._config["port"],
-                data,
+                self.frame_bytes(data),
                 self.frame_count,
             )
             if self.connection_warning:
@@ -86,7 +86,7 @@ class DDPDevice(UDPDevice):
     @staticmethod
     def send_out(sock, dest, port, data, frame_count):
         sequence = frame_count % 15 + 1
-        byteData = data.astype(np.uint8).flatten().tobytes()
+        byteData = data.astype(np.uint8, copy=False).tobytes()
         packets, remainder = divmod(len(byteData), DDPDevice.MAX_DATALEN)
         if remainder == 0:
             packets -= 1  # divmod returns 1 when len(byteData) fits evenly in DDPDevice.MAX_DATALEN
@@ -1,6 +1,5 @@
 import logging
 
-import numpy as np
 import voluptuous as vol
 
 from mls.devices import NetworkedDevice
@@ -68,7 +67,7 @@ class LifxDevice(NetworkedDevice):
 
     def flush(self, data):
         try:
-            byteData = data.astype(np.dtype("B")).reshape(-1, 3)
+            byteData = self.frame_bytes(data).reshape(-1, 3)
             zone_colors = []
 
             for pixel in byteData:
@@ -2,6 +2,15 @@ import struct
 
 import numpy as np
 
+# column order of RGB frames for each Ambilight USB color order
+AMBILIGHT_COLUMN_ORDERS = {
+    "GRB": [1, 0, 2],
+    "BGR": [2, 1, 0],
+    "RBG": [0, 2, 1],
+    "BRG": [2, 0, 1],
+    "GBR": [1, 2, 0],
+}
+
 
 def build_warls_packet(data: np.ndarray, timeout: int, last_frame: np.array):
     """
@@ -17,7 +26,7 @@ def build_warls_packet(data: np.ndarray, timeout: int, last_frame: np.array):
     """
     packet = bytearray([1, (timeout or 1)])
 
-    byteData = data.astype(np.dtype("B"))
+    byteData = data.astype(np.dtype("B"), copy=False)
 
     if last_frame is None or data.shape != last_frame.shape:
         last_frame = np.full(data.shape, np.nan)
@@ -54,7 +63,7 @@ def build_drgb_packet(data: np.ndarray, timeout: int):
     """
     packet = bytearray([2, (timeout or 1)])
 
-    byteData = data.astype(np.dtype("B"))
+    byteData = data.astype(np.dtype("B"), copy=False)
     packet.extend(byteData.flatten().tobytes())
     return packet
 
@@ -71,7 +80,7 @@ def build_rgb_packet(data: np.ndarray):
     2 + n*3 	Blue Value
 
     """
-    byteData = data.astype(np.dtype("B"))
+    byteData = data.astype(np.dtype("B"), copy=False)
     packet = byteData.flatten().tobytes()
     return packet
 
@@ -90,7 +99,7 @@ def build_drgbw_packet(data: np.ndarray, timeout: int):
     """
     packet = bytearray([3, (timeout or 1)])
 
-    byteData = data.astype(np.dtype("B"))
+    byteData = data.astype(np.dtype("B"), copy=False)
     out = np.zeros((len(byteData), 4), dtype="B")
     out[:, :3] = byteData
     # 4th column is unusued white channel -> 0
@@ -119,12 +128,14 @@ def build_dnrgb_packet(
         [4, (timeout or 1), (led_start_index >> 8), (led_start_index & 0x00FF)]
     )  # high byte, then low byte
 
-    byteData = data.astype(np.dtype("B"))
+    byteData = data.astype(np.dtype("B"), copy=False)
     packet.extend(byteData.flatten().tobytes())
     return packet
 
 
-def build_ambilightusb_packet(data: np.ndarray, color_order: str):
+def build_ambilightusb_packet(
+    data: np.ndarray, color_order: str, out: np.ndarray = None
+):
     """
     Generic Ambilight USB serial packet encoding
 
@@ -133,6 +144,9 @@ def build_ambilightusb_packet(data: np.ndarray, color_order: str):
     4 + n*3 	Red Value
     5 + n*3 	Green Value
     6 + n*3 	Blue Value
+
+    Colors are reordered into out if given, a uint8 array shaped like data,
+    otherwise into a new array.
     """
     pixel_length = len(data)
     packet = bytearray(
@@ -146,21 +160,12 @@ def build_ambilightusb_packet(data: np.ndarray, color_order: str):
     )  # high byte, then low byte
     packet.extend([packet[3] ^ packet[4] ^ 0x55])  # checksum
 
-    byteData = data.astype(np.dtype("B"))
-    # if color_order == "RGB": pass
-    if color_order == "GRB":
-        byteData[:, [1, 0]] = byteData[:, [0, 1]]  # swap columns
-    elif color_order == "BGR":
-        byteData[:, [2, 0]] = byteData[:, [0, 2]]
-    elif color_order == "RBG":
-        byteData[:, [2, 1]] = byteData[:, [1, 2]]
-    elif color_order == "BRG":
-        byteData[:, [2, 0]] = byteData[:, [0, 2]]
-        byteData[:, [2, 1]] = byteData[:, [1, 2]]
-    elif color_order == "GBR":
-        byteData[:, [2, 0]] = byteData[:, [0, 2]]
-        byteData[:, [1, 0]] = byteData[:, [0, 1]]
-    packet.extend(byteData.flatten().tobytes())
+    byteData = data.astype(np.dtype("B"), copy=False)
+    order = AMBILIGHT_COLUMN_ORDERS.get(color_order)
+    if order is not None:
+        # data may be the device's own frame, so never reorder it in place
+        byteData = np.take(byteData, order, axis=1, out=out)
+    packet.extend(byteData.tobytes())
     return packet
 
 
@@ -197,6 +202,6 @@ def build_openrgb_packet(
 
     # body
     out = np.zeros((frame_size, 4), dtype="B")
-    out[:, 0:3] = data.astype(np.dtype("B"))
+    out[:, 0:3] = data.astype(np.dtype("B"), copy=False)
     packet.extend(out.flatten().tobytes())
     return packet
@@ -1,7 +1,6 @@
 import logging
 from enum import Enum
 
-import numpy as np
 import voluptuous as vol
 
 from mls.devices import Device
@@ -85,7 +84,7 @@ class RPI_WS281X(Device):
 
     def flush(self, data):
         """Flush LED data to the strip"""
-        byteData = data.astype(np.dtype("B"))
+        byteData = self.frame_bytes(data)
 
         i = 3
         for rgb in byteData:
@@ -59,12 +59,16 @@ class UDPRealtimeDevice(UDPDevice):
         self.last_frame_sent_time = 0
 
     def flush(self, data):
+        data = self.frame_bytes(data)
         try:
             self.choose_and_send_packet(
                 data,
                 self._config["timeout"],
             )
-            self.last_frame = np.copy(data)
+            if self.last_frame.shape == data.shape:
+                np.copyto(self.last_frame, data)
+            else:
+                self.last_frame = np.copy(data)
         except AttributeError:
             self.activate()
 
@@ -1,7 +1,6 @@
 import logging
 
 import flux_led
-import numpy as np
 import voluptuous as vol
 
 from mls.devices import NetworkedDevice
@@ -41,7 +40,7 @@ class ZenggeDevice(NetworkedDevice):
 
     def flush(self, data):
         try:
-            byteData = data.astype(np.dtype("B"))
+            byteData = self.frame_bytes(data)
             rgb = byteData.flatten().tolist()
             self.bulb.setRgb(rgb[0], rgb[1], rgb[2])
 
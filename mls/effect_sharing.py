@@ -0,0 +1,325 @@
+import json
+import logging
+import threading
+import weakref
+
+import numpy as np
+
+from mls.effects.melbank import FrequencyRange
+from mls.events import Event
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _sharing_key(effect, virtual):
+    """
+    The properties that decide what an effect renders. Effects with equal
+    keys produce identical frames and can share a single instance.
+    """
+    governor = getattr(virtual, "governor", None)
+    return (
+        effect.type,
+        json.dumps(dict(effect.config), sort_keys=True, default=str),
+        virtual.effective_pixel_count,
+        virtual.config["frequency_min"],
+        virtual.config["frequency_max"],
+        virtual.config["rows"],
+        governor is None or governor.blur_enabled,
+    )
+
+
+class _SharedGovernor:
+    """The degradation policies shared by the members of a group"""
+
+    def __init__(self, blur_enabled):
+        self.blur_enabled = blur_enabled
+
+
+class _SharedVirtual:
+    """Stand-in for the Virtual the shared instance of an effect renders for"""
+
+    def __init__(self, sharing, key, virtual):
+        self._sharing = sharing
+        self.id = f"shared:{virtual.id}"
+        self.config = dict(virtual.config)
+        self.effective_pixel_count = virtual.effective_pixel_count
+        self.refresh_rate = virtual.refresh_rate
+        self.governor = _SharedGovernor(key[-1])
+        self.frequency_range = FrequencyRange(
+            self.config["frequency_min"], self.config["frequency_max"]
+        )
+
+    def render_delegate(self, effect):
+        # the shared instance may itself be rendered by a worker process
+        render_pool = self._sharing.render_pool
+        if render_pool is None:
+            return None
+        return render_pool.attach(effect, self)
+
+
+class _SharedEffect:
+    """A single effect instance rendering for every member of a group"""
+
+    def __init__(self, sharing, key, effect, virtual):
+        self.key = key
+        self.lock = threading.Lock()
+        self.members = []
+        self.frame = None
+        # bumped on every render, members render again once they have
+        # read the frame of the current generation
+        self.generation = 0
+        self.effect = sharing._mls.effects.create(
+            mls=sharing._mls, type=effect.type, config=dict(effect.config)
+        )
+        self.virtual = _SharedVirtual(sharing, key, virtual)
+        self.effect.activate(self.virtual)
+
+    def update_rate(self):
+        """Renders at the fastest refresh rate of the members"""
+        refresh_rate = max(
+            member._virtual.refresh_rate or 0 for member in self.members
+        )
+        if not refresh_rate or refresh_rate == self.virtual.refresh_rate:
+            return
+        self.virtual.refresh_rate = refresh_rate
+        if self.effect._delegate is not None:
+            self.effect._delegate.update_virtual(self.virtual)
+
+    def read(self, member):
+        with self.lock:
+            if self.effect is None:
+                return None
+            if self.frame is None or member.generation == self.generation:
+                self.effect._render()
+                self.frame = self.effect.get_pixels()
+                self.generation += 1
+            member.generation = self.generation
+            return self.frame
+
+    def close(self, effects):
+        with self.lock:
+            self.effect._deactivate()
+            effects.destroy(self.effect.id)
+            self.effect = None
+            self.frame = None
+
+
+class SharedEffectDelegate:
+    """
+    Handle held by an Effect that shares its frames with identical effects
+    on other virtuals. The effect keeps its usual lifecycle, while render
+    and audio processing happen once in the shared instance of its group.
+    """
+
+    def __init__(self, sharing, effect, virtual):
+        self._sharing = sharing
+        self._effect = effect
+        self._virtual = virtual
+        self._group = None
+        self.generation = -1
+        self._pixels = np.zeros(
+            (virtual.effective_pixel_count, 3), dtype=effect.pixels.dtype
+        )
+        self._remove_listener = sharing._mls.events.add_listener(
+            lambda e: self.update_virtual(virtual),
+            Event.VIRTUAL_CONFIG_UPDATE,
+            {"virtual_id": virtual.id},
+        )
+
+    def read(self):
+        """
+        Returns the latest frame of the shared instance, copied into a
+        buffer that is reused on the next read
+        """
+        group = self._group
+        frame = None if group is None else group.read(self)
+        if frame is None:
+            self._pixels.fill(0)
+        else:
+            np.copyto(self._pixels, frame, casting="unsafe")
+        return self._pixels
+
+    def update_config(self, config):
+        self._sharing.regroup(self)
+
+    def update_virtual(self, virtual):
+        self._sharing.regroup(self)
+
+    def static_frame_version(self):
+        group = self._group
+        effect = None if group is None else group.effect
+        if effect is None:
+            return None
+        return effect.static_frame_version()
+
+    def acquire_audio(self, audio):
+        # the shared instance subscribes to the audio itself
+        pass
+
+    def key(self):
+        return _sharing_key(self._effect, self._virtual)
+
+    def detach(self):
+        if self._remove_listener is None:
+            return
+        self._remove_listener()
+        self._remove_listener = None
+        self._sharing.leave(self)
+
+
+class EffectSharing:
+    """
+    Renders identical effects once, however many virtuals run them.
+
+    Effects of the same type and config on virtuals with the same effective
+    pixel count, frequency range and blur policy are grouped. Each group
+    owns a single instance of the effect which renders at most once per
+    tick, at the fastest refresh rate of its members, and every member of
+    the group is handed that frame. When the config of an effect or its
+    virtual changes, the effect moves to the group matching its new key, so
+    a diverging effect is split off into an instance of its own.
+
+    An effect without an identical one renders in place as usual. Once a
+    second identical effect is attached, the first one is activated again
+    to join the group, and an effect left alone in its group is activated
+    again to render in place.
+    """
+
+    def __init__(self, mls, render_pool=None):
+        self._mls = mls
+        self.render_pool = render_pool
+        self._lock = threading.RLock()
+        self._groups = {}
+        # the effect rendering in place for each key, and its virtual
+        self._solos = {}
+
+    def attach(self, effect, virtual):
+        """
+        Returns the delegate sharing frames for the effect, or None while
+        the effect is the only one of its kind
+        """
+        if effect.type is None:
+            # effects created outside the registry cannot be recreated
+            return None
+        with self._lock:
+            key = _sharing_key(effect, virtual)
+            if key not in self._groups:
+                solo = self._solo(key)
+                if solo is None or solo[1] is virtual:
+                    self._solos[key] = (weakref.ref(effect), virtual)
+                    return None
+                del self._solos[key]
+                self._reactivate_later(*solo)
+            delegate = SharedEffectDelegate(self, effect, virtual)
+            self.regroup(delegate)
+            return delegate
+
+    def regroup(self, delegate):
+        """Moves a delegate to the group matching its current key"""
+        with self._lock:
+            if delegate._remove_listener is None:
+                return
+            key = delegate.key()
+            if delegate._group is not None and delegate._group.key == key:
+                # the refresh rate of the virtual may have changed
+                delegate._group.update_rate()
+                return
+            self._leave(delegate)
+            group = self._groups.get(key)
+            if group is None:
+                group = _SharedEffect(
+                    self, key, delegate._effect, delegate._virtual
+                )
+                self._groups[key] = group
+            group.members.append(delegate)
+            group.update_rate()
+            delegate._group = group
+            delegate.generation = -1
+            if len(group.members) == 1:
+                # render in place unless an identical effect joins first
+                self._reactivate_later(delegate._effect, delegate._virtual)
+
+    def leave(self, delegate):
+        with self._lock:
+            self._leave(delegate)
+
+    def _leave(self, delegate):
+        group = delegate._group
+        if group is None:
+            return
+        delegate._group = None
+        group.members.remove(delegate)
+        if not group.members:
+            del self._groups[group.key]
+            group.close(self._mls.effects)
+            return
+        group.update_rate()
+        if len(group.members) == 1:
+            # the last member goes back to rendering in place, the group
+            # is closed once it has detached
+            member = group.members[0]
+            self._reactivate_later(member._effect, member._virtual)
+
+    def _solo(self, key):
+        """The effect still rendering in place for key, and its virtual"""
+        entry = self._solos.get(key)
+        if entry is None:
+            return None
+        effect, virtual = entry[0](), entry[1]
+        if (
+            effect is None
+            or not effect._active
+            or effect._virtual is not virtual
+            or _sharing_key(effect, virtual) != key
+        ):
+            del self._solos[key]
+            return None
+        return effect, virtual
+
+    def _reactivate_later(self, effect, virtual):
+        """
+        Activates the effect again on the event loop, so it attaches to
+        the sharing that now fits it. The caller may hold the lock of
+        another virtual, so it can't be done right away.
+        """
+        self._mls.loop.call_soon_threadsafe(self._reactivate, effect, virtual)
+
+    def _reactivate(self, effect, virtual):
+        with self._lock:
+            key = _sharing_key(effect, virtual)
+            delegate = effect._delegate
+            if isinstance(delegate, SharedEffectDelegate):
+                group = delegate._group
+                if group is not None and len(group.members) > 1:
+                    return
+            elif key not in self._groups:
+                return
+        with virtual.lock:
+            if virtual.active_effect is effect and effect._active:
+                virtual._reactivate_effect()
+                return
+        # gone before it could join, don't leave the other member alone
+        with self._lock:
+            group = self._groups.get(key)
+            if group is not None and len(group.members) == 1:
+                member = group.members[0]
+                self._reactivate_later(member._effect, member._virtual)
+
+    def stats(self):
+        """Returns the number of effects and the instances rendering them"""
+        with self._lock:
+            return {
+                "effects": sum(
+                    len(group.members) for group in self._groups.values()
+                ),
+                "instances": len(self._groups),
+            }
+
+    def stop(self):
+        with self._lock:
+            for group in self._groups.values():
+                for delegate in group.members:
+                    delegate._group = None
+                group.close(self._mls.effects)
+            self._groups.clear()
+            self._solos.clear()
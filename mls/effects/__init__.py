@@ -8,6 +8,7 @@ import numpy as np
 import voluptuous as vol
 from numpy.typing import NDArray
 
+from mls.buffers import FrameBufferPool, pixel_dtype
 from mls.color import hsv_to_rgb, parse_color, validate_color
 from mls.utils import BaseRegistry, RegistryLoader
 
@@ -40,6 +41,9 @@ class DummyEffect:
     def activate(self):
         pass
 
+    def static_frame_version(self):
+        return None
+
     def _deactivate(self):
         self.deactivate()
 
@@ -281,6 +285,12 @@ class Effect(BaseRegistry):
     _config = None
     _active = False
     _virtual = None
+    # set while the effect is rendered elsewhere, see Virtual.render_delegate
+    _delegate = None
+    # bumped on every config update, and the version the current pixels
+    # were rendered with, see static_frame_version
+    _config_version = 0
+    _rendered_version = None
 
     # Basic effect properties that can be applied to all effects
     CONFIG_SCHEMA = vol.Schema(
@@ -320,6 +330,7 @@ class Effect(BaseRegistry):
         self._mls = mls
         self._config = {}
         self.lock = threading.Lock()
+        self._buffers = FrameBufferPool()
         self.update_config(config)
 
     def __del__(self):
@@ -330,7 +341,11 @@ class Effect(BaseRegistry):
         """Attaches an output channel to the effect"""
         with self.lock:
             self._virtual = virtual
-            self.pixels = np.zeros((virtual.effective_pixel_count, 3))
+            self.pixels = np.zeros(
+                (virtual.effective_pixel_count, 3),
+                dtype=pixel_dtype(self._mls.config),
+            )
+            self._delegate = virtual.render_delegate(self)
             # Iterate all the base classes and check to see if the base
             # class has an on_activate method. If so, call it
             valid_classes = list(type(self).__bases__)
@@ -346,6 +361,9 @@ class Effect(BaseRegistry):
         # deactivation is protected
         with self.lock:
             self.deactivate()
+            if self._delegate is not None:
+                self._delegate.detach()
+                self._delegate = None
 
     def deactivate(self):
         """Detaches an output channel from the effect"""
@@ -404,6 +422,10 @@ class Effect(BaseRegistry):
                 if base.config_updated != super(base, base).config_updated:
                     base.config_updated(self, self._config)
 
+            self._config_version += 1
+            if self._delegate is not None:
+                self._delegate.update_config(self._config)
+
             _LOGGER.debug(
                 f"Effect {self.NAME} config updated to {validated_config}."
             )
@@ -420,8 +442,11 @@ class Effect(BaseRegistry):
     def _render(self):
         with self.lock:
             # its possible we were waiting on the effect being deactivated
-            if self._active:
+            # delegated effects are rendered by their worker process
+            if self._active and self._delegate is None:
+                version = self._config_version
                 self.render()
+                self._rendered_version = version
 
     def render(self):
         """
@@ -432,28 +457,57 @@ class Effect(BaseRegistry):
         """
         pass
 
+    def is_static(self):
+        """
+        Override in effects that render the same frame every tick for as
+        long as their config doesn't change
+        """
+        return False
+
+    def static_frame_version(self):
+        """
+        Returns the config version the current frame was rendered with while
+        the effect is static, or None while it is animated. Virtuals only
+        assemble a static frame again once this changes.
+        """
+        if self._delegate is not None:
+            return self._delegate.static_frame_version()
+        if self.is_static():
+            return self._rendered_version
+        return None
+
     def get_pixels(self):
         """
         Get the current pixels for the effect and apply flip, mirror, blur, brightness and background color transformations
 
+        The returned array is reused for the next frame, so callers must be
+        done with it before rendering again.
+
         Returns:
             numpy.ndarray: The modified pixel array.
         """
         with self.lock:
+            if self._delegate is not None:
+                return self._delegate.read()
             pixels = None
             if hasattr(self, "pixels"):
                 if self.pixels is not None:
-                    pixels = np.copy(self.pixels)
+                    source = self.pixels
+                    pixels = self._buffers.get(
+                        "pixels", source.shape, pixel_dtype(self._mls.config)
+                    )
                     # Grab the config and store it here for use in the function - we use it a lot
                     config = self._config
 
                     # Apply some of the base output filters if necessary
                     if config["flip"]:
-                        pixels = np.flipud(pixels)
+                        source = source[::-1]
                     if config["mirror"]:
-                        pixels = np.concatenate(
-                            (pixels[-1 + len(pixels) % -2 :: -2], pixels[::2])
-                        )
+                        head = source[-1 + len(source) % -2 :: -2]
+                        pixels[: len(head)] = head
+                        pixels[len(head) :] = source[::2]
+                    else:
+                        np.copyto(pixels, source)
                     if config["background_color"]:
                         pixels += self._bg_color
                     if config["brightness"] is not None:
@@ -468,7 +522,13 @@ class Effect(BaseRegistry):
                     # The matrix math requires > 3 pixels to work properly
                     # And blurring with a less than 3 pixels seems... redundant
                     # TODO: Handle RGBW properly
-                    if config["blur"] != 0.0 and self.pixel_count > 3:
+                    # Overloaded virtuals skip the blur, see mls.governor
+                    governor = getattr(self._virtual, "governor", None)
+                    if (
+                        config["blur"] != 0.0
+                        and self.pixel_count > 3
+                        and (governor is None or governor.blur_enabled)
+                    ):
                         kernel = _gaussian_kernel1d(
                             config["blur"], 0, len(pixels)
                         )
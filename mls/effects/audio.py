@@ -1,40 +1,158 @@
 import logging
-import queue
 import threading
 import time
-from collections import deque
-from functools import cached_property, lru_cache
+from collections import Counter, deque
+from functools import cached_property, wraps
 
 import aubio
 import numpy as np
-import samplerate
 import sounddevice as sd
 import voluptuous as vol
 
 import mls.api.websocket
 from mls.api.websocket import WEB_AUDIO_CLIENTS, WebAudioStream
+from mls.buffers import DelayLine, SampleRingBuffer
 from mls.effects import Effect
-from mls.effects.math import ExpFilter
-from mls.effects.melbank import FFT_SIZE, MIC_RATE, Melbanks
-from mls.events import AudioDeviceChangeEvent, Event
+from mls.effects.audio_file import (
+    FILE_AUDIO_HOSTAPI,
+    FILE_AUDIO_INPUTS,
+    REPLAY_SPEEDS,
+    FileAudioStream,
+)
+from mls.effects.math import (
+    ExpFilter,
+    FilterBank,
+    interp_resize,
+    interp_table,
+)
+from mls.effects.melbank import (
+    ANALYSIS_PRESETS,
+    FFT_SIZE,
+    FFT_SIZES,
+    MAX_ANALYSIS_RATE,
+    MIC_RATE,
+    MIN_ANALYSIS_RATE,
+    Melbanks,
+)
+from mls.effects.resample import SincResampler, select_resampler
+from mls.effects.shared_audio import (
+    DecimatedFeatureSource,
+    FilterRegistry,
+    SharedAudioProxy,
+    SharedFilter,
+)
+from mls.events import AudioDeviceChangeEvent, AudioSilenceEvent, Event
 
 _LOGGER = logging.getLogger(__name__)
 
 MIN_MIDI = 21
 MAX_MIDI = 108
 
+# seconds of captured audio the ring buffer between the capture callback
+# and the analysis thread holds
+AUDIO_RING_SECONDS = 1.0
+# hops to wait for captured audio before counting an underrun
+AUDIO_STALL_HOPS = 4
+# what audio reactive virtuals do while the silence gate is closed
+SILENCE_MODES = ("freeze", "idle")
+# render rate of audio reactive virtuals idling through silence, the
+# lowest rate the frame scheduler ticks at
+SILENCE_IDLE_FPS = 10
+
+# audio features that are only analysed while an active effect reads them,
+# with the AudioAnalysisSource method run on every hop for each. "tempo"
+# backs bpm_beat_now, beat_counter and the bar and beat oscillators, and
+# "freq_power" the beat, bass, lows, mids and high powers.
+ANALYSIS_FEATURES = {
+    "pitch": "pitch",
+    "onset": "onset",
+    "tempo": "bar_oscillator",
+    "volume_beat": "volume_beat_now",
+    "freq_power": "freq_power",
+}
+# hops of recent audio replayed into the aubio analyzers when they start
+ANALYZER_WARMUP_HOPS = 30
+# entries of an effect's melbank cache before it is emptied
+MELBANK_CACHE_SIZE = 8
+
+# defaults of the slots of the per-hop feature cache, see hop_cached
+_hop_cache_slots = []
+
+
+def hop_cached(default):
+    """
+    Caches a feature method of an AudioAnalysisSource for the current hop.
+
+    Each cached feature has a fixed slot in the source's feature cache,
+    holding the value along with the id of the hop it was computed on.
+    A new hop only bumps the hop id of the source, and a lookup is a
+    single integer compare.
+
+    Features are only computed on the analysis thread, which runs the
+    analyzers before calling any subscriber. Other threads, such as render
+    threads reading features mid-hop, get the value of the last hop it was
+    computed on, or default before the first. Slots are replaced with a
+    single tuple, so a value is never read with the id of another hop.
+    """
+
+    def decorator(method):
+        slot = len(_hop_cache_slots)
+        _hop_cache_slots.append(default)
+
+        @wraps(method)
+        def cached(self):
+            hop = self._hop_id
+            cached_hop, value = self._feature_cache[slot]
+            if cached_hop == hop or self._analysis_ident not in (
+                None,
+                threading.get_ident(),
+            ):
+                return value
+            value = method(self)
+            self._feature_cache[slot] = (hop, value)
+            return value
+
+        return cached
+
+    return decorator
+
+
+def apply_analysis_preset(config):
+    """
+    Applies the analysis preset of a validated audio config, and raises
+    the hop rate where the hops would be longer than the FFT window
+    """
+    config.update(ANALYSIS_PRESETS.get(config["analysis_preset"], {}))
+    min_sample_rate = -(-config["analysis_rate"] // config["fft_size"])
+    if config["sample_rate"] < min_sample_rate:
+        _LOGGER.warning(
+            f"Audio hops at {config['sample_rate']}Hz are longer than the FFT size, using {min_sample_rate}Hz"
+        )
+        config["sample_rate"] = min_sample_rate
+    return config
+
 
 class AudioInputSource:
     _is_activated = False
     _audio = None
     _stream = None
     _callbacks = []
+    # notified once all callbacks have processed a hop, see add_hop_listener
+    _hop_listeners = []
     _audioWindowSize = 4
     _processed_audio_sample = None
     _volume = -90
     _volume_filter = ExpFilter(-90, alpha_decay=0.99, alpha_rise=0.99)
     _subscriber_threshold = 0
     _timer = None
+    _ring = None
+    _analysis_thread = None
+    _analysis_ident = None
+    # resamples captured blocks to the hop length, see select_resampler
+    _resampler = None
+    _resample_lengths = None
+    # time features are stamped with, simulated when replaying fast
+    _clock = staticmethod(time.time)
 
     @staticmethod
     def device_index_validator(val):
@@ -77,18 +195,35 @@ class AudioInputSource:
 
     @staticmethod
     def query_hostapis():
-        return sd.query_hostapis() + ({"name": "WEB AUDIO"},)
+        return sd.query_hostapis() + (
+            {"name": FILE_AUDIO_HOSTAPI},
+            {"name": "WEB AUDIO"},
+        )
 
     @staticmethod
     def query_devices():
-        return sd.query_devices() + tuple(
-            {
-                "hostapi": len(AudioInputSource.query_hostapis()) - 1,
-                "name": f"{client}",
-                "max_input_channels": 1,
-                "client": client,
-            }
-            for client in WEB_AUDIO_CLIENTS
+        hostapi_count = len(AudioInputSource.query_hostapis())
+        # file inputs come before the web clients to keep their indexes
+        return (
+            sd.query_devices()
+            + tuple(
+                {
+                    "hostapi": hostapi_count - 2,
+                    "name": name,
+                    "max_input_channels": 1,
+                    "replay": name,
+                }
+                for name in FILE_AUDIO_INPUTS
+            )
+            + tuple(
+                {
+                    "hostapi": hostapi_count - 1,
+                    "name": f"{client}",
+                    "max_input_channels": 1,
+                    "client": client,
+                }
+                for client in WEB_AUDIO_CLIENTS
+            )
         )
 
     @staticmethod
@@ -114,9 +249,28 @@ class AudioInputSource:
         audio_analysis = AudioAnalysisSource.CONFIG_SCHEMA
         return vol.Schema(
             {
-                vol.Optional("sample_rate", default=60): int,
+                vol.Optional("sample_rate", default=60): vol.All(
+                    vol.Coerce(int), vol.Range(min=10, max=240)
+                ),
                 vol.Optional("mic_rate", default=44100): int,
-                vol.Optional("fft_size", default=FFT_SIZE): int,
+                vol.Optional(
+                    "fft_size",
+                    default=FFT_SIZE,
+                    description="FFT window size. Smaller windows react quicker and cost less, with less bass resolution",
+                ): vol.All(vol.Coerce(int), vol.In(FFT_SIZES)),
+                vol.Optional(
+                    "analysis_rate",
+                    default=MIC_RATE,
+                    description="Sample rate audio is resampled to for analysis, which caps the highest frequency analysed at half of it",
+                ): vol.All(
+                    vol.Coerce(int),
+                    vol.Range(min=MIN_ANALYSIS_RATE, max=MAX_ANALYSIS_RATE),
+                ),
+                vol.Optional(
+                    "analysis_preset",
+                    default="custom",
+                    description="Overrides the FFT size, analysis rate and sample rate, from low CPU use to low latency",
+                ): vol.In(["custom", *ANALYSIS_PRESETS]),
                 vol.Optional("min_volume", default=0.2): vol.All(
                     vol.Coerce(float), vol.Range(min=0.0, max=10.0)
                 ),
@@ -128,6 +282,36 @@ class AudioInputSource:
                     default=0,
                     description="Add a delay to MusicLedStudio's output to sync with your audio. Useful for Bluetooth devices which typically have a short audio lag.",
                 ): vol.All(vol.Coerce(int), vol.Range(min=0, max=5000)),
+                vol.Optional(
+                    "replay_file",
+                    default="",
+                    description="Audio file played by the Audio file input. WAV, or any format aubio was built to read",
+                ): str,
+                vol.Optional(
+                    "replay_speed",
+                    default="realtime",
+                    description="Speed of the Audio file and test signal inputs. Fast replays as fast as the analysis runs, with simulated time",
+                ): vol.In(REPLAY_SPEEDS),
+                vol.Optional(
+                    "replay_loop",
+                    default=True,
+                    description="Restart the Audio file input when it ends",
+                ): bool,
+                vol.Optional(
+                    "silence_timeout",
+                    default=0,
+                    description="Seconds under min_volume before audio analysis and audio reactive virtuals pause until sound returns. 0 never pauses",
+                ): vol.All(vol.Coerce(float), vol.Range(min=0, max=3600)),
+                vol.Optional(
+                    "silence_hysteresis",
+                    default=0.05,
+                    description="How far above min_volume the volume must rise to end a silence pause",
+                ): vol.All(vol.Coerce(float), vol.Range(min=0, max=1)),
+                vol.Optional(
+                    "silence_mode",
+                    default="freeze",
+                    description="What audio reactive virtuals do during a silence pause: freeze on their last frame or keep rendering at a low idle rate",
+                ): vol.In(SILENCE_MODES),
             },
             extra=vol.ALLOW_EXTRA,
         )
@@ -135,6 +319,21 @@ class AudioInputSource:
     def __init__(self, mls, config):
         self._mls = mls
         self.lock = threading.Lock()
+        self._samples_ready = threading.Event()
+        self._analysis_active = False
+        # blocks dropped because the analysis thread fell behind
+        self._overflows = 0
+        # overflows reported by the audio driver
+        self._input_overflows = 0
+        # waits for captured audio that timed out while the stream was open
+        self._underruns = 0
+        self._hops = 0
+        self._analysis_time = 0.0
+        self._max_analysis_time = 0.0
+        # silence gate, see _silence_gate_closed
+        self._silent = False
+        self._quiet_hops = 0
+        self._silent_hops = 0
         self.update_config(config)
 
         def shutdown_event(e):
@@ -154,7 +353,10 @@ class AudioInputSource:
 
         if self._is_activated:
             self.deactivate()
-        self._config = self.AUDIO_CONFIG_SCHEMA.fget()(config)
+        self._config = apply_analysis_preset(
+            self.AUDIO_CONFIG_SCHEMA.fget()(config)
+        )
+        self._configure_analysis()
         if len(self._callbacks) != 0:
             self.activate()
         if (
@@ -168,6 +370,13 @@ class AudioInputSource:
             )
         self._mls.config["audio"] = self._config
 
+    def _configure_analysis(self):
+        """
+        Called with the audio stream closed whenever the config changes,
+        to rebuild anything depending on it before the stream reopens
+        """
+        pass
+
     def activate(self):
         if self._audio is None:
             try:
@@ -218,31 +427,34 @@ class AudioInputSource:
 
         freq_domain_length = (self._config["fft_size"] // 2) + 1
 
+        analysis_rate = self._config["analysis_rate"]
         self._raw_audio_sample = np.zeros(
-            MIC_RATE // self._config["sample_rate"],
+            analysis_rate // self._config["sample_rate"],
             dtype=np.float32,
         )
 
         # Setup the phase vocoder to perform a windowed FFT
         self._phase_vocoder = aubio.pvoc(
             self._config["fft_size"],
-            MIC_RATE // self._config["sample_rate"],
+            analysis_rate // self._config["sample_rate"],
         )
         self._frequency_domain_null = aubio.cvec(self._config["fft_size"])
         self._frequency_domain = self._frequency_domain_null
         self._frequency_domain_x = np.linspace(
             0,
-            MIC_RATE,
+            analysis_rate,
             freq_domain_length,
         )
 
-        samples_to_delay = int(
+        self._delay_hops = int(
             0.001 * self._config["delay_ms"] * self._config["sample_rate"]
         )
-        if samples_to_delay:
-            self.delay_queue = queue.Queue(maxsize=samples_to_delay)
+        if self._delay_hops:
+            # the delayed hop is read back before the next push overwrites it
+            self.delay_line = DelayLine(self._delay_hops + 1)
+            self._delayed_hops = 0
         else:
-            self.delay_queue = None
+            self.delay_line = None
 
         def open_audio_stream(device_idx):
             device = input_devices[device_idx]
@@ -257,6 +469,13 @@ class AudioInputSource:
                         device["client"], self._audio_sample_callback
                     )
                 )
+            elif hostapis[device["hostapi"]]["name"] == FILE_AUDIO_HOSTAPI:
+                self._stream = FileAudioStream(
+                    device["replay"],
+                    self._config,
+                    self._audio_sample_callback,
+                    backlog=lambda: len(self._ring),
+                )
             else:
                 self._stream = self._audio.InputStream(
                     samplerate=int(device["default_samplerate"]),
@@ -271,12 +490,34 @@ class AudioInputSource:
                     ),
                 )
 
-            self.resampler = samplerate.Resampler("sinc_fastest", channels=1)
+            # libsamplerate keeps its state across blocks of any length
+            self._sinc_resampler = SincResampler()
+            self._resampler = self._resample_lengths = None
 
             _LOGGER.info(
                 f"Audio source opened: {hostapis[device['hostapi']]['name']}: {device.get('name', device.get('client'))}"
             )
 
+            self._stop_analysis()
+            self._ring = SampleRingBuffer(
+                int(
+                    getattr(
+                        self._stream,
+                        "samplerate",
+                        device.get("default_samplerate", MIC_RATE),
+                    )
+                    * ch
+                    * AUDIO_RING_SECONDS
+                )
+            )
+            if getattr(self._stream, "speed", None) == "fast":
+                # simulated time carries on from the previous clock
+                self._clock_origin = max(time.time(), self._clock())
+                self._clock_hops = self._hops + self._silent_hops
+                self._clock = self._replay_clock
+            else:
+                self._clock = time.time
+            self._start_analysis()
             self._stream.start()
 
         try:
@@ -291,6 +532,14 @@ class AudioInputSource:
             _LOGGER.error(f"{e}, Reverting to default input device")
             open_audio_stream(default_device)
 
+    def _replay_clock(self):
+        """
+        Simulated time of the current hop, advancing one hop per hop
+        received, including the hops gated off as silent
+        """
+        hops = self._hops + self._silent_hops - self._clock_hops
+        return self._clock_origin + hops / self._config["sample_rate"]
+
     def deactivate(self):
         with self.lock:
             if self._stream:
@@ -298,6 +547,9 @@ class AudioInputSource:
                 self._stream.close()
                 self._stream = None
             self._is_activated = False
+        self._stop_analysis()
+        self._quiet_hops = 0
+        self._set_silent(False)
         _LOGGER.info("Audio source closed.")
 
     def subscribe(self, callback):
@@ -332,6 +584,20 @@ class AudioInputSource:
         ):
             self.deactivate()
 
+    @classmethod
+    def add_hop_listener(cls, listener):
+        """
+        Registers a listener called after every callback has processed a
+        new audio sample. Unlike subscribers, hop listeners do not keep
+        the audio stream open.
+        """
+        cls._hop_listeners.append(listener)
+
+    @classmethod
+    def remove_hop_listener(cls, listener):
+        if listener in cls._hop_listeners:
+            cls._hop_listeners.remove(listener)
+
     def get_device_index_by_name(self, device_name: str):
         for key, value in self.input_devices().items():
             if device_name == value:
@@ -339,24 +605,83 @@ class AudioInputSource:
         return -1
 
     def _audio_sample_callback(self, in_data, frame_count, time_info, status):
-        """Callback for when a new audio sample is acquired"""
-        # time_start = time.time()
-        # self._raw_audio_sample = np.frombuffer(in_data, dtype=np.float32)
-        raw_sample = np.frombuffer(in_data, dtype=np.float32)
+        """
+        Callback for when a new audio sample is acquired. This runs on the
+        audio driver's thread, so it only queues the samples for the
+        analysis thread and returns.
+        """
+        if status and getattr(status, "input_overflow", False):
+            self._input_overflows += 1
+        if self._ring.write(np.frombuffer(in_data, dtype=np.float32)):
+            self._samples_ready.set()
+        else:
+            self._overflows += 1
+
+    def _start_analysis(self):
+        if self._analysis_thread is not None:
+            return
+        # the config dict may be updated in place before the stream is
+        # reopened, so the hop length the analysis was built for is kept
+        self._hop_length = (
+            self._config["analysis_rate"] // self._config["sample_rate"]
+        )
+        self._analysis_active = True
+        self._analysis_thread = threading.Thread(
+            name="AudioAnalysis", target=self._analysis_loop, daemon=True
+        )
+        self._analysis_thread.start()
 
+    def _stop_analysis(self):
+        thread = self._analysis_thread
+        if thread is None:
+            return
+        self._analysis_active = False
+        self._samples_ready.set()
+        if thread is not threading.current_thread():
+            thread.join()
+        self._analysis_thread = None
+
+    def _analysis_loop(self):
+        """Drains the ring buffer, analysing every captured block in turn"""
+        self._analysis_ident = threading.get_ident()
+        ring = self._ring
+        block = np.zeros(ring.capacity, dtype=np.float32)
+        stall_timeout = AUDIO_STALL_HOPS / self._config["sample_rate"]
+        while self._analysis_active:
+            if not self._samples_ready.wait(stall_timeout):
+                if self._is_activated:
+                    self._underruns += 1
+                continue
+            self._samples_ready.clear()
+            while self._analysis_active:
+                raw_sample = ring.read_into(block)
+                if raw_sample is None:
+                    break
+                start_time = time.perf_counter()
+                try:
+                    self._process_sample(raw_sample)
+                except Exception:
+                    _LOGGER.exception("Error analysing audio sample")
+                self._analysis_time = time.perf_counter() - start_time
+                self._max_analysis_time = max(
+                    self._max_analysis_time, self._analysis_time
+                )
+
+    def _process_sample(self, raw_sample):
+        """Resamples a captured block and runs the analysis on it"""
         in_sample_len = len(raw_sample)
-        out_sample_len = MIC_RATE // self._config["sample_rate"]
-
-        if in_sample_len != out_sample_len:
-            # Simple resampling
-            processed_audio_sample = self.resampler.process(
-                raw_sample,
-                # MIC_RATE / self._stream.samplerate
-                out_sample_len / in_sample_len,
-                # end_of_input=True
+        out_sample_len = self._hop_length
+
+        resampler = self._resampler
+        if self._resample_lengths != (in_sample_len, out_sample_len):
+            resampler = self._resampler = select_resampler(
+                in_sample_len, out_sample_len, self._sinc_resampler
             )
-        else:
-            processed_audio_sample = raw_sample
+            self._resample_lengths = (in_sample_len, out_sample_len)
+            _LOGGER.debug(
+                f"Resampling {in_sample_len} to {out_sample_len} samples with {resampler.path}"
+            )
+        processed_audio_sample = resampler.process(raw_sample)
 
         if len(processed_audio_sample) != out_sample_len:
             _LOGGER.debug(
@@ -364,41 +689,119 @@ class AudioInputSource:
             )
             return
 
-        # handle delaying the audio with the queue
-        if self.delay_queue:
-            try:
-                self.delay_queue.put_nowait(processed_audio_sample)
-            except queue.Full:
-                self._raw_audio_sample = self.delay_queue.get_nowait()
-                self.delay_queue.put_nowait(processed_audio_sample)
-                self.pre_process_audio()
-                self._invalidate_caches()
-                self._invoke_callbacks()
+        # handle delaying the audio, by hops received
+        if self.delay_line:
+            self.delay_line.push(processed_audio_sample, self._delayed_hops)
+            delayed = self.delay_line.pop(
+                self._delayed_hops - self._delay_hops
+            )
+            self._delayed_hops += 1
+            if delayed is not None:
+                self._raw_audio_sample = delayed
+                self._analyse_sample()
         else:
             self._raw_audio_sample = processed_audio_sample
-            self.pre_process_audio()
-            self._invalidate_caches()
-            self._invoke_callbacks()
+            self._analyse_sample()
 
-        # print(f"Core Audio Processing Latency {round(time.time()-time_start, 3)} s")
-        # return self._raw_audio_sample
+    def _analyse_sample(self):
+        """
+        Analyses the raw sample and notifies the subscribers, unless the
+        silence gate is closed, when only the volume is measured
+        """
+        self._update_volume()
+        if self._silence_gate_closed():
+            self._silent_hops += 1
+            return
+        self.pre_process_audio()
+        self._invalidate_caches()
+        self._invoke_callbacks()
+
+    def _silence_gate_closed(self):
+        """
+        Closes the gate once the volume has stayed under min_volume for
+        silence_timeout seconds, and opens it again on the first hop the
+        volume rises silence_hysteresis above it
+        """
+        timeout = self._config["silence_timeout"]
+        threshold = self._config["min_volume"]
+        if self._silent:
+            if (
+                timeout
+                and self._volume
+                <= threshold + self._config["silence_hysteresis"]
+            ):
+                return True
+            self._quiet_hops = 0
+            self._set_silent(False)
+            return False
+        if not timeout or self._volume_filter.value > threshold:
+            self._quiet_hops = 0
+            return False
+        self._quiet_hops += 1
+        if self._quiet_hops < timeout * self._config["sample_rate"]:
+            return False
+        self._set_silent(True)
+        return True
+
+    def _set_silent(self, silent):
+        if silent == self._silent:
+            return
+        self._silent = silent
+        if silent:
+            _LOGGER.info("Audio is silent, pausing audio analysis.")
+        else:
+            _LOGGER.info("Audio is back, resuming audio analysis.")
+        self._mls.events.fire_event(AudioSilenceEvent(silent))
+
+    def diagnostics(self):
+        """Returns counters on the health of audio capture and analysis"""
+        diagnostics = {
+            "active": self._is_activated,
+            "hops": self._hops,
+            "overflows": self._overflows,
+            "input_overflows": self._input_overflows,
+            "underruns": self._underruns,
+            "queued_blocks": len(self._ring) if self._ring else 0,
+            "analysis_ms": round(self._analysis_time * 1000, 3),
+            "max_analysis_ms": round(self._max_analysis_time * 1000, 3),
+            "subscribers": len(self._callbacks),
+            "fft_size": self._config["fft_size"],
+            "analysis_rate": self._config["analysis_rate"],
+            "sample_rate": self._config["sample_rate"],
+            "resampler": self._resampler.path if self._resampler else None,
+            "silent": self._silent,
+            "silent_hops": self._silent_hops,
+        }
+        if isinstance(self._stream, FileAudioStream):
+            diagnostics["replay"] = {
+                "input": self._stream.name,
+                "speed": self._stream.speed,
+                "blocks": self._stream.blocks,
+            }
+        elif isinstance(self._stream, WebAudioStream):
+            diagnostics["web_audio"] = {
+                "client": self._stream.client,
+                "sample_rate": self._stream.stream_rate,
+                "frames": self._stream.frames,
+                "dropped_frames": self._stream.dropped_frames,
+                "late_frames": self._stream.late_frames,
+            }
+        return diagnostics
 
     def _invoke_callbacks(self):
         """Notifies all clients of the new data"""
+        self._hops += 1
         for callback in self._callbacks:
             callback()
+        for listener in self._hop_listeners:
+            listener()
 
     def _invalidate_caches(self):
         """Invalidates the necessary cache"""
         pass
 
-    def pre_process_audio(self):
-        """
-        Pre-processing stage that will run on every sample, only
-        core functionality that will be used for every audio effect
-        should be done here. Everything else should be deferred until
-        queried by an effect.
-        """
+    def _update_volume(self):
+        """Measures the volume of every sample, for silence detection"""
         # clean up nans that have been mysteriously appearing..
         self._raw_audio_sample[np.isnan(self._raw_audio_sample)] = 0
 
@@ -407,6 +810,13 @@ class AudioInputSource:
         self._volume = max(0, min(1, self._volume))
         self._volume_filter.update(self._volume)
 
+    def pre_process_audio(self):
+        """
+        Pre-processing stage that will run on every sample the silence
+        gate lets through, only core functionality that will be used for
+        every audio effect should be done here. Everything else should be
+        deferred until queried by an effect.
+        """
         # Calculate the frequency domain from the filtered data and
         # force all zeros when below the volume threshold
         if self._volume_filter.value > self._config["min_volume"]:
@@ -441,7 +851,7 @@ class AudioInputSource:
         return self._volume
 
 
-class AudioAnalysisSource(AudioInputSource):
+class AudioAnalysisSource(DecimatedFeatureSource, AudioInputSource):
     # https://aubio.org/doc/latest/pitch_8h.html
     PITCH_METHODS = [
         "yinfft",
@@ -498,20 +908,118 @@ class AudioAnalysisSource(AudioInputSource):
 
     def __init__(self, mls, config):
         config = self.CONFIG_SCHEMA(config)
+        # effects using each feature, see acquire_features
+        self._feature_users = Counter()
+        self._feature_lock = threading.Lock()
+        self._analyzers = ()
+        self._warmup = set()
+        self._sample_history = None
+        self._history_hops = 0
+        # id of the current hop and the features cached on it, see hop_cached
+        self._hop_id = 0
+        self._feature_cache = [(-1, default) for default in _hop_cache_slots]
+        # feature streams for effects updating slower than the hop rate
+        self._decimators = {}
+        self.filters = FilterRegistry(self)
         super().__init__(mls, config)
-        self.initialise_analysis()
 
         # Subscribe functions to be run on every frame of audio
         self.subscribe(self.melbanks)
-        self.subscribe(self.pitch)
-        self.subscribe(self.onset)
-        self.subscribe(self.bar_oscillator)
-        self.subscribe(self.volume_beat_now)
-        self.subscribe(self.freq_power)
+        self.subscribe(self._run_analyzers)
+        self.subscribe(self.filters)
 
         # ensure any new analysis callbacks are above this line
         self._subscriber_threshold = len(self._callbacks)
 
+    def acquire_features(self, features):
+        """
+        Registers a user of the given ANALYSIS_FEATURES. Analyzers are only
+        run while they have users, and are warmed up on the first one.
+        Every call must be matched by a call to release_features.
+        """
+        with self._feature_lock:
+            for feature in features:
+                self._feature_users[feature] += 1
+                if self._feature_users[feature] == 1:
+                    self._warmup.add(feature)
+            self._update_analyzers()
+
+    def release_features(self, features):
+        """Unregisters a user of the given ANALYSIS_FEATURES"""
+        with self._feature_lock:
+            for feature in features:
+                self._feature_users[feature] -= 1
+                if self._feature_users[feature] <= 0:
+                    del self._feature_users[feature]
+                    self._warmup.discard(feature)
+            self._update_analyzers()
+
+    def feature_active(self, feature):
+        """Returns True if the analyzer of a feature runs every hop"""
+        return feature in self._feature_users
+
+    def _update_analyzers(self):
+        # swapped in whole, the analysis thread iterates over the tuple
+        self._analyzers = tuple(
+            getattr(self, method)
+            for feature, method in ANALYSIS_FEATURES.items()
+            if feature in self._feature_users
+        )
+
+    def _run_analyzers(self):
+        """Runs the analyzers of the features in use on the current hop"""
+        self._record_history()
+        if self._warmup:
+            with self._feature_lock:
+                warmup, self._warmup = self._warmup, set()
+            for feature in warmup:
+                self._warm_up(feature)
+        for analyzer in self._analyzers:
+            analyzer()
+
+    def _record_history(self):
+        sample = self._raw_audio_sample
+        history = self._sample_history
+        if history is None or history.shape[1:] != sample.shape:
+            history = self._sample_history = np.zeros(
+                (ANALYZER_WARMUP_HOPS, *sample.shape), dtype=sample.dtype
+            )
+            self._history_hops = 0
+        history[self._history_hops % ANALYZER_WARMUP_HOPS] = sample
+        self._history_hops += 1
+
+    def _warm_up(self, feature):
+        """
+        Replays the recorded hops before the current one into a starting
+        analyzer, so it doesn't work from the state it was left in
+        """
+        if feature == "volume_beat":
+            self.beat_power_history.clear()
+            return
+        analyzer = {
+            "pitch": self._pitch,
+            "onset": self._onset,
+            "tempo": self._tempo,
+        }.get(feature)
+        if analyzer is None:
+            return
+        # the current hop is analysed as usual
+        end = self._history_hops - 1
+        start = end - min(end, ANALYZER_WARMUP_HOPS - 1)
+        for hop in range(start, end):
+            try:
+                analyzer(self._sample_history[hop % ANALYZER_WARMUP_HOPS])
+            except ValueError as e:
+                _LOGGER.warning(e)
+                return
+
+    def diagnostics(self):
+        diagnostics = super().diagnostics()
+        diagnostics["analyzers"] = sorted(self._feature_users)
+        diagnostics["decimators"] = self.decimator_diagnostics()
+        diagnostics["shared_filters"] = len(self.filters)
+        return diagnostics
+
     def initialise_analysis(self):
         # melbanks
         if not hasattr(self, "melbanks"):
@@ -519,10 +1027,11 @@ class AudioAnalysisSource(AudioInputSource):
                 self._mls, self, self._mls.config.get("melbanks", {})
             )
 
+        analysis_rate = self._config["analysis_rate"]
         fft_params = (
             self._config["fft_size"],
-            MIC_RATE // self._config["sample_rate"],
-            MIC_RATE,
+            analysis_rate // self._config["sample_rate"],
+            analysis_rate,
         )
 
         # pitch, tempo, onset
@@ -536,7 +1045,7 @@ class AudioAnalysisSource(AudioInputSource):
         self.beat_counter = 0
 
         # beat oscillator
-        self.beat_timestamp = time.time()
+        self.beat_timestamp = self._clock()
         self.beat_period = 2
 
         # freq power
@@ -583,25 +1092,33 @@ class AudioAnalysisSource(AudioInputSource):
         self.beat_min_amplitude = 0.5
         self.beat_power_history_len = int(self._config["sample_rate"] * 0.2)
 
-        self.beat_prev_time = time.time()
+        self.beat_prev_time = self._clock()
         self.beat_power_history = deque(maxlen=self.beat_power_history_len)
 
     def update_config(self, config):
         validated_config = self.CONFIG_SCHEMA(config)
         super().update_config(validated_config)
+
+    def _configure_analysis(self):
+        # the melbank coefficients are built for the FFT size and rate
+        melbank_params = (
+            self._config["fft_size"],
+            self._config["analysis_rate"],
+        )
+        if (
+            hasattr(self, "melbanks")
+            and melbank_params != self._melbank_params
+        ):
+            self.melbanks.update_config(self.melbanks.melbanks_config)
+        self._melbank_params = melbank_params
         self.initialise_analysis()
 
     def _invalidate_caches(self):
-        """Invalidates the cache for all melbank related data"""
+        """Starts a new hop, invalidating the hop cached features"""
         super()._invalidate_caches()
+        self._hop_id += 1
 
-        self.pitch.cache_clear()
-        self.onset.cache_clear()
-        self.bpm_beat_now.cache_clear()
-        self.volume_beat_now.cache_clear()
-        self.bar_oscillator.cache_clear()
-
-    @lru_cache(maxsize=None)
+    @hop_cached(default=0)
     def pitch(self):
         # If our audio handler is returning null, then we just return 0 for midi_value and wait for the device starts sending audio.
         try:
@@ -610,7 +1127,7 @@ class AudioAnalysisSource(AudioInputSource):
             _LOGGER.warning(e)
             return 0
 
-    @lru_cache(maxsize=None)
+    @hop_cached(default=False)
     def onset(self):
         try:
             return bool(self._onset(self.audio_sample(raw=True))[0])
@@ -618,7 +1135,7 @@ class AudioAnalysisSource(AudioInputSource):
             _LOGGER.warning(e)
             return 0
 
-    @lru_cache(maxsize=None)
+    @hop_cached(default=False)
     def bpm_beat_now(self):
         """
         Returns True if a beat is expected now based on BPM data
@@ -629,7 +1146,7 @@ class AudioAnalysisSource(AudioInputSource):
             _LOGGER.warning(e)
             return False
 
-    @lru_cache(maxsize=None)
+    @hop_cached(default=False)
     def volume_beat_now(self):
         """
         Returns True if a beat is expected now based on volume of the beat freq region
@@ -638,7 +1155,7 @@ class AudioAnalysisSource(AudioInputSource):
         implementation in systematic_leds
         """
 
-        time_now = time.time()
+        time_now = self._clock()
         melbank = self.melbanks.melbanks[0][: self.beat_max_mel_index]
         beat_power = np.sum(melbank)
         melbank_max = np.max(melbank)
@@ -727,7 +1244,7 @@ class AudioAnalysisSource(AudioInputSource):
         """
         return self.get_freq_power(3, filtered)
 
-    @lru_cache(maxsize=None)
+    @hop_cached(default=0)
     def bar_oscillator(self):
         """
         Returns a float (0<=x<4) corresponding to the position of the beat
@@ -753,10 +1270,10 @@ class AudioAnalysisSource(AudioInputSource):
             self.beat_counter = (self.beat_counter + 1) % 4
             self.beat_period = self._tempo.get_period_s()
             # print("beat at:", self._tempo.get_delay_s())
-            self.beat_timestamp = time.time()
+            self.beat_timestamp = self._clock()
             oscillator = self.beat_counter
         else:
-            time_since_beat = time.time() - self.beat_timestamp
+            time_since_beat = self._clock() - self.beat_timestamp
             oscillator = (
                 1 - (self.beat_period - time_since_beat) / self.beat_period
             ) + self.beat_counter
@@ -796,44 +1313,115 @@ class AudioReactiveEffect(Effect):
         "Mids": "mids_power",
         "High": "high_power",
     }
+    # ANALYSIS_FEATURES read by the effect beyond the melbanks and volume.
+    # Their analyzers run while the effect is active.
+    AUDIO_FEATURES = tuple(ANALYSIS_FEATURES)
+    # Updates per second the effect needs. Effects with a rate below the
+    # hop rate of the audio source get features aggregated over several
+    # hops, see FeatureDecimator. None updates the effect on every hop.
+    AUDIO_UPDATE_RATE = None
 
     def __init__(self, mls, config):
+        # shared filters by signal, effects create them on config updates
+        self._shared_filters = {}
+        # the filters of the effect's own values, see update_filters
+        self._filter_bank = FilterBank()
+        # the features handed to the effect, the source or a decimator
+        self._features = None
+        # id of the current audio update and the melbanks built on it
+        self._hop_id = 0
+        self._melbank_cache = {}
         super().__init__(mls, config)
         # protect against possible deactivate race condition
         self.audio = None
+        self._acquired_features = ()
+        self._melbanks_buffers = None
 
     def activate(self, channel):
         _LOGGER.info("Activating AudioReactiveEffect.")
         super().activate(channel)
 
-        if not self._mls.audio or id(AudioAnalysisSource) != id(
-            self._mls.audio.__class__
+        if not self._mls.audio or (
+            not isinstance(self._mls.audio, SharedAudioProxy)
+            and id(AudioAnalysisSource) != id(self._mls.audio.__class__)
         ):
-            self._mls.audio = AudioAnalysisSource(
+            if self._mls.config.get("audio_analysis_process", False):
+                from mls.effects.audio_process import AudioProcessSource
+
+                source = AudioProcessSource
+            else:
+                source = AudioAnalysisSource
+            self._mls.audio = source(
                 self._mls, self._mls.config.get("audio", {})
             )
 
         self.audio = self._mls.audio
-        self._mls.audio.subscribe(self._audio_data_updated)
+        self._acquired_features = self.AUDIO_FEATURES
+        self.audio.acquire_features(self._acquired_features)
+        if self._delegate is not None:
+            # rendered by a worker, which reads the features published
+            # from this source instead of being called back directly
+            self._delegate.acquire_audio(self.audio)
+        else:
+            if self.AUDIO_UPDATE_RATE is None:
+                self._features = self.audio
+            else:
+                self._features = self.audio.decimated(self.AUDIO_UPDATE_RATE)
+            for shared_filter in self._shared_filters.values():
+                shared_filter.bind(self._features.filters)
+            self._features.subscribe(self._audio_data_updated)
 
     def deactivate(self):
         _LOGGER.info("Deactivating AudioReactiveEffect.")
         if self.audio:
-            self.audio.unsubscribe(self._audio_data_updated)
+            if self._features is not None:
+                self._features.unsubscribe(self._audio_data_updated)
+                for shared_filter in self._shared_filters.values():
+                    shared_filter.release()
+                if self._features is not self.audio:
+                    self.audio.release_decimated(self._features)
+                self._features = None
+            self.audio.release_features(self._acquired_features)
+            self._acquired_features = ()
         super().deactivate()
 
-    def create_filter(self, alpha_decay, alpha_rise):
-        # TODO: Since most effects reuse the same general filters it would be
-        # nice for all that computation to be shared. This mean that shared
-        # filters are needed, or if there is really just a small set of filters
-        # that those get added to the Melbank input source instead.
-        return ExpFilter(alpha_decay=alpha_decay, alpha_rise=alpha_rise)
+    def create_filter(self, alpha_decay, alpha_rise, signal=None):
+        """
+        Returns an ExpFilter for the effect to update. The filters of an
+        effect's own values share one FilterBank: stage each of them and
+        call update_filters once, or update a lone filter directly.
+        Filters of a signal of the audio source (see FILTER_SIGNALS) are
+        shared with the other effects smoothing it the same way and updated
+        once per hop by the source, so the effect only reads their value.
+        An effect has one shared filter per signal, creating another
+        replaces it.
+        """
+        if signal is None:
+            return self._filter_bank.add(alpha_decay, alpha_rise)
+        shared_filter = SharedFilter(signal, alpha_decay, alpha_rise)
+        previous = self._shared_filters.get(signal)
+        if previous is not None:
+            previous.release()
+        self._shared_filters[signal] = shared_filter
+        if self._features is not None:
+            shared_filter.bind(self._features.filters)
+        return shared_filter
+
+    def update_filters(self):
+        """Smooths the effect's own filters towards their staged values"""
+        self._filter_bank.update()
 
     def _audio_data_updated(self):
-        self.melbank.cache_clear()
+        # invalidates the melbanks cached on the previous update
+        self._hop_id += 1
+        melbanks = self.audio.melbanks.melbanks
+        if melbanks is not self._melbanks_buffers:
+            # the melbanks have been rebuilt, possibly with new frequencies
+            self._melbanks_buffers = melbanks
+            self.clear_melbank_freq_props()
         with self.lock:
             if self.is_active:
-                self.audio_data_updated(self.audio)
+                self.audio_data_updated(self._features)
 
     def audio_data_updated(self, data):
         """
@@ -858,7 +1446,7 @@ class AudioReactiveEffect(Effect):
             if hasattr(self, prop):
                 delattr(self, prop)
 
-        self._melbank_interp_linspaces.cache_clear()
+        self._melbank_cache.clear()
 
     @cached_property
     def _selected_melbank(self):
@@ -908,12 +1496,6 @@ class AudioReactiveEffect(Effect):
     def _input_mel_length(self):
         return self._melbank_max_idx - self._melbank_min_idx
 
-    @lru_cache(maxsize=16)
-    def _melbank_interp_linspaces(self, size):
-        old = np.linspace(0, 1, self._input_mel_length)
-        new = np.linspace(0, 1, size)
-        return (new, old)
-
     def melbank_no_nan(self, melbank):
         # Check for NaN values in the melbank array, replace with 0 in place
         # Difficult to determine why this happens, but it seems to be related to
@@ -926,7 +1508,6 @@ class AudioReactiveEffect(Effect):
             # Replace NaN values with 0
             np.nan_to_num(melbank, copy=False)
 
-    @lru_cache(maxsize=None)
     def melbank(self, filtered=False, size=0):
         """
         This little bit of code pulls together information from the effect's
@@ -935,20 +1516,41 @@ class AudioReactiveEffect(Effect):
 
         size, int      : interpolate the melbank to the target size. value of 0 is no interpolation
         filtered, bool : melbank with smoothed attack and decay
+
+        The melbank is cached until the next audio update, tagged with the
+        id of the update it was built on so a lookup is an integer compare.
+        A render thread building it mid-update tags it with the update it
+        started on.
         """
+        hop = self._hop_id
+        key = (filtered, size)
+        cached_hop, melbank = self._melbank_cache.get(key, (-1, None))
+        if cached_hop == hop:
+            return melbank
+        melbank = self._build_melbank(filtered, size)
+        if len(self._melbank_cache) >= MELBANK_CACHE_SIZE:
+            self._melbank_cache.clear()
+        self._melbank_cache[key] = (hop, melbank)
+        return melbank
+
+    def _build_melbank(self, filtered, size):
+        melbanks = (self._features or self.audio).melbanks
         if filtered:
-            melbank = self.audio.melbanks.melbanks_filtered[
-                self._selected_melbank
-            ][self._melbank_min_idx : self._melbank_max_idx]
+            values = melbanks.melbanks_filtered[self._selected_melbank]
         else:
-            melbank = self.audio.melbanks.melbanks[self._selected_melbank][
-                self._melbank_min_idx : self._melbank_max_idx
-            ]
+            values = melbanks.melbanks[self._selected_melbank]
+        melbank = values[self._melbank_min_idx : self._melbank_max_idx]
 
         self.melbank_no_nan(melbank)
 
         if size and (self._input_mel_length != size):
-            return np.interp(*self._melbank_interp_linspaces(size), melbank)
+            # resized straight from the melbank, the table takes the slice
+            return interp_resize(
+                values,
+                interp_table(
+                    self._melbank_min_idx, self._melbank_max_idx, size
+                ),
+            )
         else:
             return melbank
 
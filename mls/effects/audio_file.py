@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+
+import aubio
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+# pseudo host api listing the replay inputs alongside the hardware devices
+FILE_AUDIO_HOSTAPI = "FILE AUDIO"
+# the input replaying the "replay_file" of the audio config
+AUDIO_FILE_INPUT = "Audio file"
+# generated inputs, by name
+TEST_SIGNALS = {
+    "Test signal: beat": "beat",
+    "Test signal: sweep": "sweep",
+    "Test signal: noise": "noise",
+}
+FILE_AUDIO_INPUTS = (AUDIO_FILE_INPUT, *TEST_SIGNALS)
+REPLAY_SPEEDS = ("realtime", "fast")
+# sample rate of the generated test signals
+TEST_SIGNAL_RATE = 44100
+# seconds of generated signal, looped
+TEST_SIGNAL_SECONDS = 8
+# blocks the analysis may have queued before fast replay waits for it
+FAST_REPLAY_BACKLOG = 4
+# seconds fast replay sleeps while the analysis catches up
+FAST_REPLAY_POLL = 0.0005
+
+
+def generate_test_signal(
+    kind, rate=TEST_SIGNAL_RATE, seconds=TEST_SIGNAL_SECONDS
+):
+    """
+    Generates one loop of a deterministic test signal:
+        beat:  a kick drum at 120 BPM over a bass note and a pad of tones
+        sweep: a logarithmic sine sweep from 20Hz to 16kHz
+        noise: white noise
+    """
+    t = np.arange(int(rate * seconds)) / rate
+    if kind == "beat":
+        beat_time = t % 0.5
+        kick = np.sin(2 * np.pi * 60 * beat_time) * np.exp(-beat_time * 20)
+        signal = (
+            0.6 * kick
+            + 0.2 * np.sin(2 * np.pi * 110 * t)
+            + 0.1 * np.sin(2 * np.pi * 440 * t)
+            + 0.05 * np.sin(2 * np.pi * 3520 * t)
+        )
+    elif kind == "sweep":
+        ratio = np.log(16000 / 20)
+        phase = 2 * np.pi * 20 * seconds / ratio
+        signal = 0.5 * np.sin(phase * (np.exp(t / seconds * ratio) - 1))
+    elif kind == "noise":
+        signal = 0.3 * np.random.default_rng(0).standard_normal(len(t))
+    else:
+        raise ValueError(f"Unknown test signal {kind}")
+    return np.clip(signal, -1.0, 1.0).astype(np.float32)
+
+
+class _FileReader:
+    """Reads blocks of an audio file with aubio, mixed down to mono"""
+
+    def __init__(self, path, block_size):
+        try:
+            self._source = aubio.source(path, 0, block_size)
+        except RuntimeError as e:
+            raise OSError(f"Unable to read audio file {path}: {e}") from e
+        self.samplerate = self._source.samplerate
+
+    def read(self):
+        """Returns the next block, or None at the end of the file"""
+        block, read = self._source()
+        return block[:read] if read else None
+
+    def rewind(self):
+        self._source.seek(0)
+
+    def close(self):
+        self._source.close()
+
+
+class _SignalReader:
+    """Reads blocks of a generated test signal"""
+
+    def __init__(self, kind, block_size):
+        self.samplerate = TEST_SIGNAL_RATE
+        self._signal = generate_test_signal(kind)
+        self._block_size = block_size
+        self._position = 0
+
+    def read(self):
+        start = self._position
+        if start >= len(self._signal):
+            return None
+        self._position += self._block_size
+        return self._signal[start : self._position]
+
+    def rewind(self):
+        self._position = 0
+
+    def close(self):
+        pass
+
+
+class FileAudioStream:
+    """
+    Replays an audio file or a generated test signal into an audio source
+    in blocks of one hop, like the capture callback of an input stream.
+
+    At "realtime" speed the blocks are paced to the hop rate. At "fast"
+    speed they are fed as fast as the analysis takes them, never letting
+    more than FAST_REPLAY_BACKLOG blocks queue up, and the audio source
+    simulates its clock from the hops analysed. Replay restarts from the
+    beginning whenever the stream is started.
+    """
+
+    def __init__(self, name, config, callback, backlog=None):
+        self.name = name
+        self.callback = callback
+        self._backlog = backlog
+        self.speed = config["replay_speed"]
+        self._loop = config["replay_loop"]
+        self._hop_rate = config["sample_rate"]
+        if name == AUDIO_FILE_INPUT:
+            path = config["replay_file"]
+            if not path:
+                raise OSError("No replay_file set in the audio config")
+            # the block size follows the file's rate, read with a probe
+            probe = _FileReader(path, 512)
+            rate = probe.samplerate
+            probe.close()
+            self._reader = _FileReader(path, int(rate / self._hop_rate))
+        else:
+            self._reader = _SignalReader(
+                TEST_SIGNALS[name], int(TEST_SIGNAL_RATE / self._hop_rate)
+            )
+        self.samplerate = self._reader.samplerate
+        self._active = False
+        self._thread = None
+        self.blocks = 0
+
+    def start(self):
+        self.stop()
+        self._reader.rewind()
+        self.blocks = 0
+        self._active = True
+        self._thread = threading.Thread(
+            name="FileAudioReplay", target=self._replay, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._active = False
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._thread = None
+
+    def close(self):
+        self.stop()
+        self._reader.close()
+
+    def _replay(self):
+        interval = 1.0 / self._hop_rate
+        next_block = time.perf_counter()
+        while self._active:
+            block = self._reader.read()
+            if block is None:
+                if not self._loop:
+                    _LOGGER.info(f"Finished replaying {self.name}")
+                    return
+                self._reader.rewind()
+                continue
+            if self.speed == "fast":
+                while (
+                    self._active
+                    and self._backlog is not None
+                    and self._backlog() >= FAST_REPLAY_BACKLOG
+                ):
+                    time.sleep(FAST_REPLAY_POLL)
+            else:
+                next_block += interval
+                delay = next_block - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # fell behind, e.g. the process was suspended
+                    next_block = time.perf_counter()
+            self.blocks += 1
+            try:
+                self.callback(block, len(block), None, None)
+            except Exception:
+                _LOGGER.exception(f"Error replaying {self.name}")
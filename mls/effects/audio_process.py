@@ -0,0 +1,298 @@
+import logging
+import logging.handlers
+import multiprocessing
+import threading
+
+from mls.effects.shared_audio import (
+    SharedAudioProxy,
+    SharedAudioPublisher,
+    _MelbanksView,
+)
+from mls.events import Event
+
+_LOGGER = logging.getLogger(__name__)
+
+# core config keys the audio sources read, copied into the analysis process
+ANALYSIS_CONFIG_KEYS = ("audio", "melbanks", "melbank_collection")
+# seconds to wait for the analysis process to answer a diagnostics request
+DIAGNOSTICS_TIMEOUT = 1.0
+
+
+class _AnalysisEvents:
+    """Forwards the events fired by the audio sources to the main process"""
+
+    def __init__(self, send):
+        self._send = send
+
+    def fire_event(self, event):
+        self._send("event", event)
+
+    def add_listener(self, callback, event_type, event_filter={}):
+        # the analysis process is shut down by the main process instead
+        return lambda: None
+
+
+class _AnalysisContext:
+    """
+    The subset of the core object that the audio sources use, recreated
+    inside the analysis process
+    """
+
+    def __init__(self, config, send):
+        self.config = config
+        self.events = _AnalysisEvents(send)
+
+    def dev_enabled(self):
+        return False
+
+    def stop(self):
+        _LOGGER.critical("Audio analysis process is unable to continue")
+
+
+class AudioAnalysisWorker:
+    """
+    Runs inside the analysis process. Owns the AudioAnalysisSource, which
+    captures and analyses the audio, and publishes its features into a
+    shared memory feature record once per hop.
+    """
+
+    def __init__(self, conn, config):
+        # imported here so the main process only loads what it uses
+        from mls.effects.audio import AudioAnalysisSource
+
+        self._conn = conn
+        self._send_lock = threading.Lock()
+        self._running = True
+        self._ctx = _AnalysisContext(config, self.send)
+        self._audio = AudioAnalysisSource(self._ctx, config.get("audio", {}))
+        self._publisher = SharedAudioPublisher(
+            self._audio,
+            on_layout=lambda name, layout: self.send("layout", name, layout),
+            on_hop=lambda: self.send("hop"),
+        )
+        self._publisher.ensure_record()
+        self._subscribed = False
+
+    def send(self, *message):
+        with self._send_lock:
+            try:
+                self._conn.send(message)
+            except (BrokenPipeError, OSError):
+                self._running = False
+
+    def run(self):
+        while self._running:
+            try:
+                command, *args = self._conn.recv()
+            except (EOFError, OSError):
+                # the main process has gone away
+                break
+            try:
+                getattr(self, f"_{command}")(*args)
+            except Exception:
+                _LOGGER.exception(f"Audio analysis: Error handling {command}")
+        self._audio.unsubscribe(self._publisher)
+        self._audio.deactivate()
+        self._publisher.close()
+
+    def _stop(self):
+        self._running = False
+
+    def _subscribe(self):
+        if not self._subscribed:
+            self._subscribed = True
+            self._audio.subscribe(self._publisher)
+
+    def _unsubscribe(self):
+        if self._subscribed:
+            self._subscribed = False
+            self._audio.unsubscribe(self._publisher)
+
+    def _acquire_features(self, features):
+        self._audio.acquire_features(features)
+
+    def _release_features(self, features):
+        self._audio.release_features(features)
+
+    def _config(self, audio_config):
+        self._audio.update_config(audio_config)
+
+    def _melbanks(self, melbanks_config, melbank_collection):
+        self._ctx.config["melbank_collection"] = melbank_collection
+        self._audio.melbanks.update_config(melbanks_config)
+        self._publisher.ensure_record()
+
+    def _diagnostics(self):
+        self.send("diagnostics", self._audio.diagnostics())
+
+
+def _analysis_main(conn, config, log_queue, log_level):
+    root_logger = logging.getLogger()
+    root_logger.handlers.clear()
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(log_level)
+    AudioAnalysisWorker(conn, config).run()
+
+
+class _PendingMelbanks:
+    """
+    Melbanks of the analysis process before it has published its layout,
+    which can only be reconfigured
+    """
+
+    def __init__(self, source):
+        self._source = source
+
+    def update_config(self, config):
+        self._source.send(
+            "melbanks",
+            dict(config),
+            list(self._source._mls.config.get("melbank_collection", [])),
+        )
+
+
+class _ProcessMelbanksView(_MelbanksView, _PendingMelbanks):
+    """Melbanks of the analysis process, which can also be reconfigured"""
+
+    def __init__(self, source, record, layout):
+        _MelbanksView.__init__(self, record, layout)
+        _PendingMelbanks.__init__(self, source)
+
+
+class AudioProcessSource(SharedAudioProxy):
+    """
+    Stands in for the AudioAnalysisSource while the audio is captured and
+    analysed in a separate process, so the analysis doesn't compete with
+    rendering for the GIL.
+
+    The process is started without waiting for it. Until it publishes the
+    layout of its feature record there are no hops, so subscribers are
+    first called once the record is mapped.
+
+    The process writes the features of every hop into a shared memory
+    feature record. This proxy takes a snapshot of the record on each hop
+    notification and calls its subscribers and the hop listeners just like
+    the in-process source does, exposing the same accessors to effects.
+    """
+
+    def __init__(self, mls, config):
+        super().__init__()
+        from mls.render_pool import LogForwarder
+
+        self._mls = mls
+        self.melbanks = _PendingMelbanks(self)
+        self._diagnostics_ready = threading.Event()
+        self._diagnostics = None
+        self._send_lock = threading.Lock()
+
+        context = multiprocessing.get_context("spawn")
+        self._log_queue = context.Queue()
+        self._log_listener = logging.handlers.QueueListener(
+            self._log_queue, LogForwarder()
+        )
+        self._log_listener.start()
+        analysis_config = {
+            key: mls.config.get(key, {}) for key in ANALYSIS_CONFIG_KEYS
+        }
+        analysis_config["audio"] = config
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(
+            target=_analysis_main,
+            args=(
+                child_conn,
+                analysis_config,
+                self._log_queue,
+                logging.getLogger().getEffectiveLevel(),
+            ),
+            name="AudioAnalysis",
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+
+        self._listener = threading.Thread(
+            name="AudioProcessListener", target=self._listen, daemon=True
+        )
+        self._listener.start()
+        self._remove_shutdown_listener = mls.events.add_listener(
+            lambda e: self.stop(), Event.LEDFX_SHUTDOWN
+        )
+        _LOGGER.info("Started audio analysis process")
+
+    def send(self, *message):
+        with self._send_lock:
+            try:
+                self._conn.send(message)
+            except (BrokenPipeError, OSError) as e:
+                _LOGGER.warning(f"Audio analysis process: {e}")
+
+    def _listen(self):
+        from mls.effects.audio import AudioInputSource
+
+        while True:
+            try:
+                message, *args = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            if message == "hop":
+                if self.update():
+                    for listener in AudioInputSource._hop_listeners:
+                        listener()
+            elif message == "layout":
+                self.attach(*args)
+            elif message == "event":
+                self._mls.events.fire_event(*args)
+            elif message == "diagnostics":
+                self._diagnostics = args[0]
+                self._diagnostics_ready.set()
+
+    def _melbanks_view(self, record, layout):
+        return _ProcessMelbanksView(self, record, layout)
+
+    def subscribe(self, callback):
+        super().subscribe(callback)
+        self.send("subscribe")
+
+    def unsubscribe(self, callback):
+        super().unsubscribe(callback)
+        if not self._callbacks:
+            self.send("unsubscribe")
+
+    def acquire_features(self, features):
+        self.send("acquire_features", tuple(features))
+
+    def release_features(self, features):
+        self.send("release_features", tuple(features))
+
+    def update_config(self, config):
+        from mls.effects.audio import AudioInputSource, apply_analysis_preset
+
+        self._config = apply_analysis_preset(
+            AudioInputSource.AUDIO_CONFIG_SCHEMA.fget()(config)
+        )
+        self._mls.config["audio"] = self._config
+        self.send("config", dict(self._config))
+
+    def diagnostics(self):
+        """Returns the diagnostics of the analysis process"""
+        self._diagnostics_ready.clear()
+        self.send("diagnostics")
+        if self._diagnostics_ready.wait(DIAGNOSTICS_TIMEOUT):
+            diagnostics = dict(self._diagnostics)
+        else:
+            diagnostics = {"active": False}
+        diagnostics["process_alive"] = self._process.is_alive()
+        diagnostics["dropped_hops"] = self.dropped_hops
+        diagnostics["decimators"] = self.decimator_diagnostics()
+        diagnostics["shared_filters"] = len(self.filters)
+        return diagnostics
+
+    def stop(self):
+        self._remove_shutdown_listener()
+        self.send("stop")
+        self._process.join(timeout=2)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._conn.close()
+        self.detach()
+        self._log_listener.stop()
@@ -8,6 +8,7 @@ from mls.effects.gradient import GradientEffect
 class BandsAudioEffect(AudioReactiveEffect, GradientEffect):
     NAME = "Bands"
     CATEGORY = "2D"
+    AUDIO_FEATURES = ()
 
     CONFIG_SCHEMA = vol.Schema(
         {
@@ -8,6 +8,7 @@ from mls.effects.gradient import GradientEffect
 class BandsMatrixAudioEffect(AudioReactiveEffect, GradientEffect):
     NAME = "Bands Matrix"
     CATEGORY = "2D"
+    AUDIO_FEATURES = ()
 
     CONFIG_SCHEMA = vol.Schema(
         {
@@ -8,6 +8,7 @@ from mls.effects.gradient import GradientEffect
 class BarAudioEffect(AudioReactiveEffect, GradientEffect):
     NAME = "Bar"
     CATEGORY = "BPM"
+    AUDIO_FEATURES = ("tempo",)
     HIDDEN_KEYS = ["gradient_roll"]
 
     CONFIG_SCHEMA = vol.Schema(
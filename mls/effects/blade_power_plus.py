@@ -17,6 +17,7 @@ _LOGGER = logging.getLogger(__name__)
 class BladePowerPlus(AudioReactiveEffect, HSVEffect):
     NAME = "Blade Power+"
     CATEGORY = "Classic"
+    AUDIO_FEATURES = ("freq_power",)
 
     CONFIG_SCHEMA = vol.Schema(
         {
@@ -8,6 +8,7 @@ from mls.effects.hsv_effect import HSVEffect
 class BlockReflections(AudioReactiveEffect, HSVEffect):
     NAME = "Block Reflections"
     CATEGORY = "Atmospheric"
+    AUDIO_FEATURES = ("freq_power",)
 
     CONFIG_SCHEMA = vol.Schema(
         {
@@ -27,13 +28,11 @@ class BlockReflections(AudioReactiveEffect, HSVEffect):
     def config_updated(self, config):
         self._lows_power = 0
         self._lows_filter = self.create_filter(
-            alpha_decay=0.05, alpha_rise=0.05
+            alpha_decay=0.05, alpha_rise=0.05, signal="lows_power"
         )
 
     def audio_data_updated(self, data):
-        self._lows_power = self._lows_filter.update(
-            data.lows_power(filtered=False)
-        )
+        self._lows_power = self._lows_filter.value
 
     def render_hsv(self):
         t2 = self.time(1 * self._config["speed"]) * (np.pi**2) + (
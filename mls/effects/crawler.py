@@ -10,6 +10,7 @@ from mls.effects.hsv_effect import HSVEffect
 class Crawler(AudioReactiveEffect, HSVEffect):
     NAME = "Crawler"
     CATEGORY = "Atmospheric"
+    AUDIO_FEATURES = ("freq_power",)
 
     CONFIG_SCHEMA = vol.Schema(
         {
@@ -52,12 +53,12 @@ class Crawler(AudioReactiveEffect, HSVEffect):
 
     def config_updated(self, config):
         self._lows_power = 0
-        self._lows_filter = self.create_filter(alpha_decay=0.1, alpha_rise=0.1)
+        self._lows_filter = self.create_filter(
+            alpha_decay=0.1, alpha_rise=0.1, signal="lows_power"
+        )
 
     def audio_data_updated(self, data):
-        self._lows_power = self._lows_filter.update(
-            data.lows_power(filtered=False)
-        )
+        self._lows_power = self._lows_filter.value
 
     def render_hsv(self):
         self.dt = time.time_ns() - self.last_time
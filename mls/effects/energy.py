@@ -8,6 +8,7 @@ from mls.effects.audio import AudioReactiveEffect
 class EnergyAudioEffect(AudioReactiveEffect):
     NAME = "Energy"
     CATEGORY = "Classic"
+    AUDIO_FEATURES = ("volume_beat",)
 
     CONFIG_SCHEMA = vol.Schema(
         {
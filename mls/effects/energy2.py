@@ -8,6 +8,7 @@ from mls.effects.hsv_effect import HSVEffect
 class Energy2(AudioReactiveEffect, HSVEffect):
     NAME = "Energy 2"
     CATEGORY = "Atmospheric"
+    AUDIO_FEATURES = ("freq_power",)
 
     CONFIG_SCHEMA = vol.Schema(
         {
@@ -26,12 +27,12 @@ class Energy2(AudioReactiveEffect, HSVEffect):
 
     def config_updated(self, config):
         self._lows_power = 0
-        self._lows_filter = self.create_filter(alpha_decay=0.1, alpha_rise=0.1)
+        self._lows_filter = self.create_filter(
+            alpha_decay=0.1, alpha_rise=0.1, signal="lows_power"
+        )
 
     def audio_data_updated(self, data):
-        self._lows_power = self._lows_filter.update(
-            data.lows_power(filtered=False)
-        )
+        self._lows_power = self._lows_filter.value
 
     def render_hsv(self):
         # "Global expression"
@@ -8,6 +8,7 @@ from mls.effects.gradient import GradientEffect
 class EQAudioEffect(AudioReactiveEffect, GradientEffect):
     NAME = "Equalizer"
     CATEGORY = "2D"
+    AUDIO_FEATURES = ()
 
     CONFIG_SCHEMA = vol.Schema(
         {
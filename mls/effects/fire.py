@@ -10,6 +10,8 @@ from mls.effects.hsv_effect import HSVEffect
 class Fire(AudioReactiveEffect, HSVEffect):
     NAME = "Fire"
     CATEGORY = "Atmospheric"
+    AUDIO_FEATURES = ("freq_power",)
+    AUDIO_UPDATE_RATE = 30
 
     CONFIG_SCHEMA = vol.Schema(
         {
@@ -44,7 +46,7 @@ class Fire(AudioReactiveEffect, HSVEffect):
         self.cooling = 0.95
         self._lows_power = 0
         self._lows_filter = self.create_filter(
-            alpha_decay=0.05, alpha_rise=0.99
+            alpha_decay=0.05, alpha_rise=0.99, signal="lows_power"
         )
 
         self.spark_count = self._config["intensity"]
@@ -53,9 +55,7 @@ class Fire(AudioReactiveEffect, HSVEffect):
         self.sparkX = np.zeros(self.spark_count)
 
     def audio_data_updated(self, data):
-        _lows_power = self._lows_filter.update(
-            np.mean(data.lows_power(filtered=False))
-        )
+        _lows_power = self._lows_filter.value
         self.cooling = 0.75 + _lows_power * 0.25
         self.accel = 0.02 + _lows_power * 0.1
         self.speed = self._config["speed"] + _lows_power * 0.01
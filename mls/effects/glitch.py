@@ -10,6 +10,7 @@ from mls.effects.hsv_effect import HSVEffect
 class Glitch(AudioReactiveEffect, HSVEffect):
     NAME = "Glitch"
     CATEGORY = "Atmospheric"
+    AUDIO_FEATURES = ("freq_power",)
 
     CONFIG_SCHEMA = vol.Schema(
         {
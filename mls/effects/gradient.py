@@ -215,6 +215,11 @@ class TemporalGradientEffect(TemporalEffect, GradientEffect, ModulateEffect):
     def on_activate(self, pixel_count):
         pass
 
+    def is_static(self):
+        return (
+            not self._config["modulate"] and self._config["gradient_roll"] == 0
+        )
+
     def effect_loop(self):
         # TODO: Could add some cool effects like twinkle or sin modulation
         # of the gradient.
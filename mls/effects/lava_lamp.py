@@ -8,6 +8,8 @@ from mls.effects.hsv_effect import HSVEffect
 class Lavalamp(AudioReactiveEffect, HSVEffect):
     NAME = "Lava lamp"
     CATEGORY = "Atmospheric"
+    AUDIO_FEATURES = ("freq_power",)
+    AUDIO_UPDATE_RATE = 30
 
     CONFIG_SCHEMA = vol.Schema(
         {
@@ -33,14 +35,12 @@ class Lavalamp(AudioReactiveEffect, HSVEffect):
         self._lows_power = 0
         reactivity = self._config["reactivity"]
         self._lows_filter = self.create_filter(
-            alpha_decay=0.05, alpha_rise=reactivity
+            alpha_decay=0.05, alpha_rise=reactivity, signal="lows_power"
         )
         self._contrast = 1 - self._config["contrast"]
 
     def audio_data_updated(self, data):
-        self._lows_power = self._lows_filter.update(
-            data.lows_power(filtered=False)
-        )
+        self._lows_power = self._lows_filter.value
 
     def render_hsv(self):
         # "Global expression"
@@ -7,6 +7,7 @@ from mls.effects.gradient import GradientEffect
 class MagnitudeAudioEffect(AudioReactiveEffect, GradientEffect):
     NAME = "Magnitude"
     CATEGORY = "Classic"
+    AUDIO_FEATURES = ("freq_power",)
 
     CONFIG_SCHEMA = vol.Schema(
         {
@@ -1,4 +1,6 @@
+import threading
 import timeit
+import weakref
 from functools import lru_cache
 
 import numpy as np
@@ -10,6 +12,34 @@ def _normalized_linspace(size):
     return np.linspace(0, 1, size)
 
 
+@lru_cache(maxsize=128)
+def interp_table(start, stop, size):
+    """
+    Resizes values[start:stop] to size values the way np.interp between
+    evenly spaced points does, as the indices of the two neighbours of
+    every output value and their weights, for interp_resize. Tables are
+    built once per range and size, and shared by every caller.
+    """
+    length = stop - start
+    positions = _normalized_linspace(size) * (length - 1)
+    lower = np.minimum(positions.astype(np.intp), max(length - 2, 0))
+    upper = np.minimum(lower + 1, length - 1)
+    weights = positions - lower
+    indices = np.stack([lower, upper]) + start
+    weights = np.stack([1.0 - weights, weights])
+    indices.setflags(write=False)
+    weights.setflags(write=False)
+    return indices, weights
+
+
+def interp_resize(values, table):
+    """Resizes a range of values with a table from interp_table"""
+    indices, weights = table
+    neighbours = values.take(indices)
+    neighbours *= weights
+    return np.add(neighbours[0], neighbours[1])
+
+
 def interpolate_pixels(pixels, new_length):
     """Resizes a pixel array by linearly interpolating the values"""
     if len(pixels) == new_length:
@@ -146,8 +176,105 @@ def triangle(a):
     return np.add(a, 0.5)
 
 
+def _value_shape(value):
+    if isinstance(value, np.ndarray):
+        return value.shape
+    if isinstance(value, (int, float)):
+        return ()
+    return np.shape(value)
+
+
+class FilterBank:
+    """
+    Exponential smoothing filters of any shape held in one contiguous state
+    array, so they are all updated in a single vectorised pass.
+
+    Stage each filter's next value with stage and call update once to
+    smooth every filter towards its staged value without allocating.
+    Filters whose value is not staged are smoothed towards their previous
+    one again. Filters leave the bank when they are removed or no longer
+    referenced.
+    """
+
+    def __init__(self):
+        # weak references to the filters, in the order of their slots
+        self._filters = []
+        # reentrant, a filter may be collected while the filters are laid out
+        self._lock = threading.RLock()
+        self._allocate()
+
+    def add(self, alpha_decay=0.5, alpha_rise=0.5, val=None):
+        """Returns a new filter of the bank"""
+        return _BankFilter(self, val, alpha_decay, alpha_rise)
+
+    def remove(self, exp_filter):
+        for ref in self._filters:
+            if ref() is exp_filter:
+                self._collected(ref)
+                return
+        raise ValueError("Filter is not in the bank")
+
+    def __len__(self):
+        return len(self._filters)
+
+    def _register(self, exp_filter):
+        with self._lock:
+            self._filters.append(weakref.ref(exp_filter, self._collected))
+        self._allocate()
+
+    def _collected(self, ref):
+        with self._lock:
+            if ref not in self._filters:
+                return
+            self._filters.remove(ref)
+        self._allocate()
+
+    def _allocate(self):
+        """Lays the filters out in new arrays, keeping their state"""
+        with self._lock:
+            filters = [ref() for ref in self._filters]
+            filters = [f for f in filters if f is not None]
+            size = sum(exp_filter._size for exp_filter in filters)
+            state, target, delta, alpha, rise, decay = np.zeros((6, size))
+            mask = np.zeros(size, dtype=bool)
+            start = 0
+            for exp_filter in filters:
+                stop = start + exp_filter._size
+                if exp_filter._views is not None:
+                    # carry over the state of filters of unchanged shape
+                    state[start:stop] = exp_filter._views[0].ravel()
+                    target[start:stop] = exp_filter._views[1].ravel()
+                rise[start:stop] = exp_filter.alpha_rise
+                decay[start:stop] = exp_filter.alpha_decay
+                exp_filter._index = start
+                exp_filter._views = tuple(
+                    array[start:stop].reshape(exp_filter._shape)
+                    for array in (state, target, delta, alpha, mask)
+                )
+                start = stop
+            # swapped in whole, update may run while filters are added
+            self._arrays = (state, target, delta, alpha, rise, decay, mask)
+
+    def update(self):
+        """Smooths every filter towards its staged value"""
+        state, target, delta, alpha, rise, decay, mask = self._arrays
+        np.greater(target, state, out=mask)
+        np.copyto(alpha, decay)
+        np.copyto(alpha, rise, where=mask)
+        np.multiply(alpha, target, out=delta)
+        np.subtract(1.0, alpha, out=alpha)
+        np.multiply(alpha, state, out=alpha)
+        np.add(delta, alpha, out=state)
+
+
 class ExpFilter:
-    """Simple exponential smoothing filter"""
+    """
+    Simple exponential smoothing filter.
+
+    The shape of the filter is set by its first value, a value of another
+    shape restarts it. Every update returns a new value. Filters updated
+    together on every hop are cheaper in a FilterBank.
+    """
 
     def __init__(self, val=None, alpha_decay=0.5, alpha_rise=0.5):
         assert 0.0 < alpha_decay < 1.0, "Invalid decay smoothing factor"
@@ -158,14 +285,20 @@ class ExpFilter:
 
     def update(self, value):
         # Handle deferred initilization
-        if self.value is None:
-            self.value = value
+        if self.value is None or _value_shape(value) != _value_shape(
+            self.value
+        ):
+            self.value = (
+                np.array(value, dtype=float) if np.ndim(value) else value
+            )
             return self.value
 
         if isinstance(self.value, (list, np.ndarray, tuple)):
-            alpha = value - self.value
-            alpha[alpha > 0.0] = self.alpha_rise
-            alpha[alpha <= 0.0] = self.alpha_decay
+            alpha = np.where(
+                np.greater(value, self.value),
+                self.alpha_rise,
+                self.alpha_decay,
+            )
         else:
             alpha = self.alpha_rise if value > self.value else self.alpha_decay
 
@@ -174,6 +307,81 @@ class ExpFilter:
         return self.value
 
 
+class _BankFilter(ExpFilter):
+    """
+    One filter of a FilterBank, a view of the bank's arrays. Its value and
+    updates are handed out as copies, as the bank may move the arrays.
+    """
+
+    def __init__(self, bank, val=None, alpha_decay=0.5, alpha_rise=0.5):
+        # shape of the filter, None until the first value
+        self._shape = None
+        self._size = 0
+        self._index = 0
+        # state, target, delta, alpha and mask views of the bank's arrays
+        self._views = None
+        self._bank = bank
+        super().__init__(None, alpha_decay, alpha_rise)
+        bank._register(self)
+        self.value = val
+
+    @property
+    def value(self):
+        if self._shape is None:
+            return None
+        if self._shape == ():
+            return self._bank._arrays[0][self._index]
+        return self._views[0].copy()
+
+    @value.setter
+    def value(self, value):
+        shape = None if value is None else _value_shape(value)
+        if shape != self._shape:
+            self._shape = shape
+            self._size = 0 if shape is None else int(np.prod(shape))
+            self._views = None
+            self._bank._allocate()
+        if shape is not None:
+            self._views[0][...] = value
+            self._views[1][...] = value
+
+    def stage(self, value):
+        """Sets the value the next update of the bank smooths towards"""
+        if _value_shape(value) != self._shape:
+            # Handle deferred initilization
+            self.value = value
+        else:
+            self._views[1][...] = value
+
+    def update(self, value):
+        """Smooths this filter alone, towards value"""
+        shape = _value_shape(value)
+        # Handle deferred initilization
+        if shape != self._shape:
+            self.value = value
+            return self.value
+
+        if shape == ():
+            state, target = self._bank._arrays[:2]
+            current = state.item(self._index)
+            alpha = self.alpha_rise if value > current else self.alpha_decay
+            target[self._index] = value
+            value = alpha * value + (1.0 - alpha) * current
+            state[self._index] = value
+            return value
+
+        state, target, delta, alpha, mask = self._views
+        np.greater(value, state, out=mask)
+        alpha.fill(self.alpha_decay)
+        np.copyto(alpha, self.alpha_rise, where=mask)
+        np.multiply(alpha, value, out=delta)
+        np.subtract(1.0, alpha, out=alpha)
+        np.multiply(alpha, state, out=alpha)
+        np.add(delta, alpha, out=state)
+        target[...] = value
+        return state.copy()
+
+
 def interpolate_colors(c1, c2, elements):
     """
     Create np color array of equally interpolated values between c1 and c2
@@ -23,12 +23,32 @@ from mls.utils import generate_id
 # This increases frequency resolution a lot and reduces latency a bit,
 # improved resolution is noticable for bass, where frequency differs by only 10s of Hz
 
-# these parameters are hard coded and will break configs if changed
-
+# these parameters are the defaults of the audio config, which can
+# trade analysis resolution for CPU time or latency, see ANALYSIS_PRESETS
 FFT_SIZE = 4096
 MIC_RATE = 30000
 MAX_FREQ = MIC_RATE // 2
 MIN_FREQ = 20
+FFT_SIZES = (1024, 2048, 4096, 8192)
+MIN_ANALYSIS_RATE = 22050
+MAX_ANALYSIS_RATE = 48000
+# analysis settings applied by the audio config "analysis_preset"
+ANALYSIS_PRESETS = {
+    # half the FFT work and hops for small hosts
+    "low_cpu": {"fft_size": 2048, "analysis_rate": 22050, "sample_rate": 30},
+    # the defaults
+    "balanced": {
+        "fft_size": FFT_SIZE,
+        "analysis_rate": MIC_RATE,
+        "sample_rate": 60,
+    },
+    # a shorter window and twice the hops for a quicker response
+    "low_latency": {
+        "fft_size": 2048,
+        "analysis_rate": MIC_RATE,
+        "sample_rate": 120,
+    },
+}
 MIN_FREQ_DIFFERENCE = 50
 MEL_MAX_FREQS = [350, 2000, MAX_FREQ]
 
@@ -76,6 +96,12 @@ MELBANK_COEFFS_TYPES = (
     # "fixed",
     # "fixed_simple",
 )
+MELBANK_ENGINES = (
+    # an aubio filterbank per melbank
+    "aubio",
+    # every melbank in a single matrix product per hop, see MelbankMatrix
+    "matrix",
+)
 
 
 class Melbank:
@@ -85,10 +111,10 @@ class Melbank:
         {
             vol.Optional("name"): str,
             vol.Optional("min_frequency", default=MIN_FREQ): vol.All(
-                vol.Coerce(int), vol.Range(MIN_FREQ, MAX_FREQ)
+                vol.Coerce(int), vol.Range(MIN_FREQ, MAX_ANALYSIS_RATE // 2)
             ),
             vol.Optional("max_frequency", default=MAX_FREQ): vol.All(
-                vol.Coerce(int), vol.Range(MIN_FREQ, MAX_FREQ)
+                vol.Coerce(int), vol.Range(MIN_FREQ, MAX_ANALYSIS_RATE // 2)
             ),
         },
         extra=vol.ALLOW_EXTRA,
@@ -98,6 +124,12 @@ class Melbank:
         """Initialize all the melbank related variables"""
         self._audio = audio
         self._config = self.CONFIG_SCHEMA(config)
+        fft_size = audio._config["fft_size"]
+        rate = audio._config["analysis_rate"]
+        # frequencies above the nyquist frequency of the analysis rate
+        # are not in the FFT
+        for key in ("min_frequency", "max_frequency"):
+            self._config[key] = min(self._config[key], rate // 2)
         # adjustable power (peak isolation) based on parameter a (0-1)
         # a=0    -> linear response (filter bank value maps to itself)
         # a=0.4  -> roughly equivalent to filter_banks ** 2.0
@@ -120,10 +152,10 @@ class Melbank:
             ).astype(np.float32)
 
             self.filterbank = aubio.filterbank(
-                self._config["samples"], FFT_SIZE
+                self._config["samples"], fft_size
             )
             self.filterbank.set_triangle_bands(
-                self.melbank_frequencies, MIC_RATE
+                self.melbank_frequencies, rate
             )
             self.melbank_frequencies = self.melbank_frequencies[1:-1]
 
@@ -138,18 +170,18 @@ class Melbank:
             ).astype(np.float32)
 
             self.filterbank = aubio.filterbank(
-                self._config["samples"], FFT_SIZE
+                self._config["samples"], fft_size
             )
             self.filterbank.set_triangle_bands(
-                self.melbank_frequencies, MIC_RATE
+                self.melbank_frequencies, rate
             )
             self.melbank_frequencies = self.melbank_frequencies[1:-1]
 
         # Slaney coefficients will always produce 40 samples spanning 133Hz to
         # 6000Hz
         if self._config["coeffs_type"] == "slaney":
-            self.filterbank = aubio.filterbank(40, FFT_SIZE)
-            self.filterbank.set_mel_coeffs_slaney(MIC_RATE)
+            self.filterbank = aubio.filterbank(40, fft_size)
+            self.filterbank.set_mel_coeffs_slaney(rate)
 
             # Sanley frequencies are linear-log spaced where 133Hz to 1000Hz is linear
             # spaced and 1000Hz to 6000Hz is log spaced. It also produced a hardcoded
@@ -174,10 +206,10 @@ class Melbank:
         # Standard mel coefficients
         if self._config["coeffs_type"] == "mel":
             self.filterbank = aubio.filterbank(
-                self._config["samples"], FFT_SIZE
+                self._config["samples"], fft_size
             )
             self.filterbank.set_mel_coeffs(
-                MIC_RATE,
+                rate,
                 self._config["min_frequency"],
                 self._config["max_frequency"],
             )
@@ -195,10 +227,10 @@ class Melbank:
         # HTK mel coefficients
         if self._config["coeffs_type"] == "htk":
             self.filterbank = aubio.filterbank(
-                self._config["samples"], FFT_SIZE
+                self._config["samples"], fft_size
             )
             self.filterbank.set_mel_coeffs_htk(
-                MIC_RATE,
+                rate,
                 self._config["min_frequency"],
                 self._config["max_frequency"],
             )
@@ -223,11 +255,11 @@ class Melbank:
                 num_mel_bands=self._config["samples"],
                 freq_min=self._config["min_frequency"],
                 freq_max=self._config["max_frequency"],
-                num_fft_bands=int(FFT_SIZE // 2) + 1,
-                sample_rate=MIC_RATE,
+                num_fft_bands=int(fft_size // 2) + 1,
+                sample_rate=rate,
             )
             self.filterbank = aubio.filterbank(
-                self._config["samples"], FFT_SIZE
+                self._config["samples"], fft_size
             )
             self.filterbank.set_coeffs(melmat.astype(np.float32))
             self.melbank_frequencies = center_frequencies_hz
@@ -253,10 +285,10 @@ class Melbank:
             ).astype(np.float32)
 
             self.filterbank = aubio.filterbank(
-                self._config["samples"], FFT_SIZE
+                self._config["samples"], fft_size
             )
             self.filterbank.set_triangle_bands(
-                self.melbank_frequencies, MIC_RATE
+                self.melbank_frequencies, rate
             )
             self.melbank_frequencies = self.melbank_frequencies[1:-1]
 
@@ -280,10 +312,10 @@ class Melbank:
             ).astype(np.float32)
 
             self.filterbank = aubio.filterbank(
-                self._config["samples"], FFT_SIZE
+                self._config["samples"], fft_size
             )
             self.filterbank.set_triangle_bands(
-                self.melbank_frequencies, MIC_RATE
+                self.melbank_frequencies, rate
             )
             self.melbank_frequencies = self.melbank_frequencies[1:-1]
 
@@ -302,13 +334,13 @@ class Melbank:
             ) = mel.compute_melmat_from_range(
                 lower_edges_hz=lower_edges_hz,
                 upper_edges_hz=upper_edges_hz,
-                num_fft_bands=int(FFT_SIZE // 2) + 1,
-                sample_rate=MIC_RATE,
+                num_fft_bands=int(fft_size // 2) + 1,
+                sample_rate=rate,
             )
 
             self._config["samples"] = len(center_frequencies_hz)
             self.filterbank = aubio.filterbank(
-                self._config["samples"], FFT_SIZE
+                self._config["samples"], fft_size
             )
             self.filterbank.set_coeffs(melmat.astype(np.float32))
             self.melbank_frequencies = center_frequencies_hz
@@ -328,13 +360,13 @@ class Melbank:
             ) = mel.compute_melmat_from_range(
                 lower_edges_hz=lower_edges_hz,
                 upper_edges_hz=upper_edges_hz,
-                num_fft_bands=int(FFT_SIZE // 2) + 1,
-                sample_rate=MIC_RATE,
+                num_fft_bands=int(fft_size // 2) + 1,
+                sample_rate=rate,
             )
 
             self._config["samples"] = len(center_frequencies_hz)
             self.filterbank = aubio.filterbank(
-                self._config["samples"], FFT_SIZE
+                self._config["samples"], fft_size
             )
             self.filterbank.set_coeffs(melmat.astype(np.float32))
             self.melbank_frequencies = center_frequencies_hz
@@ -404,6 +436,76 @@ class Melbank:
         )
 
 
+class MelbankMatrix:
+    """
+    Processes all the melbanks of a Melbanks at once.
+
+    The filterbank coefficients of the melbanks are stacked into a single
+    matrix, so a hop takes one matrix product against the FFT magnitudes
+    to compute every band. The power, gain and smoothing stages of Melbank
+    are then applied to all the bands together, with the melbanks as the
+    rows of 2D buffers. The output matches calling each Melbank in turn.
+    """
+
+    def __init__(self, processors, melbanks, melbanks_filtered):
+        coeffs = np.vstack(
+            [proc.filterbank.get_coeffs() for proc in processors]
+        )
+        # bins above the highest band contribute nothing
+        used_bins = np.flatnonzero(coeffs.any(axis=0))
+        self._bins = slice(0, used_bins[-1] + 1 if len(used_bins) else 1)
+        self._coeffs = np.ascontiguousarray(coeffs[:, self._bins])
+        self._bands = np.zeros(len(coeffs), dtype=self._coeffs.dtype)
+        self._power = np.array(
+            [[proc.power_factor] for proc in processors], dtype=np.float64
+        )
+        # the blur is linear, so it is applied as a matrix built from
+        # blurring each unit vector
+        mel_len = melbanks.shape[1]
+        self._blur = np.array(
+            [fast_blur_array(unit, sigma=1.0) for unit in np.eye(mel_len)]
+        )
+        self.melbanks = melbanks
+        self.melbanks_filtered = melbanks_filtered
+
+        self.mel_gain = ExpFilter(alpha_decay=0.01, alpha_rise=0.99)
+        self.mel_smoothing = ExpFilter(alpha_decay=0.7, alpha_rise=0.99)
+        self.common_filter = ExpFilter(alpha_decay=0.99, alpha_rise=0.01)
+        self.diff_filter = ExpFilter(alpha_decay=0.15, alpha_rise=0.99)
+
+    @staticmethod
+    def supports(processors, mel_count, mel_len):
+        """
+        Returns True if the melbanks fit in the 2D buffers, which needs
+        one melbank per buffer row and all of them of the same length
+        """
+        # shorter melbanks are blurred with a kernel longer than they are
+        if not processors or len(processors) != mel_count or mel_len < 3:
+            return False
+        return all(
+            proc.filterbank.get_coeffs().shape[0] == mel_len
+            for proc in processors
+        )
+
+    def __call__(self, frequency_domain):
+        np.dot(
+            self._coeffs, frequency_domain.norm[self._bins], out=self._bands
+        )
+        melbanks = self.melbanks
+        np.power(
+            self._bands.reshape(melbanks.shape), self._power, out=melbanks
+        )
+
+        self.mel_gain.update(np.max(melbanks @ self._blur, axis=1))
+        melbanks /= self.mel_gain.value[:, None]
+        melbanks[:] = self.mel_smoothing.update(melbanks)
+
+        self.common_filter.update(melbanks)
+        self.melbanks_filtered[:] = self.diff_filter.update(
+            melbanks - self.common_filter.value
+        )
+
+
 class Melbanks:
     """
     Creates a set of filterbanks to process FFT at different resolutions.
@@ -427,11 +529,15 @@ class Melbanks:
             vol.Optional("coeffs_type", default="matt_mel"): vol.In(
                 MELBANK_COEFFS_TYPES
             ),
+            # capped at the nyquist frequency of the audio analysis rate
             vol.Optional("max_frequencies", default=MEL_MAX_FREQS): [
-                vol.All(vol.Coerce(int), vol.Range(0, MAX_FREQ))
+                vol.All(vol.Coerce(int), vol.Range(0, MAX_ANALYSIS_RATE // 2))
             ],
             vol.Optional("min_frequency", default=MIN_FREQ): vol.All(
-                vol.Coerce(int), vol.Range(0, MAX_FREQ)
+                vol.Coerce(int), vol.Range(0, MAX_ANALYSIS_RATE // 2)
+            ),
+            vol.Optional("engine", default="aubio"): vol.In(
+                MELBANK_ENGINES
             ),
         },
         extra=vol.ALLOW_EXTRA,
@@ -516,12 +622,26 @@ class Melbanks:
         self.mel_len = self.melbanks_config["samples"]
         # set up melbank data buffers.
         # these are stored as numpy arrays in a tuple to allow direct access to the buffers
-        self.melbanks = tuple(
-            np.zeros(self.mel_len) for _ in range(self.mel_count)
-        )
-        self.melbanks_filtered = tuple(
-            np.zeros(self.mel_len) for _ in range(self.mel_count)
-        )
+        # each melbank is a row of a single array, which the matrix engine
+        # processes in one go
+        melbank_data = np.zeros((self.mel_count, self.mel_len))
+        melbank_filtered_data = np.zeros((self.mel_count, self.mel_len))
+        self.melbanks = tuple(melbank_data)
+        self.melbanks_filtered = tuple(melbank_filtered_data)
+        self.matrix = None
+        if self.melbanks_config["engine"] == "matrix":
+            if MelbankMatrix.supports(
+                self.melbank_processors, self.mel_count, self.mel_len
+            ):
+                self.matrix = MelbankMatrix(
+                    self.melbank_processors,
+                    melbank_data,
+                    melbank_filtered_data,
+                )
+            else:
+                _LOGGER.debug(
+                    "Melbank layout not supported by the matrix engine, using aubio"
+                )
         self.minimum_volume = self._audio._config["min_volume"]
 
     def __call__(self):
@@ -535,7 +655,9 @@ class Melbanks:
             self._audio.volume(filtered=True) > self.minimum_volume
         )
 
-        if volume_threshold:
+        if volume_threshold and self.matrix is not None:
+            self.matrix(frequency_domain)
+        elif volume_threshold:
             for i, proc in enumerate(self.melbank_processors):
                 proc(
                     frequency_domain,
@@ -14,6 +14,7 @@ from mls.utils import empty_queue
 class MeltSparkle(AudioReactiveEffect, HSVEffect):
     NAME = "Melt and Sparkle"
     CATEGORY = "Atmospheric"
+    AUDIO_FEATURES = ("freq_power", "onset")
 
     CONFIG_SCHEMA = vol.Schema(
         {
@@ -88,12 +89,16 @@ class MeltSparkle(AudioReactiveEffect, HSVEffect):
         # lows power seems to be on a 0-1 scale
         self._lows_power = 0
         self._last_lows_power = 0
-        self._lows_filter = self.create_filter(alpha_decay=0.1, alpha_rise=0.1)
+        self._lows_filter = self.create_filter(
+            alpha_decay=0.1, alpha_rise=0.1, signal="lows_power"
+        )
         self._direction = 1.0
 
         # intensity comes from melbank so it's not capped at 1.
         self._mids_power = 0
-        self._mids_filter = self.create_filter(alpha_decay=0.1, alpha_rise=0.1)
+        self._mids_filter = self.create_filter(
+            alpha_decay=0.1, alpha_rise=0.1, signal="mids_power_filtered"
+        )
 
         self.bg_bright = self._config["bg_bright"]
 
@@ -105,9 +110,7 @@ class MeltSparkle(AudioReactiveEffect, HSVEffect):
 
     def audio_data_updated(self, data):
         self._last_lows_power = self._lows_power
-        self._lows_power = self._lows_filter.update(
-            data.lows_power(filtered=False)
-        )
+        self._lows_power = self._lows_filter.value
         # self._lows_power = 0
         # _LOGGER.debug(f"bass {self._lows_power}")
 
@@ -123,9 +126,7 @@ class MeltSparkle(AudioReactiveEffect, HSVEffect):
             (i.max() ** 2 for i in self.melbank_thirds()), float
         )
         np.clip(intensities, 0, 1, out=intensities)
-        self._mids_power = self._mids_filter.update(
-            data.mids_power(filtered=True)
-        )
+        self._mids_power = self._mids_filter.value
         if (
             data.onset()
             and currentTime - self.last_strobe_time > self.strobe_wait_time
@@ -24,6 +24,7 @@ except ImportError:
 class MetroEffect(AudioReactiveEffect):
     NAME = "Metro"
     CATEGORY = "Diagnostic"
+    AUDIO_FEATURES = ()
     HIDDEN_KEYS = ["background_brightness", "blur", "mirror"]
     if not bokeh_available or not psutil_available:
         HIDDEN_KEYS.append("capture")
@@ -9,6 +9,7 @@ from mls.effects.gradient import GradientEffect
 class PitchSpectrumAudioEffect(AudioReactiveEffect, GradientEffect):
     NAME = "Pitch Spectrum"
     CATEGORY = "Classic"
+    AUDIO_FEATURES = ("pitch",)
 
     CONFIG_SCHEMA = vol.Schema(
         {
@@ -9,6 +9,7 @@ from mls.effects.gradient import GradientEffect
 class PowerAudioEffect(AudioReactiveEffect, GradientEffect):
     NAME = "Power"
     CATEGORY = "Classic"
+    AUDIO_FEATURES = ("freq_power", "onset")
 
     CONFIG_SCHEMA = vol.Schema(
         {
@@ -48,7 +49,9 @@ class PowerAudioEffect(AudioReactiveEffect, GradientEffect):
 
     def config_updated(self, config):
         # Create the filters used for the effect
-        self._bass_filter = self.create_filter(alpha_decay=0.1, alpha_rise=0.8)
+        self._bass_filter = self.create_filter(
+            alpha_decay=0.1, alpha_rise=0.8, signal="lows_power"
+        )
         self.sparks_color = parse_color(self._config["sparks_color"])
         self.sparks_decay_rate = 1 - self._config["sparks_decay_rate"]
         self.bass_decay_rate = 1 - self._config["bass_decay_rate"]
@@ -65,8 +68,7 @@ class PowerAudioEffect(AudioReactiveEffect, GradientEffect):
         # Fade bass overlay a little
         self.bass_overlay *= self.bass_decay_rate
         # Get bass power through filter
-        bass = np.max(data.lows_power(filtered=False))
-        bass = self._bass_filter.update(bass)
+        bass = self._bass_filter.value
         # Map it to the length of the overlay and apply it
         bass_idx = int(bass * self.pixel_count)
         self.bass_overlay[:bass_idx] = self.get_gradient_color(bass)
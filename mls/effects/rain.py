@@ -11,6 +11,7 @@ from mls.effects.droplets import DROPLET_NAMES, load_droplet
 class RainAudioEffect(AudioReactiveEffect):
     NAME = "Rain"
     CATEGORY = "Classic"
+    AUDIO_FEATURES = ()
 
     CONFIG_SCHEMA = vol.Schema(
         {
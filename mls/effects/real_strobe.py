@@ -13,6 +13,7 @@ from mls.utils import empty_queue
 class Strobe(AudioReactiveEffect, GradientEffect):
     NAME = "Strobe"
     CATEGORY = "Classic"
+    AUDIO_FEATURES = ("onset", "volume_beat")
     HIDDEN_KEYS = ["gradient_roll"]
 
     CONFIG_SCHEMA = vol.Schema(
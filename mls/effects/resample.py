@@ -0,0 +1,117 @@
+from fractions import Fraction
+
+import numpy as np
+import samplerate
+
+# largest interpolation or decimation factor resampled with a polyphase
+# filter, other ratios fall back to libsamplerate
+MAX_POLYPHASE_FACTOR = 16
+# filter taps applied per output sample
+POLYPHASE_TAPS = 32
+# passband as a fraction of the lower of the two Nyquist frequencies,
+# libsamplerate's sinc_fastest passes 80%
+POLYPHASE_BANDWIDTH = 0.85
+POLYPHASE_KAISER_BETA = 8.0
+
+
+class PolyphaseResampler:
+    """
+    Resamples fixed length blocks by the rational ratio up / down with a
+    windowed sinc FIR filter split into its polyphase components.
+
+    Every down input samples produce up output samples, each reading its
+    own filter phase from the same span of inputs. The phases are laid out
+    once as a matrix over that span, so a block is resampled with a single
+    matrix product over strided views of the input, without copying it.
+    The last inputs of a block are kept as the filter history of the next.
+    """
+
+    path = "polyphase"
+
+    def __init__(self, up, down, in_length):
+        self.up, self.down = up, down
+        self.in_length = in_length
+        self.out_length = in_length * up // down
+        taps = POLYPHASE_TAPS
+        length = up * taps
+        cutoff = POLYPHASE_BANDWIDTH * 0.5 / max(up, down)
+        prototype = np.sinc(
+            2 * cutoff * (np.arange(length) - (length - 1) / 2)
+        ) * np.kaiser(length, POLYPHASE_KAISER_BETA)
+        prototype *= up / prototype.sum()
+
+        # output j of a group reads inputs back from offset j * down // up
+        # of the group's span, which starts after taps - 1 samples of history
+        span = taps - 1 + down
+        phases = np.zeros((up, span), dtype=np.float32)
+        for j in range(up):
+            phase, offset = (j * down) % up, (j * down) // up
+            phases[j, offset : offset + taps] = prototype[
+                phase + up * np.arange(taps)[::-1]
+            ]
+        self._phases = phases.T
+        self._input = np.zeros(taps - 1 + in_length, dtype=np.float32)
+        self._spans = np.lib.stride_tricks.sliding_window_view(
+            self._input, span
+        )[::down]
+        self._out = np.zeros((len(self._spans), up), dtype=np.float32)
+
+    def process(self, block):
+        """
+        Returns the block resampled, in a buffer overwritten by the next
+        call, so callers keeping a block copy it
+        """
+        history = len(self._input) - self.in_length
+        self._input[history:] = block
+        np.matmul(self._spans, self._phases, out=self._out)
+        self._input[:history] = self._input[-history:]
+        return self._out.reshape(-1)
+
+
+class SincResampler:
+    """
+    Resamples blocks of any length with libsamplerate. The one instance
+    can be reused as the block lengths change, keeping its state.
+    """
+
+    path = "libsamplerate"
+    in_length = None
+
+    def __init__(self):
+        self.out_length = None
+        self._resampler = samplerate.Resampler("sinc_fastest", channels=1)
+
+    def process(self, block):
+        return self._resampler.process(block, self.out_length / len(block))
+
+
+class Passthrough:
+    """Copies blocks already at the analysis length"""
+
+    path = "passthrough"
+
+    def __init__(self, length):
+        self.in_length = self.out_length = length
+
+    def process(self, block):
+        # the block is read into the same buffer every hop
+        return block.copy()
+
+
+def select_resampler(in_length, out_length, fallback=None):
+    """
+    Picks the cheapest resampler from blocks of in_length samples to
+    out_length: a copy for equal lengths, a polyphase filter for ratios of
+    small integers such as 48kHz hardware analysed at 24kHz or 30kHz, and
+    libsamplerate, reusing fallback if given, for anything else.
+    """
+    if in_length == out_length:
+        return Passthrough(in_length)
+    ratio = Fraction(out_length, in_length)
+    if max(ratio.numerator, ratio.denominator) <= MAX_POLYPHASE_FACTOR:
+        return PolyphaseResampler(
+            ratio.numerator, ratio.denominator, in_length
+        )
+    resampler = fallback or SincResampler()
+    resampler.out_length = out_length
+    return resampler
@@ -12,6 +12,7 @@ from mls.effects.modulate import ModulateEffect
 class ScanAudioEffect(AudioReactiveEffect, GradientEffect, ModulateEffect):
     NAME = "Scan"
     CATEGORY = "Classic"
+    AUDIO_FEATURES = ("freq_power",)
     ADVANCED_KEYS = [
         "count",
         "gradient_roll",
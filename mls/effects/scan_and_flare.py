@@ -45,6 +45,7 @@ class Sparkle:
 class ScanAndFlareAudioEffect(AudioReactiveEffect, GradientEffect):
     NAME = "Scan and Flare"
     CATEGORY = "Classic"
+    AUDIO_FEATURES = ("freq_power",)
     HIDDEN_KEYS = ["gradient_roll"]
 
     CONFIG_SCHEMA = vol.Schema(
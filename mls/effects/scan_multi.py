@@ -41,6 +41,7 @@ class Scan:
 class ScanMultiAudioEffect(AudioReactiveEffect, GradientEffect):
     NAME = "Scan Multi"
     CATEGORY = "Classic"
+    AUDIO_FEATURES = ("freq_power",)
     HIDDEN_KEYS = ["gradient_roll"]
     ADVANCED_KEYS = ["input_source", "attack", "decay", "filter"]
 
@@ -178,7 +179,13 @@ class ScanMultiAudioEffect(AudioReactiveEffect, GradientEffect):
             if graph_dump:
                 scan.graph.append_by_key("p_in", scan.power)
             if self._config["filter"]:
-                scan.power = scan._p_filter.update(scan.power)
+                scan._p_filter.stage(scan.power)
+        if self._config["filter"]:
+            self.update_filters()
+
+        for scan in self.scans:
+            if self._config["filter"]:
+                scan.power = scan._p_filter.value
             if graph_dump:
                 scan.graph.append_by_key("p_out", scan.power)
 
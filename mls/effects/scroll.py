@@ -8,6 +8,7 @@ from mls.effects.audio import AudioReactiveEffect
 class ScrollAudioEffect(AudioReactiveEffect):
     NAME = "Scroll"
     CATEGORY = "Classic"
+    AUDIO_FEATURES = ()
 
     CONFIG_SCHEMA = vol.Schema(
         {
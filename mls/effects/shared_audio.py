@@ -0,0 +1,638 @@
+import logging
+import threading
+from multiprocessing import shared_memory
+from operator import methodcaller
+from types import SimpleNamespace
+
+import numpy as np
+
+from mls.effects.math import FilterBank
+
+_LOGGER = logging.getLogger(__name__)
+
+# Scalar features published once per audio hop, in record order
+FEATURE_SCALARS = (
+    "volume",
+    "volume_raw",
+    "onset",
+    "bpm_beat_now",
+    "volume_beat_now",
+    "bar_oscillator",
+    "pitch",
+    "beat_counter",
+)
+FREQ_POWER_BANDS = 4
+# sequence number and layout version
+HEADER_LEN = 2
+# attempts made by readers to get an untorn copy of the record
+READ_RETRIES = 4
+# record positions of the features a FeatureDecimator holds if they were
+# set on any hop of its window, and of those it takes from the last hop.
+# Everything else is averaged over the window.
+HELD_FEATURES = np.array(
+    [
+        HEADER_LEN + FEATURE_SCALARS.index(name)
+        for name in ("onset", "bpm_beat_now", "volume_beat_now")
+    ]
+)
+LATEST_FEATURES = np.array(
+    [
+        HEADER_LEN + FEATURE_SCALARS.index(name)
+        for name in ("bar_oscillator", "pitch", "beat_counter")
+    ]
+)
+
+# signals of an audio source that shared filters can smooth, by name. The
+# "_filtered" signals are the source's own smoothed values.
+FILTER_SIGNALS = {
+    f"{name}{suffix}": methodcaller(name, filtered=filtered)
+    for name in (
+        "volume",
+        "beat_power",
+        "bass_power",
+        "lows_power",
+        "mids_power",
+        "high_power",
+    )
+    for suffix, filtered in (("", False), ("_filtered", True))
+}
+
+
+def release_shared_memory(shm, unlink=False):
+    """Closes a shared memory block, optionally unlinking it"""
+    try:
+        shm.close()
+    except BufferError:
+        # an array view is still alive, the mapping goes away with it
+        pass
+    if unlink:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def record_length(mel_count, mel_len):
+    """Number of float64 values in a feature record of the given layout"""
+    return (
+        HEADER_LEN
+        + len(FEATURE_SCALARS)
+        + 2 * FREQ_POWER_BANDS
+        + 2 * mel_count * mel_len
+    )
+
+
+class FeatureRecord:
+    """
+    Fixed layout view over a block of float64 values holding one hop of
+    audio features. The block is either a private array or shared memory.
+
+    Layout:
+        [sequence, layout_version, *FEATURE_SCALARS,
+         freq_power raw (4), freq_power filtered (4),
+         melbanks (mel_count * mel_len), melbanks_filtered (same)]
+
+    The sequence number works as a seqlock: it is odd while the writer is
+    updating the record and is bumped to the next even value once the hop
+    is complete, so readers can detect and retry torn reads.
+    """
+
+    def __init__(self, mel_count, mel_len, buffer=None):
+        self.mel_count = mel_count
+        self.mel_len = mel_len
+        length = record_length(mel_count, mel_len)
+        if buffer is None:
+            self.data = np.zeros(length)
+        else:
+            self.data = np.ndarray((length,), dtype=np.float64, buffer=buffer)
+
+        offset = HEADER_LEN
+        self.header = self.data[:HEADER_LEN]
+        self.scalars = self.data[offset : offset + len(FEATURE_SCALARS)]
+        offset += len(FEATURE_SCALARS)
+        self.freq_power_raw = self.data[offset : offset + FREQ_POWER_BANDS]
+        offset += FREQ_POWER_BANDS
+        self.freq_power_filtered = self.data[
+            offset : offset + FREQ_POWER_BANDS
+        ]
+        offset += FREQ_POWER_BANDS
+        self.melbanks = self._split(offset)
+        offset += mel_count * mel_len
+        self.melbanks_filtered = self._split(offset)
+
+    def _split(self, offset):
+        return tuple(
+            self.data[
+                offset + i * self.mel_len : offset + (i + 1) * self.mel_len
+            ]
+            for i in range(self.mel_count)
+        )
+
+    @property
+    def sequence(self):
+        return int(self.header[0])
+
+    def write(self, audio):
+        """
+        Copies the current hop of an AudioAnalysisSource into the record.
+        Features without running analyzers are published as zero.
+        """
+        active = audio.feature_active
+        self.header[0] += 1
+        scalars = self.scalars
+        scalars[0] = audio.volume(filtered=True)
+        scalars[1] = audio.volume(filtered=False)
+        scalars[2] = audio.onset() if active("onset") else 0
+        scalars[3] = audio.bpm_beat_now() if active("tempo") else 0
+        scalars[4] = audio.volume_beat_now() if active("volume_beat") else 0
+        scalars[5] = audio.bar_oscillator() if active("tempo") else 0
+        scalars[6] = audio.pitch() if active("pitch") else 0
+        scalars[7] = audio.beat_counter
+        self.freq_power_raw[:] = audio.freq_power_raw
+        self.freq_power_filtered[:] = audio.freq_power_filter.value
+        for dest, src in zip(self.melbanks, audio.melbanks.melbanks):
+            dest[:] = src
+        for dest, src in zip(
+            self.melbanks_filtered, audio.melbanks.melbanks_filtered
+        ):
+            dest[:] = src
+        self.header[0] += 1
+
+    def read_into(self, other):
+        """
+        Copies this record into another record of the same layout,
+        retrying while the writer is mid-update. Returns the sequence
+        number copied, or None if no consistent copy could be made.
+        """
+        for _ in range(READ_RETRIES):
+            sequence = self.header[0]
+            if sequence % 2:
+                continue
+            np.copyto(other.data, self.data)
+            if self.header[0] == sequence:
+                return int(sequence)
+        return None
+
+
+def describe_layout(audio, version):
+    """
+    Builds the picklable description of the feature record layout for
+    an AudioAnalysisSource, used by readers to map the shared block
+    """
+    melbanks = audio.melbanks
+    return {
+        "version": version,
+        "mel_count": len(melbanks.melbanks),
+        "mel_len": len(melbanks.melbanks[0]) if melbanks.melbanks else 0,
+        "melbanks_config": dict(melbanks.melbanks_config),
+        "melbank_frequencies": [
+            list(map(float, proc.melbank_frequencies))
+            for proc in melbanks.melbank_processors
+        ],
+        "audio_config": {
+            key: value
+            for key, value in audio._config.items()
+            if isinstance(value, (bool, int, float, str))
+        },
+    }
+
+
+class SharedAudioPublisher:
+    """
+    Publishes the features of an AudioAnalysisSource into a shared memory
+    feature record once per hop. Subscribed to the audio source like any
+    other callback, after the analysis callbacks have run.
+
+    Listeners are told about new layouts (shared memory block name and
+    layout description) and notified after every published hop.
+    """
+
+    def __init__(self, audio, on_layout=None, on_hop=None):
+        self._audio = audio
+        self._on_layout = on_layout
+        self._on_hop = on_hop
+        self._version = 0
+        self._melbanks = None
+        self._shm = None
+        self.record = None
+        self.layout = None
+
+    @property
+    def shm_name(self):
+        return self._shm.name if self._shm is not None else None
+
+    def _build_record(self):
+        self._version += 1
+        self.layout = describe_layout(self._audio, self._version)
+        self._release()
+        self._shm = shared_memory.SharedMemory(
+            create=True,
+            size=record_length(
+                self.layout["mel_count"], self.layout["mel_len"]
+            )
+            * np.dtype(np.float64).itemsize,
+        )
+        self.record = FeatureRecord(
+            self.layout["mel_count"], self.layout["mel_len"], self._shm.buf
+        )
+        self.record.data[:] = 0
+        self.record.header[1] = self._version
+        self._melbanks = self._audio.melbanks.melbanks
+        if self._on_layout is not None:
+            self._on_layout(self._shm.name, self.layout)
+
+    def __call__(self):
+        # melbank buffers are replaced whenever the melbank config changes
+        if self._audio.melbanks.melbanks is not self._melbanks:
+            self._build_record()
+        self.record.write(self._audio)
+        if self._on_hop is not None:
+            self._on_hop()
+
+    def ensure_record(self):
+        """Creates the record if no hop has been published yet"""
+        if self.record is None:
+            self._build_record()
+
+    def _release(self):
+        if self._shm is not None:
+            self.record = None
+            release_shared_memory(self._shm, unlink=True)
+            self._shm = None
+
+    def close(self):
+        self._release()
+
+
+class _MelbanksView:
+    """Read-only stand-in for Melbanks backed by a feature record"""
+
+    def __init__(self, record, layout):
+        self.melbanks = record.melbanks
+        self.melbanks_filtered = record.melbanks_filtered
+        self.melbanks_config = layout["melbanks_config"]
+        self.mel_count = layout["mel_count"]
+        self.mel_len = layout["mel_len"]
+        self.melbank_processors = [
+            SimpleNamespace(melbank_frequencies=np.array(frequencies))
+            for frequencies in layout["melbank_frequencies"]
+        ]
+
+
+class FilterRegistry:
+    """
+    ExpFilters over the signals of an audio source, shared by all effects
+    smoothing the same signal with the same factors. The source calls the
+    registry on every hop before its subscribers, so each filter is updated
+    once per hop however many effects read it. Filters are keyed by signal
+    name and smoothing factors, and dropped with their last user. They are
+    held in one FilterBank, so a hop updates them all in a single pass.
+    """
+
+    def __init__(self, audio):
+        self._audio = audio
+        self._lock = threading.Lock()
+        self._bank = FilterBank()
+        # key -> [filter, users]
+        self._filters = {}
+        # (signal, filter) pairs staged on every hop
+        self._active = ()
+
+    def __len__(self):
+        return len(self._active)
+
+    def acquire(self, signal, alpha_decay, alpha_rise):
+        """
+        Returns the filter of signal with the given smoothing factors.
+        Every call must be matched by a call to release.
+        """
+        if signal not in FILTER_SIGNALS:
+            raise ValueError(f"Unknown filter signal {signal}")
+        key = (signal, alpha_decay, alpha_rise)
+        with self._lock:
+            entry = self._filters.get(key)
+            if entry is None:
+                entry = [self._bank.add(alpha_decay, alpha_rise), 0]
+                self._filters[key] = entry
+                self._update_active()
+            entry[1] += 1
+            return entry[0]
+
+    def release(self, signal, alpha_decay, alpha_rise):
+        key = (signal, alpha_decay, alpha_rise)
+        with self._lock:
+            entry = self._filters[key]
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._filters[key]
+                self._bank.remove(entry[0])
+                self._update_active()
+
+    def _update_active(self):
+        self._active = tuple(
+            (FILTER_SIGNALS[signal], entry[0])
+            for (signal, *_), entry in self._filters.items()
+        )
+
+    def __call__(self):
+        if not self._active:
+            return
+        audio = self._audio
+        with self._lock:
+            for signal, exp_filter in self._active:
+                exp_filter.stage(signal(audio))
+            self._bank.update()
+
+
+class SharedFilter:
+    """
+    Read-only handle on a filter of a FilterRegistry, handed to effects by
+    create_filter. The effect binds it to the registry of the features it
+    reads while active, and releases it on deactivation.
+    """
+
+    def __init__(self, signal, alpha_decay, alpha_rise):
+        if signal not in FILTER_SIGNALS:
+            raise ValueError(f"Unknown filter signal {signal}")
+        self._key = (signal, alpha_decay, alpha_rise)
+        self._registry = None
+        self._filter = None
+
+    def bind(self, registry):
+        self.release()
+        self._filter = registry.acquire(*self._key)
+        self._registry = registry
+
+    def release(self):
+        if self._registry is not None:
+            self._registry.release(*self._key)
+            self._registry = None
+            self._filter = None
+
+    @property
+    def value(self):
+        """The filtered signal, 0 until the filter has seen a hop"""
+        if self._filter is None or self._filter.value is None:
+            return 0.0
+        return self._filter.value
+
+
+class DecimatedFeatureSource:
+    """
+    Mixin for audio sources handing out FeatureDecimators, one for each
+    update rate asked for, shared by all the subscribers of that rate
+    """
+
+    def hops_per_update(self, rate):
+        """Number of hops of the source making up one update at rate"""
+        hop_rate = self._config.get("sample_rate", rate)
+        return max(1, round(hop_rate / rate))
+
+    def decimated(self, rate):
+        """
+        Returns the feature stream of the source at the given rate, the
+        source itself if the rate needs every hop. Subscribers keep the
+        stream they got until they resubscribe if the hop rate changes.
+        """
+        if self.hops_per_update(rate) == 1:
+            return self
+        decimator = self._decimators.get(rate)
+        if decimator is None:
+            decimator = FeatureDecimator(self, rate)
+            self._decimators[rate] = decimator
+            self.subscribe(decimator)
+        decimator.users += 1
+        return decimator
+
+    def release_decimated(self, decimator):
+        if decimator is self:
+            return
+        decimator.users -= 1
+        if decimator.users <= 0 and self._decimators.get(decimator.rate) is (
+            decimator
+        ):
+            del self._decimators[decimator.rate]
+            self.unsubscribe(decimator)
+
+    def decimator_diagnostics(self):
+        """Hops per update, users and filters of the decimators by rate"""
+        return {
+            rate: {
+                "hops_per_update": decimator.window(),
+                "users": decimator.users,
+                "shared_filters": len(decimator.filters),
+            }
+            for rate, decimator in list(self._decimators.items())
+        }
+
+
+class SharedAudioProxy(DecimatedFeatureSource):
+    """
+    Exposes the AudioAnalysisSource accessors used by audio reactive
+    effects, backed by a shared memory feature record written by another
+    process. Call `update` to take a consistent snapshot of the latest
+    hop; subscribers are invoked once for every new snapshot.
+    """
+
+    def __init__(self):
+        self._callbacks = []
+        self._shm = None
+        self._shared = None
+        self._snapshot = None
+        self._sequence = None
+        self.layout = None
+        self.melbanks = None
+        self._config = {}
+        self.dropped_hops = 0
+        self._decimators = {}
+        self.filters = FilterRegistry(self)
+
+    def attach(self, shm_name, layout):
+        """Maps the shared record described by layout"""
+        self.detach()
+        self._shm = shared_memory.SharedMemory(name=shm_name)
+        mel_count, mel_len = layout["mel_count"], layout["mel_len"]
+        self._shared = FeatureRecord(mel_count, mel_len, self._shm.buf)
+        self._snapshot = FeatureRecord(mel_count, mel_len)
+        self._sequence = None
+        self.layout = layout
+        self._config = layout["audio_config"]
+        self.melbanks = self._melbanks_view(self._snapshot, layout)
+
+    def _melbanks_view(self, record, layout):
+        return _MelbanksView(record, layout)
+
+    def detach(self):
+        if self._shm is not None:
+            self._shared = None
+            release_shared_memory(self._shm)
+            self._shm = None
+
+    def subscribe(self, callback):
+        self._callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    def acquire_features(self, features):
+        # the analyzers are run by the publishing process
+        pass
+
+    def release_features(self, features):
+        pass
+
+    def feature_active(self, feature):
+        return True
+
+    def update(self):
+        """
+        Takes a snapshot of the shared record and invokes subscribers if
+        it holds a new hop. Returns True if a new hop was dispatched.
+        """
+        if self._shared is None:
+            return False
+        sequence = self._shared.read_into(self._snapshot)
+        if sequence is None or sequence == self._sequence:
+            return False
+        if self._sequence is not None and sequence - self._sequence > 2:
+            self.dropped_hops += (sequence - self._sequence) // 2 - 1
+        self._sequence = sequence
+        self._dispatch()
+        return True
+
+    def _dispatch(self):
+        self.filters()
+        for callback in self._callbacks:
+            try:
+                callback()
+            except Exception:
+                _LOGGER.exception("Error in shared audio subscriber")
+
+    def _scalar(self, name):
+        return self._snapshot.scalars[FEATURE_SCALARS.index(name)]
+
+    def volume(self, filtered=True):
+        return float(self._scalar("volume" if filtered else "volume_raw"))
+
+    def onset(self):
+        return bool(self._scalar("onset"))
+
+    def bpm_beat_now(self):
+        return bool(self._scalar("bpm_beat_now"))
+
+    def volume_beat_now(self):
+        return bool(self._scalar("volume_beat_now"))
+
+    def bar_oscillator(self):
+        return float(self._scalar("bar_oscillator"))
+
+    def beat_oscillator(self):
+        return self.bar_oscillator() % 1
+
+    def pitch(self):
+        return float(self._scalar("pitch"))
+
+    @property
+    def beat_counter(self):
+        return int(self._scalar("beat_counter"))
+
+    @property
+    def freq_power_raw(self):
+        return self._snapshot.freq_power_raw
+
+    @property
+    def freq_power_filter(self):
+        # the filter itself stays in the publishing process
+        return SimpleNamespace(value=self._snapshot.freq_power_filtered)
+
+    def get_freq_power(self, i, filtered=True):
+        if filtered:
+            value = self._snapshot.freq_power_filtered[i]
+        else:
+            value = self._snapshot.freq_power_raw[i]
+        return value if not np.isnan(value) else 0.0
+
+    def beat_power(self, filtered=True):
+        return self.get_freq_power(0, filtered)
+
+    def bass_power(self, filtered=True):
+        return self.get_freq_power(1, filtered)
+
+    def lows_power(self, filtered=True):
+        return (
+            self.get_freq_power(0, filtered) + self.get_freq_power(1, filtered)
+        ) * 0.5
+
+    def mids_power(self, filtered=True):
+        return self.get_freq_power(2, filtered)
+
+    def high_power(self, filtered=True):
+        return self.get_freq_power(3, filtered)
+
+
+class FeatureDecimator(SharedAudioProxy):
+    """
+    Features of an audio source at a lower rate than its hops, for
+    subscribers that don't need every hop.
+
+    Every hop of the source is collected into a window of as many hops as
+    fit in one update at the requested rate, and subscribers are called
+    once per window. Onsets and beats are held if any hop of the window
+    had one, the melbanks, volume and frequency powers are averaged, and
+    the oscillators and pitch are those of the last hop. At or above the
+    hop rate of the source every hop is passed on.
+    """
+
+    def __init__(self, source, rate):
+        super().__init__()
+        self._source = source
+        self.rate = rate
+        self.users = 0
+        self._version = 0
+        self._source_melbanks = None
+        self._hop = None
+        self._sum = None
+        self._held = np.zeros(len(HELD_FEATURES))
+        self._hops = 0
+
+    def _build_records(self):
+        self._version += 1
+        layout = describe_layout(self._source, self._version)
+        mel_count, mel_len = layout["mel_count"], layout["mel_len"]
+        self._hop = FeatureRecord(mel_count, mel_len)
+        self._snapshot = FeatureRecord(mel_count, mel_len)
+        self._sum = np.zeros_like(self._hop.data)
+        self._held.fill(0)
+        self._hops = 0
+        self.layout = layout
+        self._config = layout["audio_config"]
+        self.melbanks = self._melbanks_view(self._snapshot, layout)
+        self._source_melbanks = self._source.melbanks.melbanks
+
+    def window(self):
+        """Number of source hops making up one update"""
+        return self._source.hops_per_update(self.rate)
+
+    def __call__(self):
+        source = self._source
+        # melbank buffers are replaced whenever the melbank config changes
+        if source.melbanks.melbanks is not self._source_melbanks:
+            self._build_records()
+        hop = self._hop
+        hop.write(source)
+        np.add(self._sum, hop.data, out=self._sum)
+        np.maximum(self._held, hop.data[HELD_FEATURES], out=self._held)
+        self._hops += 1
+        if self._hops < self.window():
+            return
+
+        snapshot = self._snapshot.data
+        np.divide(self._sum, self._hops, out=snapshot)
+        snapshot[:HEADER_LEN] = hop.header
+        snapshot[HELD_FEATURES] = self._held
+        snapshot[LATEST_FEATURES] = hop.data[LATEST_FEATURES]
+        self._sum.fill(0)
+        self._held.fill(0)
+        self._hops = 0
+        self._dispatch()
@@ -24,6 +24,9 @@ class SingleColorEffect(TemporalEffect, ModulateEffect):
     def on_activate(self, pixel_count):
         pass
 
+    def is_static(self):
+        return not self._config["modulate"]
+
     def effect_loop(self):
         color_array = np.tile(self.color, (self.pixel_count, 1))
         self.pixels = self.modulate(color_array)
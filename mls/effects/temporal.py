@@ -1,8 +1,5 @@
 import logging
-import time
-
-# from mls.effects.audio import AudioReactiveEffect
-from threading import Thread
+import timeit
 
 import voluptuous as vol
 
@@ -11,9 +8,14 @@ from mls.effects import Effect
 _LOGGER = logging.getLogger(__name__)
 
 # use 10 frames per second as default rate at 1x multiplier
-# windows pre 3.11 will cap at 64Hz max for now,
-# other OS at 100Hz with speed slider ot 10
+# effect steps are clocked by the virtual's render ticks, so rates above
+# its refresh rate run several steps per frame
 DEFAULT_RATE = 1.0 / 10.0
+# shortest time an effect step may take
+MIN_STEP_TIME = 0.001
+# steps further behind than this are dropped rather than caught up on,
+# e.g. after rendering was suspended
+MAX_CATCHUP_TIME = 0.5
 
 
 @Effect.no_registration
@@ -30,29 +32,42 @@ class TemporalEffect(Effect):
 
     def __init__(self, mls, config):
         super().__init__(mls, config)
-        self._thread_active = False
-        self._thread = None
+        self._last_render = None
+        self._pending_time = 0.0
+        self._step_time = 0.0
+
+    def render(self):
+        """
+        Advances the effect by the time elapsed since the last render,
+        running effect_loop once for every step that has become due
+        """
+        now = timeit.default_timer()
+        elapsed = 0.0 if self._last_render is None else now - self._last_render
+        self._last_render = now
 
-    def thread_function(self):
-        while self._thread_active:
-            startTime = time.time()
+        if self.is_static():
+            # the frame only changes with the config
+            if self._rendered_version != self._config_version:
+                self.effect_loop()
+            self._pending_time = 0.0
+            return
+
+        self._pending_time += elapsed
+        if self._pending_time > MAX_CATCHUP_TIME:
+            self._pending_time = self._step_time
+        while self._pending_time >= self._step_time:
+            self._pending_time -= self._step_time
 
             # Treat the return value of the effect loop as a speed modifier
             # such that effects that are naturally faster or slower can have
             # a consistent feel.
-            sleepInterval = self.effect_loop()
-            if sleepInterval is None:
-                sleepInterval = 1.0
-            sleepInterval = sleepInterval * DEFAULT_RATE
-
-            # Calculate the time to sleep accounting for potential heavy
-            # frame assembly operations
-            timeToSleep = (sleepInterval / self._config["speed"]) - (
-                time.time() - startTime
+            step_interval = self.effect_loop()
+            if step_interval is None:
+                step_interval = 1.0
+            self._step_time = max(
+                step_interval * DEFAULT_RATE / self._config["speed"],
+                MIN_STEP_TIME,
             )
-            if timeToSleep < 0.001:
-                timeToSleep = 0.001
-            time.sleep(timeToSleep)
 
     def effect_loop(self):
         """
@@ -62,16 +77,7 @@ class TemporalEffect(Effect):
         pass
 
     def on_activate(self, pixel_count):
-        self._thread_active = True
-        self._thread = Thread(
-            name=f"Effect: {self.name}", target=self.thread_function
-        )
-        self._thread.start()
-
-    def deactivate(self):
-        if self._thread_active:
-            self._thread_active = False
-            self._thread.join()
-            self._thread = None
-
-        super().deactivate()
+        # the first render runs a step right away
+        self._last_render = None
+        self._pending_time = 0.0
+        self._step_time = 0.0
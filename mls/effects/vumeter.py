@@ -8,6 +8,7 @@ from mls.effects.audio import AudioReactiveEffect
 class VuMeterAudioEffect(AudioReactiveEffect):
     NAME = "VuMeter"
     CATEGORY = "Diagnostic"
+    AUDIO_FEATURES = ()
     HIDDEN_KEYS = ["background_color", "background_brightness", "blur"]
 
     CONFIG_SCHEMA = vol.Schema(
@@ -75,10 +76,11 @@ class VuMeterAudioEffect(AudioReactiveEffect):
     def audio_data_updated(self, data):
         # grab the raw volume from the audio driver
         self.volume = max(0, min(1, self.audio.volume(filtered=False)))
-        self.volume_peak = self.volume_peak_filter.update(self.volume)
-        self.volume_min_peak = self.volume_min_peak_filter.update(
-            1 - self.volume
-        )
+        self.volume_peak_filter.stage(self.volume)
+        self.volume_min_peak_filter.stage(1 - self.volume)
+        self.update_filters()
+        self.volume_peak = self.volume_peak_filter.value
+        self.volume_min_peak = self.volume_min_peak_filter.value
         self.volume_min = self.audio._config["min_volume"]
 
     def render(self):
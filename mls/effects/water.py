@@ -23,6 +23,7 @@ class Water(AudioReactiveEffect, HSVEffect):
 
     NAME = "Water"
     CATEGORY = "Atmospheric"
+    AUDIO_FEATURES = ()
 
     CONFIG_SCHEMA = vol.Schema(
         {
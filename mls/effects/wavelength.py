@@ -8,6 +8,7 @@ from mls.effects.gradient import GradientEffect
 class WavelengthAudioEffect(AudioReactiveEffect, GradientEffect):
     NAME = "Wavelength"
     CATEGORY = "Classic"
+    AUDIO_FEATURES = ()
 
     # There is no additional configuration here, but override the blur
     # default to be 3.0 so blurring is enabled.
@@ -26,6 +26,7 @@ class Event:
     GLOBAL_PAUSE = "global_pause"
     VIRTUAL_PAUSE = "virtual_pause"
     AUDIO_INPUT_DEVICE_CHANGED = "audio_input_device_changed"
+    AUDIO_SILENCE = "audio_silence"
 
     def __init__(self, type: str):
         self.event_type = type
@@ -94,6 +95,14 @@ class AudioDeviceChangeEvent(Event):
         self.audio_input_device_name = audio_input_device_name
 
 
+class AudioSilenceEvent(Event):
+    """Event emitted when the audio silence gate closes or opens"""
+
+    def __init__(self, silent: bool):
+        super().__init__(Event.AUDIO_SILENCE)
+        self.silent = silent
+
+
 class GraphUpdateEvent(Event):
     """Event emitted when an audio graph is updated"""
 
@@ -230,6 +239,27 @@ class Events:
 
         return remove_listener
 
+    def has_listener(
+        self,
+        event_type: str,
+        attributes: dict,
+        include_unfiltered: bool = True,
+    ) -> bool:
+        """
+        Returns True if any listener would receive an event of the given type
+        with these attributes. Listeners without a filter receive every event
+        of their type and can be left out with include_unfiltered.
+        """
+        for listener in tuple(self._listeners.get(event_type, ())):
+            if not listener.filter and not include_unfiltered:
+                continue
+            if all(
+                attributes.get(key) == value
+                for key, value in listener.filter.items()
+            ):
+                return True
+        return False
+
     def _remove_listener(self, event_type: str, listener: Callable) -> None:
         try:
             self._listeners[event_type].remove(listener)
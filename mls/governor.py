@@ -0,0 +1,149 @@
+import timeit
+from collections import deque
+
+import numpy as np
+
+from mls.utils import AVAILABLE_FPS
+
+# Degradation levels, from best to cheapest. Levels are cumulative, a
+# virtual at a given level also applies the policies of all lower levels.
+#   full: render as configured
+#   reduced_fps: render at about half the refresh rate of the devices
+#   no_blur: skip the blur stage of effect post-processing
+#   no_transitions: finish effect transitions at once instead of blending
+#   reduced_resolution: render effects at half the pixel count
+DEGRADATION_LEVELS = (
+    "full",
+    "reduced_fps",
+    "no_blur",
+    "no_transitions",
+    "reduced_resolution",
+)
+LEVEL_REDUCED_FPS = DEGRADATION_LEVELS.index("reduced_fps")
+LEVEL_NO_BLUR = DEGRADATION_LEVELS.index("no_blur")
+LEVEL_NO_TRANSITIONS = DEGRADATION_LEVELS.index("no_transitions")
+LEVEL_REDUCED_RESOLUTION = DEGRADATION_LEVELS.index("reduced_resolution")
+
+# number of render times kept to compute the percentile from
+WINDOW_SIZE = 120
+# samples needed at a level before it is evaluated again
+MIN_SAMPLES = 30
+RENDER_TIME_PERCENTILE = 90
+# share of the frame interval a virtual may spend rendering
+BUDGET_RATIO = 0.8
+# the next better level is restored once render times fit this share of
+# its budget, which keeps the governor from flapping between two levels
+HEADROOM_RATIO = 0.5
+# seconds to stay at a level before stepping back up
+RECOVERY_HOLD = 5.0
+
+
+def reduced_refresh_rate(refresh_rate):
+    """The available frame rate closest to half of refresh_rate"""
+    return next(
+        (fps for fps in reversed(AVAILABLE_FPS) if fps <= refresh_rate / 2),
+        next(iter(AVAILABLE_FPS)),
+    )
+
+
+class FrameGovernor:
+    """
+    Keeps the render time of a virtual within its frame budget.
+
+    Render times are tracked over a rolling window. While their percentile
+    exceeds the budget the governor steps down one degradation level at a
+    time, and once there is enough headroom for the next better level it
+    steps back up. The virtual reads the active policies off the governor.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.level = 0
+        self._samples = deque(maxlen=WINDOW_SIZE)
+        self.render_time = 0.0
+        self._changed_at = timeit.default_timer()
+
+    @property
+    def level_name(self):
+        return DEGRADATION_LEVELS[self.level]
+
+    @property
+    def blur_enabled(self):
+        return self.level < LEVEL_NO_BLUR
+
+    @property
+    def transitions_enabled(self):
+        return self.level < LEVEL_NO_TRANSITIONS
+
+    @property
+    def resolution_divisor(self):
+        return 2 if self.level >= LEVEL_REDUCED_RESOLUTION else 1
+
+    def render_rate(self, refresh_rate, level=None):
+        """The rate frames are rendered at for a device refresh rate"""
+        level = self.level if level is None else level
+        if refresh_rate and level >= LEVEL_REDUCED_FPS:
+            return reduced_refresh_rate(refresh_rate)
+        return refresh_rate
+
+    def budget(self, refresh_rate, level=None):
+        """Seconds a frame may take to render at the given level"""
+        return BUDGET_RATIO / self.render_rate(refresh_rate, level)
+
+    def record(self, render_time, refresh_rate):
+        """
+        Adds the render time of a frame and re-evaluates the level.
+        Returns True if the level changed.
+        """
+        if not self.enabled or not refresh_rate:
+            return False
+        self._samples.append(render_time)
+        if len(self._samples) < MIN_SAMPLES:
+            return False
+        self.render_time = float(
+            np.percentile(self._samples, RENDER_TIME_PERCENTILE)
+        )
+
+        if self.render_time > self.budget(refresh_rate):
+            if self.level < len(DEGRADATION_LEVELS) - 1:
+                self._set_level(self.level + 1)
+                return True
+        elif (
+            self.level > 0
+            and timeit.default_timer() - self._changed_at > RECOVERY_HOLD
+            and self.render_time
+            < self.budget(refresh_rate, self.level - 1) * HEADROOM_RATIO
+        ):
+            self._set_level(self.level - 1)
+            return True
+        return False
+
+    def reset(self):
+        """Returns to full quality. Returns True if the level changed."""
+        self._samples.clear()
+        if self.level == 0:
+            return False
+        self.level = 0
+        self._changed_at = timeit.default_timer()
+        return True
+
+    def _set_level(self, level):
+        self.level = level
+        self._changed_at = timeit.default_timer()
+        # samples taken at the previous level no longer apply
+        self._samples.clear()
+
+    def status(self, refresh_rate):
+        """Returns the degradation state for the API"""
+        return {
+            "enabled": self.enabled,
+            "level": self.level,
+            "level_name": self.level_name,
+            "render_rate": self.render_rate(refresh_rate),
+            "render_time_ms": round(self.render_time * 1000, 3),
+            "budget_ms": (
+                round(self.budget(refresh_rate) * 1000, 3)
+                if refresh_rate
+                else None
+            ),
+        }
@@ -0,0 +1,663 @@
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import threading
+import timeit
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from mls.color import (
+    LEDFX_COLORS,
+    LEDFX_GRADIENTS,
+    parse_color,
+    parse_gradient,
+    validate_color,
+    validate_gradient,
+)
+from mls.effects.melbank import FrequencyRange
+from mls.effects.shared_audio import (
+    SharedAudioProxy,
+    SharedAudioPublisher,
+    release_shared_memory,
+)
+from mls.events import Event
+from mls.utils import UserDefaultCollection, fps_to_sleep_interval
+
+_LOGGER = logging.getLogger(__name__)
+
+# core config keys copied into each worker for the effects to use
+WORKER_CONFIG_KEYS = ("user_colors", "user_gradients", "melbanks", "audio")
+
+# frame buffer header: sequence number, status
+FRAME_HEADER_LEN = 2
+FRAME_STATUS_OK = 0
+FRAME_STATUS_ERROR = 1
+# reads without a new frame before the workers are checked for a crash
+STALLED_READS = 30
+
+
+class FrameBuffer:
+    """
+    A pixel frame in shared memory, guarded by a seqlock. The sequence
+    number in the header is odd while the writer is copying a frame in.
+    """
+
+    def __init__(self, pixel_count, name=None):
+        self.pixel_count = pixel_count
+        frame_size = pixel_count * 3 * np.dtype(np.float64).itemsize
+        header_size = FRAME_HEADER_LEN * np.dtype(np.float64).itemsize
+        self._owner = name is None
+        if self._owner:
+            self.shm = shared_memory.SharedMemory(
+                create=True, size=header_size + frame_size
+            )
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.header = np.ndarray(
+            (FRAME_HEADER_LEN,), dtype=np.float64, buffer=self.shm.buf
+        )
+        self.frame = np.ndarray(
+            (pixel_count, 3),
+            dtype=np.float64,
+            buffer=self.shm.buf,
+            offset=header_size,
+        )
+        if self._owner:
+            self.header[:] = 0
+            self.frame[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def status(self):
+        return int(self.header[1])
+
+    def write(self, pixels):
+        self.header[0] += 1
+        self.frame[:] = pixels
+        self.header[0] += 1
+
+    def set_status(self, status):
+        self.header[1] = status
+
+    def reset(self):
+        """Clears the header for a new writer, the old one must be gone"""
+        self.header[:] = 0
+
+    def read_into(self, out, retries=4):
+        """
+        Copies the latest complete frame into out. Returns the frame's
+        sequence number, or None if the writer kept it busy.
+        """
+        for _ in range(retries):
+            sequence = self.header[0]
+            if sequence % 2:
+                continue
+            np.copyto(out, self.frame)
+            if self.header[0] == sequence:
+                return int(sequence)
+        return None
+
+    def close(self):
+        self.header = self.frame = None
+        release_shared_memory(self.shm, unlink=self._owner)
+
+
+def _virtual_info(virtual):
+    """Picklable description of the virtual an effect is rendered for"""
+    governor = getattr(virtual, "governor", None)
+    return {
+        "id": virtual.id,
+        "config": dict(virtual.config),
+        "effective_pixel_count": virtual.effective_pixel_count,
+        "refresh_rate": virtual.refresh_rate,
+        "blur_enabled": governor is None or governor.blur_enabled,
+    }
+
+
+class _WorkerGovernor:
+    """The degradation policies of the virtual that effects read"""
+
+    def __init__(self, blur_enabled):
+        self.blur_enabled = blur_enabled
+
+
+class _WorkerVirtual:
+    """Stand-in for the Virtual an effect is attached to inside a worker"""
+
+    def __init__(self, info):
+        self.update(info)
+
+    def update(self, info):
+        self.id = info["id"]
+        self.config = info["config"]
+        self.effective_pixel_count = info["effective_pixel_count"]
+        self.refresh_rate = info["refresh_rate"]
+        self.governor = _WorkerGovernor(info["blur_enabled"])
+        self.frequency_range = FrequencyRange(
+            self.config["frequency_min"], self.config["frequency_max"]
+        )
+
+    def render_delegate(self, effect):
+        # effects are always rendered in place inside a worker
+        return None
+
+
+class _WorkerContext:
+    """
+    The subset of the core object that effects use, recreated inside
+    each worker process.
+    """
+
+    def __init__(self, config):
+        self.config = {key: {} for key in WORKER_CONFIG_KEYS}
+        self.update_config(config)
+        self.audio = None
+        self.colors = UserDefaultCollection(
+            self,
+            "Colors",
+            LEDFX_COLORS,
+            "user_colors",
+            validate_color,
+            parse_color,
+        )
+        self.gradients = UserDefaultCollection(
+            self,
+            "Gradients",
+            LEDFX_GRADIENTS,
+            "user_gradients",
+            validate_gradient,
+            parse_gradient,
+        )
+
+    def update_config(self, config):
+        # update in place, the collections hold references to these dicts
+        for key in WORKER_CONFIG_KEYS:
+            self.config[key].clear()
+            self.config[key].update(config.get(key, {}))
+
+    def dev_enabled(self):
+        return False
+
+
+class _WorkerEntry:
+    def __init__(self, effect, virtual, frame_buffer):
+        self.effect = effect
+        self.virtual = virtual
+        self.frame_buffer = frame_buffer
+        self.interval = fps_to_sleep_interval(virtual.refresh_rate)
+        self.deadline = timeit.default_timer()
+
+
+class RenderWorker:
+    """
+    Runs inside a worker process. Owns a private effect registry, renders
+    every attached effect on its virtual's refresh interval and writes the
+    frames into shared memory for the main process to flush.
+    """
+
+    def __init__(self, index, cmd_conn, audio_conn):
+        # imported here so the main process never builds a second registry
+        from mls.effects import Effects
+
+        self.index = index
+        self._cmd_conn = cmd_conn
+        self._audio_conn = audio_conn
+        self._ctx = _WorkerContext({})
+        self._effects = Effects(self._ctx)
+        self._ctx.audio = self._audio = SharedAudioProxy()
+        self._entries = {}
+        self._running = True
+
+    def run(self):
+        while self._running:
+            timeout = None
+            if self._entries:
+                deadline = min(e.deadline for e in self._entries.values())
+                timeout = max(0, deadline - timeit.default_timer())
+            try:
+                ready = wait([self._cmd_conn, self._audio_conn], timeout)
+                if self._audio_conn in ready:
+                    while self._audio_conn.poll():
+                        self._audio_conn.recv_bytes()
+                    self._audio.update()
+                if self._cmd_conn in ready:
+                    while self._running and self._cmd_conn.poll():
+                        self._handle(*self._cmd_conn.recv())
+            except (EOFError, OSError):
+                # the main process has gone away
+                break
+            self._render_due()
+        for key in list(self._entries):
+            self._detach(key)
+        self._audio.detach()
+
+    def _render_due(self):
+        now = timeit.default_timer()
+        for entry in self._entries.values():
+            if entry.deadline > now:
+                continue
+            try:
+                entry.effect._render()
+                pixels = entry.effect.get_pixels()
+                if pixels is not None and len(pixels) == len(
+                    entry.frame_buffer.frame
+                ):
+                    entry.frame_buffer.write(pixels)
+            except Exception:
+                _LOGGER.exception(
+                    f"Render worker {self.index}: Error rendering {entry.effect.name} on {entry.virtual.id}"
+                )
+                entry.frame_buffer.set_status(FRAME_STATUS_ERROR)
+            entry.deadline += entry.interval
+            if entry.deadline < now:
+                entry.deadline = now + entry.interval
+
+    def _handle(self, command, *args):
+        try:
+            getattr(self, f"_{command}")(*args)
+        except Exception:
+            _LOGGER.exception(
+                f"Render worker {self.index}: Error handling {command}"
+            )
+
+    def _stop(self):
+        self._running = False
+
+    def _config(self, config):
+        self._ctx.update_config(config)
+
+    def _audio_layout(self, shm_name, layout):
+        if shm_name is None:
+            self._audio.detach()
+        else:
+            self._audio.attach(shm_name, layout)
+
+    def _attach(self, key, effect_type, config, virtual_info, shm_name):
+        try:
+            frame_buffer = FrameBuffer(
+                virtual_info["effective_pixel_count"], name=shm_name
+            )
+        except FileNotFoundError:
+            # detached again before the worker got to it
+            return
+        try:
+            effect = self._effects.create(
+                mls=self._ctx, type=effect_type, config=config
+            )
+            virtual = _WorkerVirtual(virtual_info)
+            effect.activate(virtual)
+        except Exception:
+            _LOGGER.exception(
+                f"Render worker {self.index}: Unable to activate {effect_type}"
+            )
+            frame_buffer.set_status(FRAME_STATUS_ERROR)
+            frame_buffer.close()
+            return
+        self._entries[key] = _WorkerEntry(effect, virtual, frame_buffer)
+
+    def _update(self, key, config):
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.effect.update_config(config)
+
+    def _virtual(self, key, virtual_info):
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        effect, virtual = entry.effect, entry.virtual
+        old_config = virtual.config
+        virtual.update(virtual_info)
+        entry.interval = fps_to_sleep_interval(virtual.refresh_rate)
+        # mirror what Virtual does to its effect when the config changes
+        if (
+            old_config["frequency_min"] != virtual.config["frequency_min"]
+            or old_config["frequency_max"] != virtual.config["frequency_max"]
+        ) and hasattr(effect, "clear_melbank_freq_props"):
+            effect.clear_melbank_freq_props()
+        if old_config["rows"] != virtual.config["rows"] and hasattr(
+            effect, "set_init"
+        ):
+            effect.set_init()
+
+    def _detach(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        try:
+            entry.effect._deactivate()
+        except Exception:
+            _LOGGER.exception(
+                f"Render worker {self.index}: Error deactivating {entry.effect.name}"
+            )
+        self._effects.destroy(entry.effect.id)
+        entry.frame_buffer.close()
+
+
+def _worker_main(index, cmd_conn, audio_conn, log_queue, log_level):
+    root_logger = logging.getLogger()
+    root_logger.handlers.clear()
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(log_level)
+    RenderWorker(index, cmd_conn, audio_conn).run()
+
+
+class LogForwarder(logging.Handler):
+    """Re-emits log records from the workers through the local loggers"""
+
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+class _WorkerHandle:
+    """Main process side of a render worker"""
+
+    def __init__(self, index, context, log_queue):
+        self.index = index
+        self.pixel_load = 0
+        # delegates attached to this worker, by key
+        self.delegates = {}
+        self._lock = threading.Lock()
+        worker_cmd_conn, self._cmd_conn = context.Pipe(duplex=False)
+        worker_audio_conn, self._audio_conn = context.Pipe(duplex=False)
+        try:
+            # never let a stalled worker block the audio thread
+            os.set_blocking(self._audio_conn.fileno(), False)
+        except (AttributeError, OSError):
+            pass
+        self.process = context.Process(
+            target=_worker_main,
+            args=(
+                index,
+                worker_cmd_conn,
+                worker_audio_conn,
+                log_queue,
+                logging.getLogger().getEffectiveLevel(),
+            ),
+            name=f"RenderWorker-{index}",
+            daemon=True,
+        )
+        self.process.start()
+        worker_cmd_conn.close()
+        worker_audio_conn.close()
+
+    def send(self, *message):
+        with self._lock:
+            try:
+                self._cmd_conn.send(message)
+            except (BrokenPipeError, OSError) as e:
+                _LOGGER.warning(f"Render worker {self.index}: {e}")
+
+    def notify_hop(self):
+        try:
+            self._audio_conn.send_bytes(b"\x00")
+        except (BlockingIOError, BrokenPipeError, OSError):
+            pass
+
+    def stop(self):
+        if self.process.is_alive():
+            self.send("stop")
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        self._cmd_conn.close()
+        self._audio_conn.close()
+
+
+class RenderDelegate:
+    """
+    Handle held by an Effect whose frames are rendered in a worker process.
+    The effect keeps its usual lifecycle in the main process, while render
+    and post-processing happen in the worker and frames are read back from
+    shared memory.
+    """
+
+    def __init__(self, pool, worker, key, effect, virtual):
+        self._pool = pool
+        self._worker = None
+        self._key = key
+        self._effect = effect
+        self._virtual = virtual
+        self._effect_name = effect.name
+        self._uses_audio = False
+        self._error_logged = False
+        self._sequence = None
+        self._stalled_reads = 0
+        self.pixel_count = virtual.effective_pixel_count
+        self._frame_buffer = FrameBuffer(self.pixel_count)
+        self._pixels = np.zeros((self.pixel_count, 3))
+        self.attach_to(worker)
+        self._remove_listener = pool._mls.events.add_listener(
+            lambda e: self.update_virtual(virtual),
+            Event.VIRTUAL_CONFIG_UPDATE,
+            {"virtual_id": virtual.id},
+        )
+
+    def attach_to(self, worker):
+        """
+        Starts rendering the effect in worker, picking up from a worker
+        that has exited if there was one
+        """
+        if self._worker is not None:
+            self._worker.delegates.pop(self._key, None)
+            self._worker.pixel_load -= self.pixel_count
+            self._frame_buffer.reset()
+            self._error_logged = False
+        self._worker = worker
+        worker.delegates[self._key] = self
+        worker.pixel_load += self.pixel_count
+        worker.send(
+            "attach",
+            self._key,
+            self._effect.type,
+            dict(self._effect.config),
+            _virtual_info(self._virtual),
+            self._frame_buffer.name,
+        )
+
+    def read(self):
+        """
+        Returns the latest frame rendered by the worker, copied into a
+        buffer that is reused on the next read
+        """
+        pixels = self._pixels
+        if (
+            self._frame_buffer is None
+            or self._frame_buffer.status == FRAME_STATUS_ERROR
+        ):
+            if self._frame_buffer is not None and not self._error_logged:
+                self._error_logged = True
+                _LOGGER.warning(
+                    f"Effect {self._effect_name} failed in render worker {self._worker.index}"
+                )
+            pixels.fill(0)
+            return pixels
+        sequence = self._frame_buffer.read_into(pixels)
+        if sequence is not None and sequence == self._sequence:
+            # frames stop coming when the worker has crashed
+            self._stalled_reads += 1
+            if self._stalled_reads >= STALLED_READS:
+                self._stalled_reads = 0
+                self._pool.restart_exited_workers()
+        else:
+            self._stalled_reads = 0
+        self._sequence = sequence
+        return pixels
+
+    def update_config(self, config):
+        self._worker.send("update", self._key, dict(config))
+
+    def update_virtual(self, virtual):
+        self._worker.send("virtual", self._key, _virtual_info(virtual))
+
+    def static_frame_version(self):
+        # frames rendered by workers are always treated as animated
+        return None
+
+    def acquire_audio(self, audio):
+        """Starts publishing audio features for this effect's worker"""
+        if not self._uses_audio:
+            self._uses_audio = True
+            self._pool.acquire_audio(audio)
+
+    def detach(self):
+        if self._frame_buffer is None:
+            return
+        self._remove_listener()
+        self._worker.send("detach", self._key)
+        self._worker.delegates.pop(self._key, None)
+        self._worker.pixel_load -= self.pixel_count
+        if self._uses_audio:
+            self._uses_audio = False
+            self._pool.release_audio()
+        self._frame_buffer.close()
+        self._frame_buffer = None
+
+
+class RenderPool:
+    """
+    Shards effect rendering across a pool of worker processes so that
+    rendering is not limited by the GIL of the main process.
+
+    Effects are still created, configured and activated through the usual
+    registries. On activation an effect asks its virtual for a delegate;
+    with the pool enabled that attaches a copy of the effect to the least
+    loaded worker. Frames come back through shared memory and audio
+    features are published to the workers through a shared feature record.
+    """
+
+    def __init__(self, mls, worker_count):
+        self._mls = mls
+        self._worker_count = worker_count
+        self._workers = []
+        self._lock = threading.Lock()
+        self._next_key = 0
+        self._audio = None
+        self._audio_users = 0
+        self._publisher = None
+        self._audio_layout = (None, None)
+        self._log_queue = None
+        self._log_listener = None
+
+    def start(self):
+        """
+        Spawns the worker processes. Workers import the whole package on
+        startup, so this is done up front rather than on the first attach.
+        """
+        with self._lock:
+            if not self._workers:
+                self._start()
+
+    def _start(self):
+        context = multiprocessing.get_context("spawn")
+        self._log_queue = context.Queue()
+        self._log_listener = logging.handlers.QueueListener(
+            self._log_queue, LogForwarder()
+        )
+        self._log_listener.start()
+        for index in range(self._worker_count):
+            self._workers.append(
+                _WorkerHandle(index, context, self._log_queue)
+            )
+        _LOGGER.info(f"Started {self._worker_count} render workers")
+
+    def _worker_config(self):
+        return {
+            key: self._mls.config.get(key, {}) for key in WORKER_CONFIG_KEYS
+        }
+
+    def attach(self, effect, virtual):
+        """Attaches an effect to the least loaded worker"""
+        with self._lock:
+            if not self._workers:
+                self._start()
+            self._restart_exited_workers()
+            worker = min(self._workers, key=lambda w: w.pixel_load)
+            self._next_key += 1
+            # colors and melbank settings may have changed since the last attach
+            worker.send("config", self._worker_config())
+            return RenderDelegate(
+                self, worker, self._next_key, effect, virtual
+            )
+
+    def restart_exited_workers(self):
+        with self._lock:
+            self._restart_exited_workers()
+
+    def _restart_exited_workers(self):
+        """
+        Replaces workers that have exited, attaching their effects to the
+        new worker. Caller holds the lock.
+        """
+        for worker in list(self._workers):
+            if worker.process.is_alive():
+                continue
+            _LOGGER.warning(
+                f"Render worker {worker.index} exited, restarting with {len(worker.delegates)} effects"
+            )
+            new_worker = _WorkerHandle(
+                worker.index,
+                multiprocessing.get_context("spawn"),
+                self._log_queue,
+            )
+            self._workers[worker.index] = new_worker
+            new_worker.send("audio_layout", *self._audio_layout)
+            new_worker.send("config", self._worker_config())
+            for delegate in list(worker.delegates.values()):
+                delegate.attach_to(new_worker)
+            worker.stop()
+
+    def acquire_audio(self, audio):
+        with self._lock:
+            self._audio_users += 1
+            if self._publisher is not None and self._audio is audio:
+                return
+            self._close_publisher()
+            self._audio = audio
+            self._publisher = SharedAudioPublisher(
+                audio,
+                on_layout=self._broadcast_layout,
+                on_hop=self._notify_hop,
+            )
+            self._publisher.ensure_record()
+            audio.subscribe(self._publisher)
+
+    def release_audio(self):
+        with self._lock:
+            self._audio_users = max(0, self._audio_users - 1)
+            if self._audio_users == 0:
+                self._close_publisher()
+
+    def _close_publisher(self):
+        if self._publisher is None:
+            return
+        self._audio.unsubscribe(self._publisher)
+        self._broadcast_layout(None, None)
+        self._publisher.close()
+        self._publisher = None
+        self._audio = None
+
+    def _broadcast_layout(self, shm_name, layout):
+        self._audio_layout = (shm_name, layout)
+        for worker in self._workers:
+            worker.send("audio_layout", shm_name, layout)
+
+    def _notify_hop(self):
+        for worker in self._workers:
+            worker.notify_hop()
+
+    def stop(self):
+        with self._lock:
+            self._audio_users = 0
+            self._close_publisher()
+            for worker in self._workers:
+                worker.stop()
+            self._workers = []
+            if self._log_listener is not None:
+                self._log_listener.stop()
+                self._log_listener = None
@@ -0,0 +1,265 @@
+import logging
+import threading
+import timeit
+
+from mls.effects.audio import AudioInputSource
+from mls.utils import fps_to_sleep_interval
+
+_LOGGER = logging.getLogger(__name__)
+
+# share of the frame interval that must pass between two audio clocked
+# ticks, so hops arriving with some jitter are not deferred to the timer
+AUDIO_HOP_RATE_CAP = 0.8
+# frame intervals to wait for an audio hop before ticking on the timer
+AUDIO_STALL_FRAMES = 2
+
+
+class _RateGroup:
+    """Virtuals sharing a refresh rate, ticked together on one deadline"""
+
+    def __init__(self, refresh_rate, deadline, audio_clocked=False):
+        self.refresh_rate = refresh_rate
+        self.interval = fps_to_sleep_interval(refresh_rate)
+        self.deadline = deadline
+        self.audio_clocked = audio_clocked
+        # set by audio hops that have not been rendered yet
+        self.hop_pending = False
+        self.last_start = deadline - self.interval
+        self.virtuals = []
+
+    @property
+    def key(self):
+        return (self.refresh_rate, self.audio_clocked)
+
+
+class FrameScheduler:
+    """
+    Drives the render tick of every active virtual from a single thread.
+
+    Virtuals are grouped by the rate they render at. Each group keeps its
+    own deadline and the loop always services the group whose deadline is
+    earliest, calling `render_tick` on each of its virtuals in turn. A pass
+    that finishes after the group's next deadline is counted as an overrun
+    and the group is re-synced to the current time instead of trying to
+    catch up with a burst of frames.
+
+    With audio clocked rendering enabled, virtuals running an audio
+    reactive effect are grouped apart and ticked right after each audio
+    analysis hop instead of on the timer, at most at their render rate.
+    Should the audio stall, those groups fall back to the timer.
+
+    Virtuals whose frames nobody consumes skip their ticks until a consumer
+    appears, see `Virtual.has_consumer`.
+    """
+
+    def __init__(self, mls):
+        self._mls = mls
+        self._condition = threading.Condition()
+        self._groups = {}
+        self._virtual_groups = {}
+        self._ticking = None
+        self._thread = None
+        self._running = False
+        self._ticks = 0
+        self._overruns = 0
+        self._audio_hops = 0
+        self._last_tick_ms = 0.0
+        self._max_tick_ms = 0.0
+        AudioInputSource.add_hop_listener(self.audio_hop)
+
+    def register(self, virtual):
+        """Add a virtual to the tick loop, starting the loop if needed"""
+        with self._condition:
+            self._remove(virtual)
+            key = (virtual.render_rate, virtual.audio_clocked)
+            group = self._groups.get(key)
+            if group is None:
+                group = _RateGroup(
+                    virtual.render_rate,
+                    timeit.default_timer(),
+                    virtual.audio_clocked,
+                )
+                self._groups[key] = group
+            group.virtuals.append(virtual)
+            self._virtual_groups[virtual.id] = group
+            if not self._running:
+                self._start()
+            self._condition.notify_all()
+
+    def unregister(self, virtual):
+        """
+        Remove a virtual from the tick loop. Blocks until any tick in flight
+        for this virtual has finished, unless called from the scheduler
+        thread itself.
+        """
+        with self._condition:
+            self._remove(virtual)
+            if threading.current_thread() is self._thread:
+                return
+            while self._ticking is virtual:
+                self._condition.wait()
+
+    def reschedule(self, virtual):
+        """Move a registered virtual to the group matching its render rate"""
+        with self._condition:
+            group = self._virtual_groups.get(virtual.id)
+            if group is None or group.key == (
+                virtual.render_rate,
+                virtual.audio_clocked,
+            ):
+                return
+        self.register(virtual)
+
+    def audio_hop(self):
+        """
+        Called after every audio analysis hop. Brings the deadline of audio
+        clocked groups forward so they render the new audio data.
+        """
+        with self._condition:
+            self._audio_hops += 1
+            now = timeit.default_timer()
+            notify = False
+            for group in self._groups.values():
+                if group.audio_clocked:
+                    group.hop_pending = True
+                    group.deadline = max(
+                        now,
+                        group.last_start + group.interval * AUDIO_HOP_RATE_CAP,
+                    )
+                    notify = True
+            if notify:
+                self._condition.notify_all()
+
+    def stop(self):
+        AudioInputSource.remove_hop_listener(self.audio_hop)
+        with self._condition:
+            self._running = False
+            self._groups.clear()
+            self._virtual_groups.clear()
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._thread = None
+
+    def stats(self):
+        """Returns tick statistics of the scheduler loop"""
+        with self._condition:
+            return {
+                "running": self._running,
+                "virtuals": len(self._virtual_groups),
+                "suspended": sum(
+                    virtual.suspended
+                    for group in self._groups.values()
+                    for virtual in group.virtuals
+                ),
+                "groups": {
+                    group.refresh_rate: len(group.virtuals)
+                    for group in self._groups.values()
+                    if not group.audio_clocked
+                },
+                "audio_clocked_groups": {
+                    group.refresh_rate: len(group.virtuals)
+                    for group in self._groups.values()
+                    if group.audio_clocked
+                },
+                "audio_hops": self._audio_hops,
+                "ticks": self._ticks,
+                "overruns": self._overruns,
+                "last_tick_ms": round(self._last_tick_ms, 3),
+                "max_tick_ms": round(self._max_tick_ms, 3),
+            }
+
+    def _remove(self, virtual):
+        group = self._virtual_groups.pop(virtual.id, None)
+        if group is None:
+            return
+        if virtual in group.virtuals:
+            group.virtuals.remove(virtual)
+        if not group.virtuals:
+            self._groups.pop(group.key, None)
+
+    def _start(self):
+        self._running = True
+        self._thread = threading.Thread(
+            name="FrameScheduler", target=self._run, daemon=True
+        )
+        self._thread.start()
+
+    def _next_group(self):
+        """Waits for the earliest group deadline. Caller holds the lock."""
+        while self._running:
+            if not self._groups:
+                self._condition.wait()
+                continue
+            group = min(self._groups.values(), key=lambda g: g.deadline)
+            delay = group.deadline - timeit.default_timer()
+            if delay <= 0:
+                return group
+            # registrations and audio hops wake us early, so re-evaluate
+            # after every wait
+            self._condition.wait(delay)
+        return None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                group = self._next_group()
+                if group is None:
+                    return
+                virtuals = tuple(group.virtuals)
+                hop = group.hop_pending
+                group.hop_pending = False
+
+            start_time = timeit.default_timer()
+            for virtual in virtuals:
+                with self._condition:
+                    # skip virtuals unregistered since the pass started
+                    if self._virtual_groups.get(virtual.id) is not group:
+                        continue
+                    self._ticking = virtual
+                try:
+                    virtual.render_tick()
+                except Exception:
+                    _LOGGER.exception(
+                        f"Virtual {virtual.id}: Error during render tick"
+                    )
+                finally:
+                    with self._condition:
+                        self._ticking = None
+                        self._condition.notify_all()
+            end_time = timeit.default_timer()
+
+            with self._condition:
+                self._record_tick(group, start_time, end_time, hop)
+
+    def _record_tick(self, group, start_time, end_time, hop):
+        tick_ms = (end_time - start_time) * 1000
+        self._ticks += 1
+        self._last_tick_ms = tick_ms
+        self._max_tick_ms = max(self._max_tick_ms, tick_ms)
+
+        if group.audio_clocked:
+            group.last_start = start_time
+            if group.hop_pending:
+                # a hop arrived while this pass was rendering
+                group.deadline = max(
+                    end_time,
+                    start_time + group.interval * AUDIO_HOP_RATE_CAP,
+                )
+            else:
+                # wait for the next hop, ticking on the timer while the
+                # audio is stalled
+                frames = AUDIO_STALL_FRAMES if hop else 1
+                group.deadline = start_time + group.interval * frames
+            overrun = end_time - (start_time + group.interval)
+        else:
+            group.deadline += group.interval
+            overrun = end_time - group.deadline
+
+        if overrun > 0:
+            self._overruns += 1
+            _LOGGER.debug(
+                f"FrameScheduler: {group.refresh_rate} FPS group overran by {overrun * 1000:.2f} ms ({len(group.virtuals)} virtuals, tick {tick_ms:.2f} ms)"
+            )
+            group.deadline = max(group.deadline, end_time)
@@ -6,6 +6,7 @@ import importlib
 import inspect
 import ipaddress
 import logging
+import logging.handlers
 import os
 import pkgutil
 import re
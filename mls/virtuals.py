@@ -1,16 +1,24 @@
 import itertools
 import logging
-import sys
 import threading
-import time
 import timeit
-from functools import cached_property
+from functools import cached_property, lru_cache
 
 import numpy as np
 import voluptuous as vol
 
+from mls.buffers import (
+    FRAME_BUFFER_DEPTH,
+    DelayLine,
+    FrameBufferPool,
+    output_dtype,
+    pixel_dtype,
+    roll_into,
+)
 from mls.color import parse_color
+from mls.effect_sharing import EffectSharing
 from mls.effects import DummyEffect
+from mls.effects.audio import SILENCE_IDLE_FPS, AudioReactiveEffect
 from mls.effects.math import interpolate_pixels, make_pattern
 from mls.effects.melbank import (
     MAX_FREQ,
@@ -29,14 +37,28 @@ from mls.events import (
 )
 
 # from mls.config import save_config
+from mls.governor import FrameGovernor
+from mls.render_pool import RenderPool
+from mls.scheduler import FrameScheduler
 from mls.transitions import Transitions
-from mls.utils import fps_to_sleep_interval
 
 _LOGGER = logging.getLogger(__name__)
 
+# seconds between resends of an unchanged static frame, which keeps devices
+# in realtime mode well within their timeout of at least a second
+STATIC_KEEPALIVE_INTERVAL = 0.5
+# longest output latency a virtual can be compensated for
+MAX_OUTPUT_LATENCY_MS = 2000
+
 color_list = ["red", "green", "blue", "cyan", "magenta", "#ffff00"]
 
 
+@lru_cache(maxsize=32)
+def _group_index(pixel_count, group_size):
+    """Index of the effective pixel shown by each physical pixel"""
+    return np.arange(pixel_count) // group_size
+
+
 class Virtual:
     CONFIG_SCHEMA = vol.Schema(
         {
@@ -113,6 +135,18 @@ class Virtual:
                 description="Amount of rows. > 1 if this virtual is a matrix",
                 default=1,
             ): int,
+            vol.Optional(
+                "output_latency_ms",
+                description="Latency of this virtual's devices from sending a frame to showing it. Faster outputs are delayed to line up with the slowest, or with the core output_latency_target_ms",
+                default=0,
+            ): vol.All(
+                vol.Coerce(int), vol.Range(min=0, max=MAX_OUTPUT_LATENCY_MS)
+            ),
+            vol.Optional(
+                "adaptive_quality",
+                description="Lower frame rate and effect quality while rendering can't keep up",
+                default=True,
+            ): bool,
         }
     )
 
@@ -132,17 +166,9 @@ class Virtual:
 
     _paused = False
     _active = False
-    _output_thread = None
     _active_effect = None
     _transition_effect = None
 
-    if (
-        sys.version_info[0] == 3 and sys.version_info[1] >= 11
-    ) or sys.version_info[0] >= 4:
-        _min_time = time.get_clock_info("perf_counter").resolution
-    else:
-        _min_time = time.get_clock_info("monotonic").resolution
-
     def __init__(self, mls, config):
         self._mls = mls
         self._config = config
@@ -159,10 +185,19 @@ class Virtual:
         self._os_active = False
         self.lock = threading.Lock()
         self.clear_handle = None
+        self._buffers = FrameBufferPool(FRAME_BUFFER_DEPTH)
+        # bumped whenever the output of a static frame may have changed
+        self._output_version = 0
+        self._static_key = None
+        self._static_sent_at = 0.0
+        self.suspended = False
+        # holds frames back from devices faster than the other outputs
+        self._output_delay_line = None
 
         self.frequency_range = FrequencyRange(
             self._config["frequency_min"], self._config["frequency_max"]
         )
+        self.governor = FrameGovernor(self._config["adaptive_quality"])
 
         # list of devices in order of their mapping on the virtual
         # [[id, start, end, invert]...]
@@ -251,6 +286,9 @@ class Virtual:
         ]:
             if hasattr(self, prop):
                 delattr(self, prop)
+        self._output_version += 1
+        if self._active and self._devices:
+            self._mls.virtuals.scheduler.reschedule(self)
 
     def _reactivate_effect(self):
         self.clear_transition_effect()
@@ -362,7 +400,7 @@ class Virtual:
                 and self._config["transition_time"] > 0
             ):
                 self.transition_frame_total = (
-                    self.refresh_rate * self._config["transition_time"]
+                    self.render_rate * self._config["transition_time"]
                 )
                 self.transition_frame_counter = 0
                 self.clear_transition_effect()
@@ -395,6 +433,8 @@ class Virtual:
         except RuntimeError:
             self.active = False
             raise
+        # audio clocking and the idle rate follow the type of the effect
+        self._mls.virtuals.scheduler.reschedule(self)
 
     def transition_to_active(self):
         self._active_effect = self._transition_effect
@@ -417,7 +457,7 @@ class Virtual:
                 self._active_effect = DummyEffect(self.effective_pixel_count)
 
                 self.transition_frame_total = (
-                    self.refresh_rate * self._config["transition_time"]
+                    self.render_rate * self._config["transition_time"]
                 )
                 self.transition_frame_counter = 0
             else:
@@ -429,6 +469,7 @@ class Virtual:
             self.clear_handle = self._mls.loop.call_later(
                 self._config["transition_time"], self.clear_frame
             )
+        self._mls.virtuals.scheduler.reschedule(self)
 
     def flush_pending_clear_frame(self):
         if self.clear_handle is not None:
@@ -495,7 +536,7 @@ class Virtual:
 
         self._mls.events.fire_event(
             VirtualUpdateEvent(
-                self.id, self._effective_to_physical_pixels(frame)
+                self.id, self._effective_to_physical_pixels(frame, key="event")
             )
         )
 
@@ -541,8 +582,9 @@ class Virtual:
 
     def oneshot_apply(self, seg):
         blend = np.multiply(self._os_color, self._os_weight)
-        np.multiply(seg, 1 - self._os_weight, seg)
-        np.add(seg, blend, seg)
+        # segments are uint8 when virtuals output ready to send frames
+        np.multiply(seg, 1 - self._os_weight, seg, casting="unsafe")
+        np.add(seg, blend, seg, casting="unsafe")
 
     def set_calibration(self, calibration):
         self._calibration = calibration
@@ -576,47 +618,194 @@ class Virtual:
     def active_effect(self):
         return self._active_effect
 
-    def thread_function(self):
-        while True:
+    def render_delegate(self, effect):
+        """
+        Returns the delegate rendering the effect elsewhere, either shared
+        with identical effects on other virtuals or in a worker process, or
+        None if it should render in place
+        """
+        virtuals = self._mls.virtuals
+        if virtuals.effect_sharing is not None:
+            delegate = virtuals.effect_sharing.attach(effect, self)
+            if delegate is not None:
+                return delegate
+        if virtuals.render_pool is None:
+            return None
+        return virtuals.render_pool.attach(effect, self)
+
+    def render_tick(self):
+        """
+        Renders and outputs a single frame. Called by the frame scheduler
+        once per refresh interval while the virtual is active.
+        """
+        # we need to lock before we test, or we could deactivate
+        # between test and execution
+        with self.lock:
             if not self._active:
-                break
-            start_time = timeit.default_timer()
-            # we need to lock before we test, or we could deactivate
-            # between test and execution
-            with self.lock:
-                if (
-                    self._active_effect
-                    and self._active_effect.is_active
-                    and hasattr(self._active_effect, "pixels")
-                ):
-                    # self.assembled_frame = await self._mls.loop.run_in_executor(
-                    #     self._mls.thread_executor, self.assemble_frame
-                    # )
+                return
+            if not self.has_consumer():
+                if not self.suspended:
+                    _LOGGER.debug(
+                        f"Virtual {self.id}: No consumers, suspending rendering"
+                    )
+                    self.suspended = True
+                return
+            if self.suspended:
+                _LOGGER.debug(f"Virtual {self.id}: Resuming rendering")
+                self.suspended = False
+                # new consumers need the current frame right away
+                self._static_key = None
+            if (
+                self._active_effect
+                and self._active_effect.is_active
+                and hasattr(self._active_effect, "pixels")
+            ):
+                start_time = timeit.default_timer()
+                static_key = self._static_frame_key()
+                if static_key is not None and static_key == self._static_key:
+                    if self._output_delay_pending():
+                        # the frame is held back from the devices, flush it
+                        # once due without pushing it again
+                        self._flush_delayed(start_time, push=False)
+                        return
+                    # the devices already show this frame, only resend it
+                    # every so often to keep them in realtime mode
+                    if (
+                        start_time - self._static_sent_at
+                        < STATIC_KEEPALIVE_INTERVAL
+                    ):
+                        return
+                    assembled = False
+                else:
                     self.assembled_frame = self.assemble_frame()
-                    if self.assembled_frame is not None and not self._paused:
-                        if not self._config["preview_only"]:
-                            # self._mls.thread_executor.submit(self.flush)
-                            # await self._mls.loop.run_in_executor(
-                            #     self._mls.thread_executor, self.flush
-                            # )
+                    assembled = True
+                self._static_key = static_key
+
+                if self.assembled_frame is not None and not self._paused:
+                    if not self._config["preview_only"]:
+                        if assembled:
+                            self._flush_delayed(start_time)
+                        else:
+                            # the devices show this frame already
                             self.flush()
 
-                        self._fire_update_event()
+                    self._fire_update_event()
+                    self._static_sent_at = start_time
 
-            # adjust for the frame assemble time, min allowed sleep 1 ms
-            # this will be more frame accurate on high res sleep systems
-            run_time = timeit.default_timer() - start_time
-            sleep_time = max(
-                0.001, fps_to_sleep_interval(self.refresh_rate) - run_time
-            )
-            time.sleep(sleep_time)
+                if not assembled:
+                    return
+                resolution_divisor = self.governor.resolution_divisor
+                if self.governor.record(
+                    timeit.default_timer() - start_time, self.refresh_rate
+                ):
+                    _LOGGER.info(
+                        f"Virtual {self.id}: Render time {self.governor.render_time * 1000:.2f} ms, switching to {self.governor.level_name} quality"
+                    )
+                    self._apply_quality_level(resolution_divisor)
+
+    def output_delay(self):
+        """
+        Seconds frames are held back from the devices of this virtual, so
+        its output lines up with the output latency target, or the latency
+        of the slowest active virtual without a target
+        """
+        target = (
+            self._mls.config.get("output_latency_target_ms", 0)
+            or self._mls.virtuals.max_output_latency_ms()
+        )
+        return max(0, target - self._config["output_latency_ms"]) / 1000
+
+    def _output_delay_pending(self):
+        """True until the newest frame pushed to the delay line is flushed"""
+        line = self._output_delay_line
+        return line is not None and line.pushed_stamp != line.read_stamp
+
+    def _flush_delayed(self, now, push=True):
+        """
+        Flushes the assembled frame once its output delay has passed, or
+        only the frames already held back without push
+        """
+        delay = self.output_delay()
+        if not delay:
+            self._output_delay_line = None
+            self.flush()
+            return
+        refresh_rate = self.refresh_rate or 60
+        capacity = int(delay * refresh_rate) + 2
+        line = self._output_delay_line
+        if push:
+            if line is None or line.capacity < capacity:
+                line = self._output_delay_line = DelayLine(capacity)
+            line.push(self.assembled_frame, now)
+        # frames are due to the nearest tick, so jitter in the tick times
+        # doesn't skip or repeat frames
+        frame = line.pop(now - delay + 0.5 / refresh_rate)
+        if frame is not None:
+            self.flush(frame)
 
-            # use an aggressive check for did we sleep against expected min clk
-            # for all high res scenarios this will be passive
-            # for unexpected high res sleep on windows scenarios it will adapt
-            pass_time = timeit.default_timer() - start_time
-            if pass_time < (self._min_time / 2):
-                time.sleep(max(0.001, self._min_time - pass_time))
+    def has_consumer(self):
+        """
+        Returns True if anything receives the frames of this virtual: an
+        active device, a visualisation subscriber or a sink listening to the
+        updates of this virtual in particular
+        """
+        if not self._config["preview_only"] and any(
+            device.is_active() for device in self._devices
+        ):
+            return True
+        events = self._mls.events
+        return events.has_listener(
+            Event.VISUALISATION_UPDATE,
+            {"is_device": False, "vis_id": self.id},
+        ) or events.has_listener(
+            Event.VIRTUAL_UPDATE,
+            {"virtual_id": self.id},
+            include_unfiltered=False,
+        )
+
+    def _static_frame_key(self):
+        """
+        Identifies the frame while the active effect is static, or returns
+        None while the frame may change from one tick to the next
+        """
+        if (
+            self._transition_effect is not None
+            or self._os_active
+            or self._calibration
+        ):
+            return None
+        effect = self._active_effect
+        if self.silenced and self._silence_mode() == "freeze":
+            # frozen on the last frame until the audio comes back
+            version = "silent"
+        else:
+            version = effect.static_frame_version()
+        if version is None:
+            return None
+        return (
+            effect,
+            effect._config_version,
+            version,
+            self._output_version,
+            self._mls.config["global_brightness"],
+        )
+
+    def _apply_quality_level(self, resolution_divisor):
+        """
+        Applies a change of the governor's degradation level, given the
+        resolution divisor that was in effect before the change
+        """
+        if self.governor.resolution_divisor != resolution_divisor:
+            # effects need to be set up again for the new pixel count
+            self.invalidate_cached_props()
+            self._reactivate_effect()
+        else:
+            effect = self._active_effect
+            if effect is not None and effect._delegate is not None:
+                # effects rendered elsewhere follow the policies of the level
+                effect._delegate.update_virtual(self)
+            if self._active and self._devices:
+                self._mls.virtuals.scheduler.reschedule(self)
 
     def assemble_frame(self):
         """
@@ -624,14 +813,25 @@ class Virtual:
         """
         # Get and process active effect frame
         self._active_effect._render()
-        frame = self._active_effect.get_pixels()
-        if frame is not None:
-            frame[frame > 255] = 255
-            frame[frame < 0] = 0
-            # np.clip(frame, 0, 255, frame)
-
+        pixels = self._active_effect.get_pixels()
+        frame = None
+        if pixels is not None:
+            # the effect reuses its pixel buffer, so the frame is assembled
+            # in a buffer owned by the virtual
+            frame = self._buffers.get(
+                "frame", pixels.shape, pixel_dtype(self._mls.config)
+            )
             if self._config["center_offset"]:
-                frame = np.roll(frame, self._config["center_offset"], axis=0)
+                roll_into(pixels, self._config["center_offset"], frame)
+                np.clip(frame, 0, 255, out=frame)
+            else:
+                np.clip(pixels, 0, 255, out=frame)
+
+            if (
+                self._transition_effect is not None
+                and not self.governor.transitions_enabled
+            ):
+                self.clear_transition_effect()
 
             # This part handles blending two effects together
             if (
@@ -642,14 +842,15 @@ class Virtual:
                 # Get and process transition effect frame
                 self._transition_effect._render()
                 transition_frame = self._transition_effect.get_pixels()
-                transition_frame[transition_frame > 255] = 255
-                transition_frame[transition_frame < 0] = 0
+                np.clip(transition_frame, 0, 255, out=transition_frame)
 
                 if self._config["center_offset"]:
-                    transition_frame = np.roll(
+                    transition_frame = roll_into(
                         transition_frame,
                         self._config["center_offset"],
-                        axis=0,
+                        self._buffers.get(
+                            "transition_frame", transition_frame.shape
+                        ),
                     )
 
                 # Blend both frames together
@@ -679,6 +880,18 @@ class Virtual:
                 ):
                     self.clear_transition_effect()
 
+            if output_dtype(self._mls.config) is np.uint8:
+                # the frame is already clipped, so scaling by both
+                # brightnesses and casting for the devices is a single pass
+                output = self._buffers.get("output", frame.shape, np.uint8)
+                np.multiply(
+                    frame,
+                    self._config["max_brightness"]
+                    * self._mls.config["global_brightness"],
+                    out=output,
+                    casting="unsafe",
+                )
+                return output
             np.multiply(frame, self._config["max_brightness"], frame)
             np.multiply(frame, self._mls.config["global_brightness"], frame)
         return frame
@@ -693,9 +906,6 @@ class Virtual:
             _LOGGER.warning(error)
             raise RuntimeError(error)
 
-        if hasattr(self, "_thread"):
-            self._thread.join()
-
         _LOGGER.debug(
             f"Virtual {self.id}: Activating with segments {self._segments}"
         )
@@ -707,21 +917,16 @@ class Virtual:
             self._active = True
             self._os_active = False
 
-        # self.thread_function()
-
-        self._thread = threading.Thread(
-            name=f"Virtual: {self.id}", target=self.thread_function
-        )
-        self._thread.start()
+        self._mls.virtuals.scheduler.register(self)
+        self._mls.virtuals.invalidate_output_latency()
         self._mls.events.fire_event(VirtualPauseEvent(self.id))
-        # self._task = self._mls.loop.create_task(self.thread_function())
-        # self._task.add_done_callback(lambda task: task.result())
 
     def deactivate(self):
         self._active = False
         self._os_active = False
-        if hasattr(self, "_thread"):
-            self._thread.join()
+        self._output_delay_line = None
+        self._mls.virtuals.scheduler.unregister(self)
+        self._mls.virtuals.invalidate_output_latency()
         self.deactivate_segments()
         self._mls.events.fire_event(VirtualPauseEvent(self.id))
 
@@ -785,13 +990,13 @@ class Virtual:
                                 self.oneshot_apply(seg)
                             data.append((seg, device_start, device_end))
                     elif self._config["mapping"] == "copy":
-                        for (
+                        for index, (
                             start,
                             stop,
                             step,
                             device_start,
                             device_end,
-                        ) in segments:
+                        ) in enumerate(segments):
                             target_physical_len = device_end - device_start + 1
                             target_effect_len = (
                                 self._get_effective_pixel_count(
@@ -805,7 +1010,9 @@ class Virtual:
                                 pixels, target_effect_len
                             )[::step]
                             seg = self._effective_to_physical_pixels(
-                                seg, target_physical_len
+                                seg,
+                                target_physical_len,
+                                key=("segment", device_id, index),
                             )
                             if self._os_active:
                                 self.oneshot_apply(seg)
@@ -920,6 +1127,34 @@ class Virtual:
             return False
         return min(device.max_refresh_rate for device in self._devices)
 
+    @property
+    def audio_clocked(self):
+        """Whether frames are rendered on audio hops rather than a timer"""
+        return self._mls.config.get(
+            "audio_clocked_rendering", False
+        ) and isinstance(self._active_effect, AudioReactiveEffect)
+
+    @property
+    def render_rate(self):
+        """
+        The rate frames are rendered at, lowered by the frame governor and
+        while idling through silence
+        """
+        rate = self.governor.render_rate(self.refresh_rate)
+        if rate and self.silenced and self._silence_mode() == "idle":
+            return min(rate, SILENCE_IDLE_FPS)
+        return rate
+
+    @property
+    def silenced(self):
+        """Whether the audio reactive effect is paused by the silence gate"""
+        return self._mls.virtuals.audio_silent and isinstance(
+            self._active_effect, AudioReactiveEffect
+        )
+
+    def _silence_mode(self):
+        return self._mls.config.get("audio", {}).get("silence_mode", "freeze")
+
     @cached_property
     def pixel_count(self):
         if self._config["mapping"] == "span":
@@ -1032,6 +1267,14 @@ class Virtual:
                         self.invalidate_cached_props()
 
         setattr(self, "_config", _config)
+        self._mls.virtuals.invalidate_output_latency()
+        self._output_version += 1
+
+        self.governor.enabled = _config["adaptive_quality"]
+        if not self.governor.enabled:
+            resolution_divisor = self.governor.resolution_divisor
+            if self.governor.reset():
+                self._apply_quality_level(resolution_divisor)
 
         self.frequency_range = FrequencyRange(
             self._config["frequency_min"], self._config["frequency_max"]
@@ -1059,29 +1302,42 @@ class Virtual:
         grouping = self._config["grouping"]
 
         if grouping is None or grouping < 1:
-            return 1
+            grouping = 1
 
-        return grouping
+        return grouping * self.governor.resolution_divisor
 
     def _get_effective_pixel_count(self, physical_pixel_count):
         """Calculates the number of effective pixels for a given number of physical pixels, considering pixel grouping."""
         return int(np.ceil(physical_pixel_count / self.group_size))
 
     def _effective_to_physical_pixels(
-        self, effective_pixels, pixel_count=None
+        self, effective_pixels, pixel_count=None, key="flush"
     ):
-        """Projects an array of effective pixels into an array of pixels for physical rendering, considering pixel grouping."""
+        """
+        Projects an array of effective pixels into an array of pixels for physical rendering, considering pixel grouping.
+
+        Each consumer of a frame passes its own key, so a buffer still held
+        by an update event or by another segment isn't written over.
+        """
         if self.group_size <= 1:
             return effective_pixels
 
         if not pixel_count:
             pixel_count = self.pixel_count
 
-        effective_pixels = np.repeat(
-            effective_pixels, self.group_size, axis=0
-        )[:pixel_count, :]
-
-        return effective_pixels
+        physical_pixels = self._buffers.get(
+            ("physical", key, pixel_count),
+            (pixel_count, 3),
+            effective_pixels.dtype,
+        )
+        np.take(
+            effective_pixels,
+            _group_index(pixel_count, self.group_size),
+            axis=0,
+            out=physical_pixels,
+            mode="clip",
+        )
+        return physical_pixels
 
 
 class Virtuals:
@@ -1095,10 +1351,31 @@ class Virtuals:
 
         def cleanup_effects(e):
             self.clear_all_effects()
+            self.scheduler.stop()
+            if self.effect_sharing is not None:
+                self.effect_sharing.stop()
+            if self.render_pool is not None:
+                self.render_pool.stop()
 
         self._mls = mls
+        self.scheduler = FrameScheduler(mls)
+        self.render_pool = None
+        if self._mls.config.get("render_workers", 0) > 0:
+            self.render_pool = RenderPool(
+                mls, self._mls.config["render_workers"]
+            )
+            self.render_pool.start()
+        self.effect_sharing = None
+        if self._mls.config.get("deduplicate_effects", True):
+            self.effect_sharing = EffectSharing(mls, self.render_pool)
         self._mls.events.add_listener(cleanup_effects, Event.LEDFX_SHUTDOWN)
+        # set while the audio silence gate is closed
+        self.audio_silent = False
+        self._mls.events.add_listener(
+            self._audio_silence_changed, Event.AUDIO_SILENCE
+        )
         self._virtuals = {}
+        self._max_output_latency = None
 
     def create_from_config(self, config):
         for virtual in config:
@@ -1179,6 +1456,31 @@ class Virtuals:
                 ("Object with id '{}' does not exist.").format(id)
             )
         del self._virtuals[id]
+        self.invalidate_output_latency()
+
+    def _audio_silence_changed(self, event):
+        """Moves the virtuals idling through silence to their new rate"""
+        self.audio_silent = event.silent
+        for virtual in self._virtuals.values():
+            if virtual.active:
+                self.scheduler.reschedule(virtual)
+
+    def max_output_latency_ms(self):
+        """The output latency of the slowest active virtual"""
+        if self._max_output_latency is None:
+            self._max_output_latency = max(
+                (
+                    virtual._config["output_latency_ms"]
+                    for virtual in self._virtuals.values()
+                    if virtual.active
+                ),
+                default=0,
+            )
+        return self._max_output_latency
+
+    def invalidate_output_latency(self):
+        """Recomputes the slowest output latency when next needed"""
+        self._max_output_latency = None
 
     def __iter__(self):
         return iter(self._virtuals)
@@ -8,6 +8,8 @@ from test_utilities.test_utils import EnvironmentCleanup
 from tests.test_definitions.audio_configs import get_mls_audio_configs
 from tests.test_utilities.consts import BASE_PORT
 
+pytest_plugins = ["tests.test_utilities.fixtures"]
+
 
 def pytest_sessionstart(session):
     """
@@ -0,0 +1,103 @@
+import threading
+from collections import Counter
+
+import numpy as np
+
+from mls.effects.audio import (
+    ANALYSIS_FEATURES,
+    AudioAnalysisSource,
+    _hop_cache_slots,
+)
+
+
+def make_source():
+    source = object.__new__(AudioAnalysisSource)
+    source._feature_users = Counter()
+    source._feature_lock = threading.Lock()
+    source._analyzers = ()
+    source._warmup = set()
+    source._sample_history = None
+    source._history_hops = 0
+    source.calls = Counter()
+    source.warmed_up = Counter()
+
+    def analyzer(method):
+        return lambda: source.calls.update([method])
+
+    def warm_up(feature):
+        return lambda sample: source.warmed_up.update([feature])
+
+    for feature, method in ANALYSIS_FEATURES.items():
+        setattr(source, method, analyzer(method))
+    for feature in ("pitch", "onset", "tempo"):
+        setattr(source, f"_{feature}", warm_up(feature))
+    return source
+
+
+def hop(source, hops=1):
+    for _ in range(hops):
+        source._raw_audio_sample = np.zeros(8, dtype=np.float32)
+        source._run_analyzers()
+
+
+def test_only_features_in_use_are_analysed():
+    source = make_source()
+    hop(source, 5)
+    assert not source.calls
+
+    # two effects reading the tempo, one the onsets
+    source.acquire_features(("tempo",))
+    source.acquire_features(("tempo", "onset"))
+    hop(source, 3)
+    assert source.calls == {"bar_oscillator": 3, "onset": 3}
+    assert source.feature_active("tempo")
+    assert not source.feature_active("pitch")
+
+    source.release_features(("tempo", "onset"))
+    hop(source)
+    assert source.calls == {"bar_oscillator": 4, "onset": 3}
+    source.release_features(("tempo",))
+    hop(source)
+    assert source.calls == {"bar_oscillator": 4, "onset": 3}
+    assert not source.feature_active("tempo")
+
+
+def test_starting_analyzers_replay_the_recent_hops():
+    source = make_source()
+    hop(source, 10)
+    source.acquire_features(("pitch",))
+    hop(source)
+    # every hop before the current one, which is analysed as usual
+    assert source.warmed_up == {"pitch": 10}
+    assert source.calls == {"pitch": 1}
+    hop(source)
+    assert source.warmed_up == {"pitch": 10}
+
+
+def test_hop_cached_features_are_computed_once_per_hop():
+    source = object.__new__(AudioAnalysisSource)
+    source._hop_id = 0
+    source._feature_cache = [(-1, default) for default in _hop_cache_slots]
+    source.audio_sample = lambda raw=False: np.zeros(8, dtype=np.float32)
+    pitches = []
+
+    def detect_pitch(sample):
+        pitches.append(len(pitches) + 1)
+        return [pitches[-1]]
+
+    source._pitch = detect_pitch
+    # other threads read the last computed value, the default before any
+    source._analysis_ident = threading.get_ident() + 1
+    assert source.pitch() == 0
+    assert not pitches
+
+    source._analysis_ident = None
+    assert source.pitch() == source.pitch() == 1
+    source._invalidate_caches()
+    assert source.pitch() == source.pitch() == 2
+    assert pitches == [1, 2]
+
+    source._analysis_ident = threading.get_ident() + 1
+    source._invalidate_caches()
+    assert source.pitch() == 2
+    assert pitches == [1, 2]
@@ -0,0 +1,60 @@
+import wave
+
+import numpy as np
+
+from mls.effects.audio_file import (
+    AUDIO_FILE_INPUT,
+    FileAudioStream,
+    generate_test_signal,
+)
+
+RATE = 44100
+HOP_RATE = 60
+
+
+def replay(name, **config):
+    """Replays an input at fast speed, returning the blocks it fed"""
+    blocks = []
+    stream = FileAudioStream(
+        name,
+        {
+            "replay_speed": "fast",
+            "replay_loop": False,
+            "sample_rate": HOP_RATE,
+            **config,
+        },
+        lambda block, frames, time_info, status: blocks.append(block.copy()),
+    )
+    stream.start()
+    stream._thread.join(timeout=10)
+    stream.close()
+    return blocks
+
+
+def test_replays_wav_file_in_hops(tmp_path):
+    samples = (
+        np.sin(2 * np.pi * 440 * np.arange(RATE // 2) / RATE) * 16000
+    ).astype(np.int16)
+    path = tmp_path / "tone.wav"
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(samples.tobytes())
+
+    blocks = replay(AUDIO_FILE_INPUT, replay_file=str(path))
+    assert {len(block) for block in blocks[:-1]} == {RATE // HOP_RATE}
+    np.testing.assert_allclose(
+        np.concatenate(blocks), samples / 32768, atol=1e-4
+    )
+
+
+def test_test_signals_are_deterministic():
+    for kind in ("beat", "sweep", "noise"):
+        signal = generate_test_signal(kind, seconds=1)
+        assert signal.dtype == np.float32
+        assert len(signal) == RATE
+        assert np.abs(signal).max() <= 1.0
+        np.testing.assert_array_equal(
+            signal, generate_test_signal(kind, seconds=1)
+        )
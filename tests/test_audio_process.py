@@ -0,0 +1,48 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from mls.effects.audio import AudioInputSource
+from mls.effects.audio_process import AudioProcessSource
+
+TIMEOUT = 30
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_subscribers_are_called_once_the_process_has_published():
+    devices = AudioInputSource.input_devices()
+    device = next(
+        index
+        for index, name in devices.items()
+        if name.endswith("Test signal: beat")
+    )
+    mls = SimpleNamespace(
+        config={"melbanks": {}, "melbank_collection": []},
+        events=SimpleNamespace(
+            add_listener=lambda *args: lambda: None,
+            fire_event=lambda event: None,
+        ),
+    )
+    source = AudioProcessSource(mls, {"audio_device": device})
+    try:
+        # returns while the process is still importing the analysis
+        assert source.layout is None
+        hops = threading.Event()
+        source.subscribe(hops.set)
+        # the melbanks can be reconfigured before the layout arrives
+        source.melbanks.update_config({"samples": 24})
+
+        assert hops.wait(TIMEOUT)
+        assert source.layout is not None
+        assert source.melbanks.mel_len == 24
+        assert wait_for(lambda: source.volume(filtered=False) > 0)
+    finally:
+        source.stop()
@@ -0,0 +1,158 @@
+import itertools
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+from mls.effect_sharing import EffectSharing, SharedEffectDelegate
+from mls.governor import LEVEL_NO_BLUR, FrameGovernor
+
+PIXEL_COUNT = 8
+ids = itertools.count()
+
+
+class CountingEffect:
+    """Stand-in effect that counts the frames it renders in place"""
+
+    name = "Counting"
+    pixels = np.zeros((PIXEL_COUNT, 3))
+
+    def __init__(self, type, config):
+        self.type = type
+        self.config = config
+        self.id = f"counting-{next(ids)}"
+        self.renders = 0
+        self._active = False
+        self._virtual = None
+        self._delegate = None
+
+    def activate(self, virtual):
+        self._virtual = virtual
+        self._delegate = virtual.render_delegate(self)
+        self._active = True
+
+    def _deactivate(self):
+        self._active = False
+        if self._delegate is not None:
+            self._delegate.detach()
+            self._delegate = None
+
+    def _render(self):
+        if self._delegate is None:
+            self.renders += 1
+
+    def get_pixels(self):
+        if self._delegate is not None:
+            return self._delegate.read()
+        return np.full((PIXEL_COUNT, 3), self.renders)
+
+
+class SharingVirtual:
+    """Stand-in virtual whose effects go through the sharing"""
+
+    def __init__(self, sharing, id, refresh_rate=60):
+        self._sharing = sharing
+        self.id = id
+        self.lock = threading.Lock()
+        self.config = {"frequency_min": 20, "frequency_max": 15000, "rows": 1}
+        self.effective_pixel_count = PIXEL_COUNT
+        self.refresh_rate = refresh_rate
+        self.governor = FrameGovernor()
+        self.active_effect = None
+
+    def render_delegate(self, effect):
+        return self._sharing.attach(effect, self)
+
+    def set_effect(self, effect):
+        self.active_effect = effect
+        effect.activate(self)
+
+    def _reactivate_effect(self):
+        self.active_effect._deactivate()
+        self.active_effect.activate(self)
+
+
+class FakeLoop:
+    def __init__(self):
+        self.callbacks = []
+
+    def call_soon_threadsafe(self, callback, *args):
+        self.callbacks.append((callback, args))
+
+    def run(self):
+        while self.callbacks:
+            callback, args = self.callbacks.pop(0)
+            callback(*args)
+
+
+def make_sharing():
+    created = []
+
+    def create(mls, type, config):
+        effect = CountingEffect(type, config)
+        created.append(effect)
+        return effect
+
+    mls = SimpleNamespace(
+        effects=SimpleNamespace(create=create, destroy=lambda id: None),
+        events=SimpleNamespace(add_listener=lambda *args: lambda: None),
+        loop=FakeLoop(),
+    )
+    return EffectSharing(mls), created
+
+
+def run_effect(sharing, virtual_id, refresh_rate=60):
+    virtual = SharingVirtual(sharing, virtual_id, refresh_rate)
+    virtual.set_effect(CountingEffect("counting", {"speed": 1}))
+    sharing._mls.loop.run()
+    return virtual
+
+
+def is_shared(virtual):
+    return isinstance(virtual.active_effect._delegate, SharedEffectDelegate)
+
+
+def test_a_single_effect_renders_in_place():
+    sharing, created = make_sharing()
+    virtual = run_effect(sharing, "one")
+    assert not is_shared(virtual)
+    assert not created
+    assert sharing.stats() == {"effects": 0, "instances": 0}
+
+
+def test_identical_effects_share_one_instance():
+    sharing, created = make_sharing()
+    first = run_effect(sharing, "first", refresh_rate=30)
+    second = run_effect(sharing, "second", refresh_rate=60)
+    assert is_shared(first) and is_shared(second)
+    assert sharing.stats() == {"effects": 2, "instances": 1}
+    # the instance renders at the fastest rate of its members
+    (instance,) = created
+    assert instance._virtual.refresh_rate == 60
+
+    for virtual in (first, second):
+        virtual.active_effect._render()
+        frame = virtual.active_effect.get_pixels()
+    assert instance.renders == 1
+    assert (frame == 1).all()
+
+    # the member left alone goes back to rendering in place
+    second.active_effect._deactivate()
+    sharing._mls.loop.run()
+    assert not is_shared(first)
+    assert sharing.stats() == {"effects": 0, "instances": 0}
+
+
+def test_members_with_another_blur_policy_split_off():
+    sharing, created = make_sharing()
+    first = run_effect(sharing, "first")
+    second = run_effect(sharing, "second")
+    third = run_effect(sharing, "third")
+    assert sharing.stats() == {"effects": 3, "instances": 1}
+
+    third.governor.level = LEVEL_NO_BLUR
+    third.active_effect._delegate.update_virtual(third)
+    sharing._mls.loop.run()
+    assert is_shared(first) and is_shared(second)
+    assert not is_shared(third)
+    assert sharing.stats() == {"effects": 2, "instances": 1}
@@ -0,0 +1,33 @@
+from mls.effects.shared_audio import FeatureDecimator, SharedAudioProxy
+
+
+def make_source(hop_rate):
+    source = SharedAudioProxy()
+    source._config = {"sample_rate": hop_rate}
+    return source
+
+
+def test_rates_needing_every_hop_read_the_source():
+    source = make_source(60)
+    for rate in (60, 50, 120):
+        assert source.decimated(rate) is source
+    assert not source._decimators
+    assert not source._callbacks
+    source.release_decimated(source)
+    assert not source._decimators
+
+
+def test_lower_rates_share_one_decimator():
+    source = make_source(60)
+    decimator = source.decimated(30)
+    assert isinstance(decimator, FeatureDecimator)
+    assert decimator.window() == 2
+    assert source.decimated(30) is decimator
+    assert source._callbacks == [decimator]
+    assert source.decimator_diagnostics()[30]["users"] == 2
+
+    source.release_decimated(decimator)
+    assert source._callbacks == [decimator]
+    source.release_decimated(decimator)
+    assert not source._callbacks
+    assert not source._decimators
@@ -0,0 +1,123 @@
+import gc
+import os
+import timeit
+
+import numpy as np
+import pytest
+
+from mls.effects.audio import AudioReactiveEffect
+from mls.effects.math import ExpFilter, FilterBank
+
+HOPS = 200
+
+
+def reference_filter(values, alpha_decay, alpha_rise):
+    """The exponential smoothing ExpFilter implements, one value at a time"""
+    state = None
+    for value in values:
+        if state is None:
+            state = np.array(value, dtype=float)
+        else:
+            alpha = np.where(value > state, alpha_rise, alpha_decay)
+            state = alpha * value + (1.0 - alpha) * state
+        yield state
+
+
+@pytest.mark.parametrize("shape", [(), (4,), (3, 24)])
+def test_exp_filter_matches_reference(shape):
+    rng = np.random.default_rng(1)
+    values = rng.random((HOPS, *shape))
+    exp_filter = ExpFilter(alpha_decay=0.2, alpha_rise=0.9)
+    for value, expected in zip(
+        values, reference_filter(values, alpha_decay=0.2, alpha_rise=0.9)
+    ):
+        np.testing.assert_allclose(exp_filter.update(value), expected)
+    np.testing.assert_allclose(exp_filter.value, expected)
+
+
+def test_filter_bank_updates_filters_together():
+    rng = np.random.default_rng(2)
+    bank = FilterBank()
+    specs = [((), 0.1, 0.5), ((8,), 0.5, 0.99), ((2, 3), 0.3, 0.3)]
+    filters = [bank.add(decay, rise) for _, decay, rise in specs]
+    values = [rng.random((HOPS, *shape)) for shape, _, _ in specs]
+    expected = [
+        list(reference_filter(value, decay, rise))
+        for value, (_, decay, rise) in zip(values, specs)
+    ]
+    for hop in range(HOPS):
+        for exp_filter, value in zip(filters, values):
+            exp_filter.stage(value[hop])
+        bank.update()
+        for exp_filter, reference in zip(filters, expected):
+            np.testing.assert_allclose(exp_filter.value, reference[hop])
+
+    # removing a filter keeps the state of the others
+    bank.remove(filters[1])
+    np.testing.assert_allclose(filters[0].value, expected[0][-1])
+    np.testing.assert_allclose(filters[2].value, expected[2][-1])
+
+
+def test_exp_filter_restarts_on_new_shape():
+    exp_filter = ExpFilter(alpha_decay=0.5, alpha_rise=0.5)
+    exp_filter.update(np.ones(4))
+    np.testing.assert_allclose(exp_filter.update(np.zeros(6)), np.zeros(6))
+    exp_filter.value = None
+    assert exp_filter.value is None
+    assert exp_filter.update(2.0) == 2.0
+
+
+def test_bank_filters_hand_out_copies():
+    bank = FilterBank()
+    exp_filter = bank.add(0.5, 0.5)
+    value = exp_filter.update(np.ones(4))
+    value[:] = 5
+    np.testing.assert_allclose(exp_filter.value, np.ones(4))
+    updated = exp_filter.update(np.zeros(4))
+
+    # laying out the bank again for a new filter keeps the state
+    bank.add(0.5, 0.5, val=np.zeros(2))
+    np.testing.assert_allclose(updated, np.full(4, 0.5))
+    np.testing.assert_allclose(exp_filter.value, np.full(4, 0.5))
+
+
+def test_unreferenced_filters_leave_the_bank():
+    bank = FilterBank()
+    kept = bank.add(0.5, 0.5, val=1.0)
+    for _ in range(3):
+        bank.add(0.5, 0.5, val=np.zeros(8))
+    gc.collect()
+    assert len(bank) == 1
+    kept.stage(0.0)
+    bank.update()
+    assert kept.value == 0.5
+    bank.remove(kept)
+    assert len(bank) == 0
+
+
+def test_effect_filters_update_in_one_pass():
+    effect = object.__new__(AudioReactiveEffect)
+    effect._filter_bank = FilterBank()
+    peak = effect.create_filter(alpha_decay=0.5, alpha_rise=0.99)
+    trough = effect.create_filter(alpha_decay=0.5, alpha_rise=0.99)
+    for value in (1.0, 0.0):
+        peak.stage(value)
+        trough.stage(1 - value)
+        effect.update_filters()
+    assert peak.value == pytest.approx(0.5)
+    assert trough.value == pytest.approx(0.99)
+
+
+@pytest.mark.skipif(
+    not os.environ.get("MLS_BENCHMARK"),
+    reason="benchmarks only run with MLS_BENCHMARK set",
+)
+def test_filter_bank_cost_is_flat():
+    timings = {}
+    for count in (4, 64):
+        bank = FilterBank()
+        filters = [bank.add(0.1, 0.9) for _ in range(count)]
+        for exp_filter in filters:
+            exp_filter.stage(np.zeros(8))
+        timings[count] = min(timeit.repeat(bank.update, number=1000, repeat=5))
+    assert timings[64] < timings[4] * 4, timings
@@ -0,0 +1,59 @@
+import pytest
+
+from mls.governor import (
+    DEGRADATION_LEVELS,
+    MIN_SAMPLES,
+    RECOVERY_HOLD,
+    WINDOW_SIZE,
+    FrameGovernor,
+    reduced_refresh_rate,
+)
+
+FPS = 60
+SLOW = 0.05
+FAST = 0.001
+
+
+def record(governor, render_time, frames=MIN_SAMPLES):
+    """Records frames, returning the number of level changes"""
+    return sum(governor.record(render_time, FPS) for _ in range(frames))
+
+
+def test_overloaded_virtuals_step_down_one_level_at_a_time():
+    governor = FrameGovernor()
+    for level, name in enumerate(DEGRADATION_LEVELS[1:], start=1):
+        assert record(governor, SLOW) == 1
+        assert governor.level == level
+        assert governor.level_name == name
+
+    assert governor.render_rate(FPS) == reduced_refresh_rate(FPS) == 30
+    assert not governor.blur_enabled
+    assert not governor.transitions_enabled
+    assert governor.resolution_divisor == 2
+    # the cheapest level is as far as it goes
+    assert record(governor, SLOW) == 0
+
+
+def test_quality_recovers_after_the_hold_with_headroom():
+    governor = FrameGovernor()
+    record(governor, SLOW)
+    assert governor.level == 1
+    # fast frames don't restore quality before the hold has passed
+    assert record(governor, FAST, WINDOW_SIZE) == 0
+
+    governor = FrameGovernor()
+    record(governor, SLOW)
+    governor._changed_at -= RECOVERY_HOLD
+    # render times within budget but short of the headroom keep the level
+    assert record(governor, 0.8 / FPS * 0.75) == 0
+    assert record(governor, FAST, WINDOW_SIZE) == 1
+    assert governor.level == 0
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_reset_and_disabled_governors_render_at_full_quality(enabled):
+    governor = FrameGovernor(enabled)
+    record(governor, SLOW)
+    assert governor.level == (1 if enabled else 0)
+    assert governor.reset() == enabled
+    assert governor.level == 0
@@ -0,0 +1,112 @@
+import os
+import timeit
+from types import SimpleNamespace
+
+import aubio
+import numpy as np
+import pytest
+
+from mls.effects.math import interp_resize, interp_table
+from mls.effects.melbank import (
+    FFT_SIZE,
+    MELBANK_COEFFS_TYPES,
+    MIC_RATE,
+    Melbanks,
+)
+
+HOP = MIC_RATE // 60
+HOPS = 300
+
+
+class FrequencyDomainSource:
+    """Stand-in audio source feeding a test signal through a phase vocoder"""
+
+    def __init__(self, seed):
+        self._config = {
+            "min_volume": 0.0,
+            "fft_size": FFT_SIZE,
+            "analysis_rate": MIC_RATE,
+        }
+        self._pvoc = aubio.pvoc(FFT_SIZE, HOP)
+        self._rng = np.random.default_rng(seed)
+        self._time = np.arange(HOP) / MIC_RATE
+        self._hop = 0
+        self._frequency_domain = None
+
+    def volume(self, filtered=True):
+        return 1.0
+
+    def next_hop(self):
+        """Advances to a hop of tones with a pulsing bass and some noise"""
+        t = self._time + self._hop * HOP / MIC_RATE
+        self._hop += 1
+        sample = (
+            0.5 * (1 + np.sin(2 * np.pi * 2 * t)) * np.sin(2 * np.pi * 60 * t)
+            + 0.3 * np.sin(2 * np.pi * 440 * t)
+            + 0.2 * np.sin(2 * np.pi * 5000 * t)
+            + 0.1 * self._rng.standard_normal(HOP)
+        )
+        self._frequency_domain = self._pvoc(sample.astype(np.float32))
+
+
+def make_melbanks(audio, config):
+    mls = SimpleNamespace(config={}, dev_enabled=lambda: False)
+    return Melbanks(mls, audio, config)
+
+
+def run(engine, coeffs_type, hops):
+    audio = FrequencyDomainSource(seed=42)
+    melbanks = make_melbanks(
+        audio, {"engine": engine, "coeffs_type": coeffs_type}
+    )
+    assert (melbanks.matrix is not None) == (engine == "matrix")
+    history = []
+    for _ in range(hops):
+        audio.next_hop()
+        melbanks()
+        history.append(
+            (
+                np.array(melbanks.melbanks),
+                np.array(melbanks.melbanks_filtered),
+            )
+        )
+    return history
+
+
+@pytest.mark.parametrize("coeffs_type", MELBANK_COEFFS_TYPES)
+def test_matrix_engine_matches_aubio(coeffs_type):
+    reference = run("aubio", coeffs_type, HOPS)
+    result = run("matrix", coeffs_type, HOPS)
+    for (ref, ref_filtered), (out, out_filtered) in zip(reference, result):
+        np.testing.assert_allclose(out, ref, rtol=1e-4, atol=1e-5)
+        np.testing.assert_allclose(
+            out_filtered, ref_filtered, rtol=1e-4, atol=1e-5
+        )
+
+
+@pytest.mark.skipif(
+    not os.environ.get("MLS_BENCHMARK"),
+    reason="benchmarks only run with MLS_BENCHMARK set",
+)
+def test_matrix_engine_is_faster():
+    timings = {}
+    for engine in ("aubio", "matrix"):
+        audio = FrequencyDomainSource(seed=7)
+        audio.next_hop()
+        melbanks = make_melbanks(audio, {"engine": engine})
+        timings[engine] = min(timeit.repeat(melbanks, number=200, repeat=5))
+    assert timings["matrix"] * 2 < timings["aubio"], timings
+
+
+@pytest.mark.parametrize("start,stop", [(0, 1), (0, 2), (3, 27), (10, 72)])
+@pytest.mark.parametrize("size", [1, 5, 60, 1000])
+def test_interp_table_matches_interp(start, stop, size):
+    melbank = np.random.default_rng(3).random(80)
+    expected = np.interp(
+        np.linspace(0, 1, size),
+        np.linspace(0, 1, stop - start),
+        melbank[start:stop],
+    )
+    np.testing.assert_allclose(
+        interp_resize(melbank, interp_table(start, stop, size)), expected
+    )
@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from mls.buffers import DelayLine
+from mls.virtuals import STATIC_KEEPALIVE_INTERVAL
+from tests.test_utilities.fixtures import (
+    StaticEffect,
+    fake_mls,
+    record_frames,
+    tick,
+)
+
+FPS = 50
+
+
+def test_delay_line_reads_back_due_entries():
+    line = DelayLine(4)
+    for hop in range(3):
+        line.push(np.full(8, hop, dtype=np.float32), hop)
+    assert line.pop(-1) is None
+    assert line.pop(1)[0] == 1
+    assert len(line) == 1
+
+    # a full line drops its oldest entry
+    for hop in range(3, 8):
+        line.push(np.full(8, hop, dtype=np.float32), hop)
+    assert len(line) == 4
+    assert line.pop(3) is None
+    assert line.pop(5)[0] == 5
+
+    # a new shape restarts the line
+    line.push(np.zeros((2, 3)), 8)
+    assert len(line) == 1
+
+
+@pytest.fixture
+def delayed_virtual(make_virtual):
+    def delayed_virtual(latency_ms, slowest_ms, target_ms=0, **attributes):
+        virtual = make_virtual(
+            {"name": "Delayed", "output_latency_ms": latency_ms},
+            mls=fake_mls(
+                {"output_latency_target_ms": target_ms},
+                max_output_latency_ms=lambda: slowest_ms,
+            ),
+            refresh_rate=FPS,
+            **attributes,
+        )
+        record_frames(virtual, np.ones((4, 3)))
+        return virtual
+
+    return delayed_virtual
+
+
+def run(virtual, frames):
+    for frame in range(frames):
+        virtual.assembled_frame = np.full((4, 3), frame, dtype=np.float64)
+        virtual._flush_delayed(frame / FPS)
+    return [int(frame[0, 0]) for frame in virtual.flushed]
+
+
+def test_faster_outputs_line_up_with_the_slowest(delayed_virtual):
+    # 100ms faster than the slowest virtual is 5 frames at 50fps
+    assert delayed_virtual(20, 120).output_delay() == 0.1
+    assert run(delayed_virtual(20, 120), 10) == [0, 1, 2, 3, 4]
+    # the slowest virtual isn't delayed
+    assert run(delayed_virtual(120, 120), 3) == [0, 1, 2]
+
+
+def test_latency_target_overrides_the_slowest(delayed_virtual):
+    assert delayed_virtual(20, 120, target_ms=60).output_delay() == 0.04
+    assert delayed_virtual(200, 120, target_ms=60).output_delay() == 0
+
+
+def test_static_frames_are_delayed_once(clock, delayed_virtual):
+    virtual = delayed_virtual(
+        20,
+        120,
+        _active=True,
+        _devices=[SimpleNamespace(is_active=lambda: True)],
+        _active_effect=StaticEffect(),
+    )
+
+    # the frame reaches the devices after the delay and isn't pushed again
+    tick(virtual, clock, 5)
+    assert virtual.flushed == []
+    tick(virtual, clock, 1)
+    assert len(virtual.flushed) == 1
+    assert virtual._output_delay_line.pushed_stamp == 100.0
+    assert not virtual._output_delay_pending()
+
+    # then it is only resent on the keepalive interval
+    tick(virtual, clock, int(STATIC_KEEPALIVE_INTERVAL * FPS) - 7)
+    assert len(virtual.flushed) == 1
+    tick(virtual, clock, 3)
+    assert len(virtual.flushed) == 2
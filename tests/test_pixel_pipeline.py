@@ -0,0 +1,155 @@
+import numpy as np
+import pytest
+
+from mls.devices import Device, packets
+from mls.transitions import Transitions
+from tests.test_utilities.fixtures import fake_mls
+
+PIXEL_COUNT = 1024
+
+
+class FrameEffect:
+    """Stand-in effect that hands out a fixed frame"""
+
+    is_active = True
+    pixels = None
+
+    def __init__(self, frame, dtype):
+        self.frame = frame
+        self.dtype = dtype
+
+    def _render(self):
+        pass
+
+    def get_pixels(self):
+        return self.frame.astype(self.dtype)
+
+
+@pytest.fixture
+def assemble(make_virtual):
+    def assemble(pixel_dtype, config, frame, transition_frame=None):
+        """Assembles a frame as the devices receive it, as uint8"""
+        dtype = np.float32 if pixel_dtype == "float32" else np.float64
+        virtual = make_virtual(
+            {"name": "Pipeline", **config},
+            mls=fake_mls(
+                {"pixel_dtype": pixel_dtype, "global_brightness": 0.83}
+            ),
+            _active_effect=FrameEffect(frame, dtype),
+        )
+        virtual.transitions = Transitions(PIXEL_COUNT)
+        virtual.frame_transitions = virtual.transitions["Add"]
+        if transition_frame is not None:
+            virtual._transition_effect = FrameEffect(transition_frame, dtype)
+            virtual.transition_frame_counter = 3
+            virtual.transition_frame_total = 10
+        output = virtual.assemble_frame()
+        if pixel_dtype == "float32":
+            assert output.dtype == np.uint8
+        return output.astype(np.uint8)
+
+    return assemble
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        {},
+        {"max_brightness": 0.61},
+        {"max_brightness": 0.29, "center_offset": 37},
+    ],
+)
+@pytest.mark.parametrize("transition", [False, True])
+def test_float32_pipeline_matches_float64(assemble, config, transition):
+    rng = np.random.default_rng(1234)
+    # include out of range values to exercise the clip
+    frame = rng.uniform(-40, 300, (PIXEL_COUNT, 3))
+    transition_frame = (
+        rng.uniform(-40, 300, (PIXEL_COUNT, 3)) if transition else None
+    )
+
+    reference = assemble("float64", config, frame, transition_frame)
+    result = assemble("float32", config, frame, transition_frame)
+
+    difference = np.abs(reference.astype(int) - result.astype(int))
+    assert difference.max() <= 1
+
+
+@pytest.fixture
+def grouped_virtual(make_virtual):
+    def grouped_virtual(devices):
+        return make_virtual(
+            {"name": "Grouped", "mapping": "copy"},
+            mls=fake_mls(devices=devices),
+            group_size=2,
+        )
+
+    return grouped_virtual
+
+
+class SegmentDevice:
+    """Stand-in device that keeps the segments it is updated with"""
+
+    def __init__(self):
+        self.segments = []
+
+    def is_active(self):
+        return True
+
+    def update_pixels(self, virtual_id, data):
+        self.segments = [pixels.copy() for pixels, start, end in data]
+
+
+def test_copy_segments_keep_their_own_buffers(grouped_virtual):
+    device = SegmentDevice()
+    virtual = grouped_virtual({"strip": device})
+    # alternate the direction so the segments differ
+    virtual._segments_by_device = {
+        "strip": [
+            (0, 8, step, index * 8, index * 8 + 7)
+            for index, step in enumerate((1, -1, 1, -1))
+        ]
+    }
+    frame = np.arange(12, dtype=np.float64).reshape(4, 3)
+    virtual.flush(frame)
+
+    assert len(device.segments) == 4
+    for index, segment in enumerate(device.segments):
+        step = 1 if index % 2 == 0 else -1
+        np.testing.assert_array_equal(
+            segment, np.repeat(frame[::step], 2, axis=0)
+        )
+
+
+def test_update_event_frames_outlive_flushes(grouped_virtual):
+    virtual = grouped_virtual({})
+    frame = np.ones((4, 3))
+    event_frame = virtual._effective_to_physical_pixels(frame, 8, key="event")
+    for _ in range(3):
+        virtual._effective_to_physical_pixels(np.zeros((4, 3)), 8)
+    np.testing.assert_array_equal(event_frame, np.ones((8, 3)))
+
+
+def test_ambilight_color_order_leaves_the_frame_alone():
+    frame = np.array([[1, 2, 3], [4, 5, 6]], dtype=np.uint8)
+    out = np.empty_like(frame)
+    packet = packets.build_ambilightusb_packet(frame, "BRG", out)
+    assert packet[6:] == bytes([3, 1, 2, 6, 4, 5])
+    np.testing.assert_array_equal(frame, [[1, 2, 3], [4, 5, 6]])
+
+
+@Device.no_registration
+class FrameDevice(Device):
+    """Device that only assembles frames"""
+
+    def flush(self, data):
+        pass
+
+
+def test_device_center_offset_keeps_uint8_frames():
+    device = FrameDevice(fake_mls(), {"center_offset": 1})
+    device._pixels = np.arange(6, dtype=np.uint8).reshape(2, 3)
+    frame = device.assemble_frame()
+    assert frame.dtype == np.uint8
+    np.testing.assert_array_equal(frame, [[3, 4, 5], [0, 1, 2]])
+    assert device.frame_bytes(frame) is frame
@@ -0,0 +1,88 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from mls.governor import LEVEL_NO_BLUR
+from mls.render_pool import (
+    FrameBuffer,
+    RenderPool,
+    _virtual_info,
+    _WorkerVirtual,
+)
+from tests.test_utilities.fixtures import fake_mls
+
+GREEN = [0, 255, 0]
+
+
+@pytest.fixture
+def pooled_virtual(make_virtual):
+    return make_virtual(
+        {"name": "Pooled"},
+        _id="pooled",
+        effective_pixel_count=16,
+        refresh_rate=60,
+    )
+
+
+def test_frame_buffer_reads_only_complete_frames():
+    writer = FrameBuffer(4)
+    reader = FrameBuffer(4, name=writer.name)
+    out = np.zeros((4, 3))
+    try:
+        writer.write(np.full((4, 3), 7.0))
+        assert reader.read_into(out) == 2
+        assert (out == 7).all()
+
+        # an odd sequence number is a frame still being written
+        writer.header[0] += 1
+        out.fill(0)
+        assert reader.read_into(out) is None
+        assert not out.any()
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_worker_virtual_follows_the_blur_policy(pooled_virtual):
+    worker_virtual = _WorkerVirtual(_virtual_info(pooled_virtual))
+    assert worker_virtual.governor.blur_enabled
+    pooled_virtual.governor.level = LEVEL_NO_BLUR
+    worker_virtual.update(_virtual_info(pooled_virtual))
+    assert not worker_virtual.governor.blur_enabled
+
+
+def read_until(delegate, condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        pixels = delegate.read()
+        if condition(pixels):
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_effects_move_off_an_exited_worker(pooled_virtual):
+    effect = SimpleNamespace(
+        name="Single Color", type="singleColor", config={"color": "#00ff00"}
+    )
+    pool = RenderPool(fake_mls(), 1)
+    try:
+        delegate = pool.attach(effect, pooled_virtual)
+        assert read_until(delegate, lambda pixels: (pixels == GREEN).all())
+
+        crashed = pool._workers[0]
+        crashed.process.kill()
+        crashed.process.join()
+        # the stalled frames get the worker restarted
+        assert read_until(
+            delegate, lambda pixels: pool._workers[0] is not crashed
+        )
+        assert delegate._worker is pool._workers[0]
+        assert pool._workers[0].delegates == {delegate._key: delegate}
+        delegate._frame_buffer.frame.fill(0)
+        assert read_until(delegate, lambda pixels: (pixels == GREEN).all())
+        delegate.detach()
+    finally:
+        pool.stop()
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from mls.events import Event
+from mls.virtuals import STATIC_KEEPALIVE_INTERVAL
+from tests.test_utilities.fixtures import StaticEffect, record_frames, tick
+
+FPS = 50
+
+
+@pytest.fixture
+def ticking_virtual(make_virtual):
+    def ticking_virtual(effect, device_active=True):
+        virtual = make_virtual(
+            {"name": "Ticking"},
+            _id="ticking",
+            _active=True,
+            _devices=[SimpleNamespace(is_active=lambda: device_active)],
+            refresh_rate=FPS,
+            _active_effect=effect,
+        )
+        record_frames(virtual, np.zeros((4, 3)))
+        return virtual
+
+    return ticking_virtual
+
+
+def test_static_frames_are_assembled_once_and_kept_alive(
+    clock, ticking_virtual
+):
+    virtual = ticking_virtual(StaticEffect())
+    tick(virtual, clock, 10)
+    assert virtual.assembled == 1
+    assert len(virtual.flushed) == 1
+
+    # unchanged frames are resent on the keepalive interval
+    tick(virtual, clock, int(STATIC_KEEPALIVE_INTERVAL * FPS))
+    assert virtual.assembled == 1
+    assert len(virtual.flushed) == 2
+
+    # a new config version is a new frame
+    virtual._active_effect._config_version += 1
+    tick(virtual, clock, 1)
+    assert virtual.assembled == 2
+    assert len(virtual.flushed) == 3
+
+
+def test_animated_frames_are_assembled_every_tick(clock, ticking_virtual):
+    virtual = ticking_virtual(StaticEffect(static=False))
+    tick(virtual, clock, 10)
+    assert virtual.assembled == len(virtual.flushed) == 10
+
+
+def test_virtuals_without_consumers_suspend_rendering(clock, ticking_virtual):
+    virtual = ticking_virtual(StaticEffect(), device_active=False)
+    events = virtual._mls.events
+    # listeners to every virtual's updates don't consume this one
+    events.add_listener(lambda event: None, Event.VIRTUAL_UPDATE)
+    tick(virtual, clock, 5)
+    assert virtual.suspended
+    assert virtual.assembled == len(virtual.flushed) == 0
+
+    remove_listener = events.add_listener(
+        lambda event: None,
+        Event.VISUALISATION_UPDATE,
+        {"is_device": False, "vis_id": "ticking"},
+    )
+    tick(virtual, clock, 1)
+    assert not virtual.suspended
+    assert virtual.assembled == len(virtual.flushed) == 1
+
+    remove_listener()
+    tick(virtual, clock, 1)
+    assert virtual.suspended
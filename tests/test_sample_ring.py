@@ -0,0 +1,58 @@
+import threading
+
+import numpy as np
+
+from mls.buffers import SampleRingBuffer
+
+
+def test_blocks_keep_their_boundaries_across_the_wrap():
+    ring = SampleRingBuffer(10)
+    out = np.zeros(10, dtype=np.float32)
+    for start in range(0, 30, 6):
+        # 4 + 2 samples so the blocks wrap at different offsets
+        assert ring.write(np.arange(start, start + 4, dtype=np.float32))
+        assert ring.write(np.arange(start + 4, start + 6, dtype=np.float32))
+        assert list(ring.read_into(out)) == list(range(start, start + 4))
+        assert list(ring.read_into(out)) == list(range(start + 4, start + 6))
+    assert ring.read_into(out) is None
+
+
+def test_blocks_that_dont_fit_are_dropped_whole():
+    ring = SampleRingBuffer(8, max_blocks=3)
+    out = np.zeros(8, dtype=np.float32)
+    assert ring.write(np.ones(5))
+    assert not ring.write(np.full(4, 2))
+    assert ring.write(np.full(2, 3))
+    assert ring.write(np.full(1, 4))
+    # out of block slots
+    assert not ring.write(np.full(0, 5))
+    assert len(ring) == 3
+    assert [ring.read_into(out)[0] for _ in range(3)] == [1, 3, 4]
+
+
+def test_consumer_thread_reads_every_block_in_order():
+    ring = SampleRingBuffer(64)
+    ready = threading.Event()
+    blocks = 2000
+    received = []
+
+    def consume():
+        out = np.zeros(64, dtype=np.float32)
+        while len(received) < blocks:
+            if not ready.wait(1):
+                break
+            ready.clear()
+            while (block := ring.read_into(out)) is not None:
+                received.append(int(block[0]))
+                assert (block == block[0]).all()
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    sent = []
+    for index in range(blocks):
+        while not ring.write(np.full(1 + index % 16, index)):
+            ready.set()
+        sent.append(index)
+        ready.set()
+    consumer.join(5)
+    assert received == sent
@@ -0,0 +1,113 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from mls.effects.audio import AudioReactiveEffect
+from mls.scheduler import FrameScheduler
+from tests.test_utilities.fixtures import fake_mls
+
+
+class FakeAudioEffect(AudioReactiveEffect):
+    """Stand-in audio reactive effect that skips the audio source"""
+
+    name = "Fake"
+    id = "fake"
+    config = {}
+    _active = False
+
+    def __init__(self):
+        pass
+
+    def activate(self, virtual):
+        self._active = True
+
+    def _deactivate(self):
+        self._active = False
+
+
+class TickingVirtual:
+    """Stand-in virtual that counts its render ticks"""
+
+    audio_clocked = False
+    suspended = False
+
+    def __init__(self, id, render_rate, tick_time=0):
+        self.id = id
+        self.render_rate = render_rate
+        self.tick_time = tick_time
+        self.ticks = 0
+        self.ticked = threading.Event()
+
+    def render_tick(self):
+        time.sleep(self.tick_time)
+        self.ticks += 1
+        if self.ticks == 10:
+            self.ticked.set()
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = FrameScheduler(SimpleNamespace())
+    yield scheduler
+    scheduler.stop()
+
+
+def test_virtuals_are_grouped_and_ticked_by_rate(scheduler):
+    fast = TickingVirtual("fast", 60)
+    slow = TickingVirtual("slow", 30)
+    also_fast = TickingVirtual("also_fast", 60)
+    for virtual in (fast, slow, also_fast):
+        scheduler.register(virtual)
+    assert scheduler.stats()["groups"] == {60: 2, 30: 1}
+
+    assert fast.ticked.wait(5)
+    scheduler.unregister(slow)
+    ticks = slow.ticks
+    # the slow group ticks on every other deadline of the fast one
+    assert 3 <= ticks <= 7
+    assert abs(also_fast.ticks - fast.ticks) <= 1
+
+    time.sleep(0.1)
+    assert slow.ticks == ticks
+    assert scheduler.stats()["groups"] == {60: 2}
+
+
+def test_reschedule_moves_a_virtual_to_its_new_rate(scheduler):
+    virtual = TickingVirtual("moving", 60)
+    scheduler.register(virtual)
+    virtual.render_rate = 30
+    scheduler.reschedule(virtual)
+    assert scheduler.stats()["groups"] == {30: 1}
+    # unregistered virtuals are left alone
+    scheduler.reschedule(TickingVirtual("unknown", 10))
+    assert scheduler.stats()["virtuals"] == 1
+
+
+def test_slow_ticks_count_overruns(scheduler):
+    virtual = TickingVirtual("slow", 60, tick_time=0.03)
+    scheduler.register(virtual)
+    assert virtual.ticked.wait(5)
+    stats = scheduler.stats()
+    assert stats["overruns"] >= 5
+    assert stats["max_tick_ms"] >= 30
+
+
+@pytest.mark.parametrize("change", ["set_effect", "clear_effect"])
+def test_effect_changes_reschedule_an_active_virtual(make_virtual, change):
+    virtual = make_virtual(
+        {"name": "Scheduled", "transition_mode": "None"},
+        mls=fake_mls({"audio_clocked_rendering": True}),
+        _id="scheduled",
+        _devices=[SimpleNamespace(max_refresh_rate=60)],
+        _active=True,
+    )
+    if change == "set_effect":
+        virtual.set_effect(FakeAudioEffect())
+        assert virtual.audio_clocked
+    else:
+        virtual._active_effect = FakeAudioEffect()
+        virtual.clear_effect()
+        assert not virtual.audio_clocked
+    assert virtual._mls.virtuals.scheduler.rescheduled == [virtual]
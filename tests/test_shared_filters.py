@@ -0,0 +1,75 @@
+import pytest
+
+from mls.effects.shared_audio import FilterRegistry, SharedFilter
+
+
+class FakeAudio:
+    """Stand-in audio source counting the reads of its signals"""
+
+    def __init__(self):
+        self.level = 0.0
+        self.reads = 0
+
+    def lows_power(self, filtered=True):
+        self.reads += 1
+        return self.level
+
+    def volume(self, filtered=True):
+        self.reads += 1
+        return self.level * 2
+
+
+def test_effects_share_a_filter_updated_once_per_hop():
+    audio = FakeAudio()
+    registry = FilterRegistry(audio)
+    first = SharedFilter("lows_power", 0.5, 0.5)
+    second = SharedFilter("lows_power", 0.5, 0.5)
+    other = SharedFilter("volume", 0.5, 0.5)
+    for shared_filter in (first, second, other):
+        shared_filter.bind(registry)
+    assert len(registry) == 2
+    assert first.value == 0.0
+
+    audio.level = 1.0
+    registry()
+    assert audio.reads == 2
+    assert first.value == second.value == 1.0
+    assert other.value == 2.0
+    audio.level = 0.0
+    registry()
+    assert first.value == second.value == 0.5
+
+    # the filter outlives its first user and is dropped with its last
+    first.release()
+    assert first.value == 0.0
+    assert len(registry) == 2
+    second.release()
+    assert len(registry) == 1
+    registry()
+    assert audio.reads == 5
+
+
+def test_different_factors_get_their_own_filter():
+    audio = FakeAudio()
+    registry = FilterRegistry(audio)
+    slow = SharedFilter("lows_power", 0.1, 0.1)
+    fast = SharedFilter("lows_power", 0.9, 0.9)
+    slow.bind(registry)
+    fast.bind(registry)
+    assert len(registry) == 2
+    registry()
+    audio.level = 1.0
+    registry()
+    assert slow.value == pytest.approx(0.1)
+    assert fast.value == pytest.approx(0.9)
+
+    # rebinding releases the previous registry
+    fast.bind(FilterRegistry(audio))
+    assert len(registry) == 1
+
+
+def test_unknown_signals_are_rejected():
+    with pytest.raises(ValueError):
+        SharedFilter("tempo", 0.5, 0.5)
+    with pytest.raises(ValueError):
+        FilterRegistry(FakeAudio()).acquire("tempo", 0.5, 0.5)
@@ -0,0 +1,70 @@
+from mls.effects.audio import AudioInputSource
+from mls.effects.math import ExpFilter
+from tests.test_utilities.fixtures import fake_mls
+
+HOP_RATE = 60
+
+
+def make_source(silence_timeout=1.0):
+    source = object.__new__(AudioInputSource)
+    source._mls = fake_mls()
+    source.events = source._mls.events.fired
+    source._config = {
+        "min_volume": 0.2,
+        "silence_timeout": silence_timeout,
+        "silence_hysteresis": 0.05,
+        "sample_rate": HOP_RATE,
+    }
+    source._volume_filter = ExpFilter(0, alpha_decay=0.99, alpha_rise=0.99)
+    source._silent = False
+    source._quiet_hops = 0
+    return source
+
+
+def hop(source, volume):
+    source._volume = volume
+    source._volume_filter.update(volume)
+    return source._silence_gate_closed()
+
+
+def test_gate_closes_after_timeout_and_wakes_within_a_hop():
+    source = make_source()
+    assert not any(hop(source, 0.1) for _ in range(HOP_RATE - 1))
+    assert hop(source, 0.1)
+    assert [event.silent for event in source.events] == [True]
+
+    # volume between min_volume and the hysteresis keeps the gate closed
+    assert hop(source, 0.22)
+    assert not hop(source, 0.3)
+    assert [event.silent for event in source.events] == [True, False]
+
+    # sound restarts the timeout
+    assert not any(hop(source, 0.1) for _ in range(HOP_RATE - 1))
+    assert not hop(source, 0.5)
+    assert not any(hop(source, 0.1) for _ in range(HOP_RATE - 1))
+
+
+def test_gate_is_off_without_a_timeout():
+    source = make_source(silence_timeout=0)
+    assert not any(hop(source, 0.0) for _ in range(HOP_RATE * 10))
+    assert source.events == []
+
+
+def test_replay_clock_advances_through_silence():
+    source = make_source()
+    source._update_volume = lambda: None
+    source._invoke_callbacks = lambda: setattr(
+        source, "_hops", source._hops + 1
+    )
+    source.pre_process_audio = source._invalidate_caches = lambda: None
+    source._hops = source._silent_hops = source._clock_hops = 0
+    source._clock_origin = 0.0
+    source._volume = 0.0
+    source._volume_filter.update(0.0)
+
+    # the gate closes on the last hop of the timeout
+    for _ in range(HOP_RATE * 2):
+        source._analyse_sample()
+    assert source._silent
+    assert source._hops == HOP_RATE - 1
+    assert source._replay_clock() == 2.0
@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import pytest
+
+from mls.effects.temporal import TemporalEffect
+
+
+class SteppingEffect(TemporalEffect):
+    """Counts the steps it is run for"""
+
+    NAME = "Stepping"
+    static = False
+
+    def __init__(self, speed=1.0, step_interval=None):
+        super().__init__(SimpleNamespace(config={}), {"speed": speed})
+        self.step_interval = step_interval
+        self.steps = 0
+        self._active = True
+
+    def is_static(self):
+        return self.static
+
+    def effect_loop(self):
+        self.steps += 1
+        return self.step_interval
+
+
+def render(effect, clock, fps, seconds):
+    """Renders frames over the given number of seconds, both ends included"""
+    for frame in range(round(fps * seconds) + 1):
+        clock.now = frame / fps
+        effect._render()
+
+
+@pytest.mark.parametrize(
+    "speed,step_interval,fps,steps",
+    [
+        (1.0, None, 60, 10),
+        (2.0, None, 60, 20),
+        (1.0, 0.5, 60, 20),
+        # faster than the refresh rate runs several steps per frame
+        (10.0, None, 30, 100),
+    ],
+)
+def test_steps_follow_the_speed_at_any_refresh_rate(
+    clock, speed, step_interval, fps, steps
+):
+    effect = SteppingEffect(speed, step_interval)
+    render(effect, clock, fps, 1)
+    # the first render runs a step right away
+    assert effect.steps - 1 == pytest.approx(steps, abs=1)
+
+
+def test_backlog_after_a_pause_is_dropped(clock):
+    effect = SteppingEffect()
+    render(effect, clock, 60, 1)
+    steps = effect.steps
+    clock.now += 5
+    effect._render()
+    assert effect.steps == steps + 1
+
+
+def test_static_effects_step_once_per_config(clock):
+    effect = SteppingEffect()
+    effect.static = True
+    render(effect, clock, 60, 1)
+    assert effect.steps == 1
+    effect.update_config({"speed": 2.0})
+    render(effect, clock, 60, 1)
+    assert effect.steps == 2
@@ -0,0 +1,142 @@
+"""
+Stand-ins for the core and fixtures shared by the unit tests of virtuals,
+effects and audio sources, registered as a plugin in conftest.py
+"""
+
+import timeit
+from types import SimpleNamespace
+
+import pytest
+
+from mls.events import Events
+from mls.virtuals import Virtual
+
+
+class RecordingEvents(Events):
+    """Events that also keep every event fired"""
+
+    def __init__(self, mls):
+        super().__init__(mls)
+        self.fired = []
+
+    def fire_event(self, event):
+        self.fired.append(event)
+        super().fire_event(event)
+
+
+class RecordingScheduler:
+    """Stand-in frame scheduler that keeps the virtuals it reschedules"""
+
+    def __init__(self):
+        self.rescheduled = []
+
+    def register(self, virtual):
+        pass
+
+    def unregister(self, virtual):
+        pass
+
+    def reschedule(self, virtual):
+        self.rescheduled.append(virtual)
+
+
+class StaticEffect:
+    """Stand-in effect that keeps rendering the same frame"""
+
+    is_active = True
+    pixels = None
+    _config_version = 0
+
+    def __init__(self, static=True):
+        self.static = static
+
+    def static_frame_version(self):
+        return self._config_version if self.static else None
+
+
+def fake_mls(config=None, devices=None, **virtuals):
+    """
+    Returns a stand-in for the core with the parts virtuals and audio
+    sources use. config is merged into the core config, devices maps ids
+    to devices and keyword arguments replace attributes of the virtuals
+    registry, such as max_output_latency_ms.
+    """
+    registry = SimpleNamespace(
+        scheduler=RecordingScheduler(),
+        audio_silent=False,
+        max_output_latency_ms=lambda: 0,
+        invalidate_output_latency=lambda: None,
+    )
+    vars(registry).update(virtuals)
+    mls = SimpleNamespace(
+        config={"global_brightness": 1.0, **(config or {})},
+        loop=SimpleNamespace(
+            call_soon_threadsafe=lambda *args: None,
+            call_later=lambda *args: None,
+        ),
+        devices=SimpleNamespace(get=(devices or {}).get),
+        virtuals=registry,
+    )
+    mls.events = RecordingEvents(mls)
+    return mls
+
+
+def record_frames(virtual, frame):
+    """
+    Makes the virtual assemble copies of frame, counted in assembled, and
+    keep a copy of every frame it flushes in flushed
+    """
+    virtual.assembled = 0
+    virtual.flushed = []
+
+    def assemble_frame():
+        virtual.assembled += 1
+        return frame.copy()
+
+    def flush(pixels=None):
+        pixels = virtual.assembled_frame if pixels is None else pixels
+        virtual.flushed.append(pixels.copy())
+
+    virtual.assemble_frame = assemble_frame
+    virtual.flush = flush
+
+
+def tick(virtual, clock, frames):
+    """Runs render ticks of the virtual at its refresh rate"""
+    for _ in range(frames):
+        virtual.render_tick()
+        clock.now += 1 / virtual.refresh_rate
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces timeit.default_timer with a clock the test moves on"""
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(timeit, "default_timer", lambda: clock.now)
+    return clock
+
+
+@pytest.fixture
+def make_virtual():
+    """
+    Returns a factory of Virtuals on a fake core, or on the mls given.
+    config is merged into the virtual config and keyword arguments set
+    attributes of the virtual, such as _devices or _active_effect. The
+    virtuals are deactivated after the test.
+    """
+    virtuals = []
+
+    def make_virtual(config=None, mls=None, **attributes):
+        virtual = Virtual(
+            mls or fake_mls(),
+            Virtual.CONFIG_SCHEMA({"name": "Test", **(config or {})}),
+        )
+        for name, value in attributes.items():
+            setattr(virtual, name, value)
+        virtuals.append(virtual)
+        return virtual
+
+    yield make_virtual
+    for virtual in virtuals:
+        # skip deactivating the stand-in devices when collected
+        virtual._active = False
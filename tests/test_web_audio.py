@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import mls.api.websocket as websocket
+from mls.api.websocket import (
+    WEB_AUDIO_FRAME_HEADER,
+    WebAudioStream,
+    WebsocketConnection,
+)
+
+FLOAT32 = 1
+INT16 = 2
+
+
+def frame(fmt, samples, sequence, stream_id=7, sample_rate=48000):
+    return (
+        WEB_AUDIO_FRAME_HEADER.pack(fmt, stream_id, sample_rate, sequence)
+        + samples.tobytes()
+    )
+
+
+@pytest.fixture
+def open_stream(monkeypatch):
+    blocks = []
+    stream = WebAudioStream(
+        "browser", lambda data, *args: blocks.append(data.copy())
+    )
+    stream.start()
+    monkeypatch.setattr(websocket, "ACTIVE_AUDIO_STREAM", stream)
+    connection = WebsocketConnection(None)
+    connection.audio_stream_start_handler(
+        {"id": 1, "client": "browser", "stream_id": 7}
+    )
+    yield connection, stream, blocks
+    websocket.WEB_AUDIO_CLIENTS.discard("browser")
+
+
+def test_binary_frames_decode_to_float32(open_stream):
+    connection, stream, blocks = open_stream
+    samples = np.linspace(-1, 0.5, 64, dtype="<f4")
+    connection._receive_audio_frame(frame(FLOAT32, samples, 0))
+    connection._receive_audio_frame(
+        frame(INT16, (samples * 32768).astype("<i2"), 1)
+    )
+    # frames of other streams and unknown formats are ignored
+    connection._receive_audio_frame(frame(FLOAT32, samples, 2, stream_id=8))
+    connection._receive_audio_frame(frame(9, samples, 2))
+
+    assert len(blocks) == 2
+    for block in blocks:
+        assert block.dtype == np.float32
+        np.testing.assert_allclose(block, samples, atol=1 / 32768)
+    assert stream.stream_rate == 48000
+
+
+def test_sequence_gaps_are_counted(open_stream):
+    connection, stream, blocks = open_stream
+    samples = np.zeros(16, dtype="<f4")
+    for sequence in (0xFFFFFFFE, 0xFFFFFFFF, 2, 1, 3, 3):
+        connection._receive_audio_frame(frame(FLOAT32, samples, sequence))
+    # 0 and 1 went missing across the wrap, then 1 and 3 arrived late
+    assert stream.frames == 4
+    assert stream.dropped_frames == 2
+    assert stream.late_frames == 2
+
+    # a sequence restarting from 0 is followed rather than dropped
+    connection._receive_audio_frame(frame(FLOAT32, samples, 100))
+    connection._receive_audio_frame(frame(FLOAT32, samples, 0))
+    connection._receive_audio_frame(frame(FLOAT32, samples, 1))
+    assert stream.frames == 7
+    assert stream.late_frames == 2
+    assert len(blocks) == 7